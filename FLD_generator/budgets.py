@@ -0,0 +1,185 @@
+""" Adaptive timeouts and retries of the trials learned from the latencies observed during the run.
+
+The trials of run_with_timeout_retry() are grouped by a budget key of the stage and its size, e.g., "stem.depth=3".
+While the adaptive budgets are enabled by enable_adaptive_budgets(), each trial is recorded by its latency and its success,
+and the budgets of a key are chosen as follows once the key has min_samples trials:
+
+* timeout: the quantile of the latencies of the successful trials multiplied by margin.
+  Since the successful latencies can not exceed the timeout, the margin lets the timeout grow when the trials are cut short.
+  The timeout is bounded by min_timeout, not to cut the trials by small hiccups such as the garbage collection,
+  and by max_timeout_factor times the default one.
+* max_retry: the number of trials as long as the expected marginal yield of the next trial, i.e.,
+  the probability that all the previous trials fail and the next one succeeds, is at least min_yield.
+  The success rate is estimated with the Laplace smoothing.
+  The max_retry is capped by the default one.
+
+Before that, the budgets given as the warm-start values, e.g., those exported by a previous run, or the defaults are used.
+The budgets are exported in the stats as "budget.{key}.timeout" and "budget.{key}.max_retry" (see StatsAccumulator),
+from which load_budgets() restores the warm-start values.
+"""
+import math
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Union
+
+Number = Union[int, float]
+
+
+class _TrialRecord:
+
+    def __init__(self, window_size: int):
+        self.num_trials = 0
+        self.num_successes = 0
+        # the latest successful latencies, which follow the changes of the budgets during the run.
+        self.success_latencies: Deque[float] = deque(maxlen=window_size)
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {'num_trials': self.num_trials,
+                'num_successes': self.num_successes,
+                'success_latencies': list(self.success_latencies)}
+
+
+class AdaptiveBudgets:
+
+    def __init__(self,
+                 quantile: float = 0.95,
+                 margin: float = 1.5,
+                 min_yield: float = 0.01,
+                 min_samples: int = 20,
+                 min_timeout: float = 0.1,
+                 max_timeout_factor: float = 4.0,
+                 window_size: int = 200,
+                 warm_start: Optional[Dict[str, Dict[str, Number]]] = None):
+        if not 0.0 < quantile <= 1.0:
+            raise ValueError(f'quantile must be in (0, 1]: {quantile}')
+        if not 0.0 < min_yield < 1.0:
+            raise ValueError(f'min_yield must be in (0, 1): {min_yield}')
+        self.quantile = quantile
+        self.margin = margin
+        self.min_yield = min_yield
+        self.min_samples = min_samples
+        self.min_timeout = min_timeout
+        self.max_timeout_factor = max_timeout_factor
+        self.window_size = window_size
+        self.warm_start = {key: dict(budget) for key, budget in (warm_start or {}).items()}
+        self._records: Dict[str, _TrialRecord] = {}
+
+    def _get_record(self, key: str) -> _TrialRecord:
+        record = self._records.get(key, None)
+        if record is None:
+            record = _TrialRecord(self.window_size)
+            self._records[key] = record
+        return record
+
+    def observe(self, key: str, sec: float, is_success: bool) -> None:
+        record = self._get_record(key)
+        record.num_trials += 1
+        if is_success:
+            record.num_successes += 1
+            record.success_latencies.append(sec)
+
+    def _is_learned(self, key: str) -> bool:
+        record = self._records.get(key, None)
+        return record is not None and record.num_trials >= self.min_samples
+
+    def get_timeout(self, key: str, default: Optional[Number] = None) -> Optional[float]:
+        """ The timeout of the trials of key. The trials without the default timeout are left unlimited. """
+        if default is None:
+            return None
+        if not self._is_learned(key) or len(self._records[key].success_latencies) == 0:
+            return min(self.warm_start.get(key, {}).get('timeout', default), default * self.max_timeout_factor)
+
+        latencies = sorted(self._records[key].success_latencies)
+        pos = self.quantile * (len(latencies) - 1)
+        lower = math.floor(pos)
+        upper = min(lower + 1, len(latencies) - 1)
+        latency = latencies[lower] + (latencies[upper] - latencies[lower]) * (pos - lower)
+        return min(max(latency * self.margin, self.min_timeout), default * self.max_timeout_factor)
+
+    def get_max_retry(self, key: str, default: int) -> int:
+        if not self._is_learned(key):
+            return min(self.warm_start.get(key, {}).get('max_retry', default), default)
+
+        record = self._records[key]
+        success_rate = (record.num_successes + 1) / (record.num_trials + 2)
+        if success_rate < self.min_yield:
+            return 1
+        # the k-th trial yields success_rate * (1 - success_rate)^(k - 1)
+        max_retry = 1 + math.floor(math.log(self.min_yield / success_rate) / math.log(1 - success_rate))
+        return max(min(max_retry, default), 1)
+
+    def get_budgets(self) -> Dict[str, Dict[str, Number]]:
+        """ The budgets of the keys learned so far and the warm-start ones, by which the next run can be warm-started. """
+        budgets = {key: dict(budget) for key, budget in self.warm_start.items()}
+        for key, record in self._records.items():
+            if not self._is_learned(key):
+                continue
+            budget = budgets.setdefault(key, {})
+            if len(record.success_latencies) > 0:
+                budget['timeout'] = self.get_timeout(key, default=math.inf)
+            budget['max_retry'] = self.get_max_retry(key, default=budget.get('max_retry', 99999))
+        return budgets
+
+    def merge(self, other: 'AdaptiveBudgets') -> 'AdaptiveBudgets':
+        """ Merge the trials of other, e.g., those of another worker, into self. """
+        for key, budget in other.warm_start.items():
+            self.warm_start.setdefault(key, dict(budget))
+        for key, other_record in other._records.items():
+            record = self._get_record(key)
+            record.num_trials += other_record.num_trials
+            record.num_successes += other_record.num_successes
+            record.success_latencies.extend(other_record.success_latencies)
+        return self
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {
+            'quantile': self.quantile,
+            'margin': self.margin,
+            'min_yield': self.min_yield,
+            'min_samples': self.min_samples,
+            'min_timeout': self.min_timeout,
+            'max_timeout_factor': self.max_timeout_factor,
+            'window_size': self.window_size,
+            'warm_start': self.warm_start,
+            'records': {key: record.state_dict() for key, record in self._records.items()},
+        }
+
+    @classmethod
+    def from_state_dict(cls, state: Dict[str, Any]) -> 'AdaptiveBudgets':
+        budgets = cls(quantile=state['quantile'],
+                      margin=state['margin'],
+                      min_yield=state['min_yield'],
+                      min_samples=state['min_samples'],
+                      min_timeout=state['min_timeout'],
+                      max_timeout_factor=state['max_timeout_factor'],
+                      window_size=state['window_size'],
+                      warm_start=state['warm_start'])
+        for key, record_state in state['records'].items():
+            record = budgets._get_record(key)
+            record.num_trials = record_state['num_trials']
+            record.num_successes = record_state['num_successes']
+            record.success_latencies.extend(record_state['success_latencies'])
+        return budgets
+
+
+def load_budgets(stats: Dict[str, Any]) -> Dict[str, Dict[str, Number]]:
+    """ The budgets in the stats exported by StatsAccumulator.to_dict(), e.g., OUTPUT_PATH.stats.json of a previous run. """
+    budgets: Dict[str, Dict[str, Number]] = {}
+    for name, value in stats.items():
+        if not name.startswith('budget.') or value is None:
+            continue
+        key, budget_name = name[len('budget.'):].rsplit('.', 1)
+        budgets.setdefault(key, {})[budget_name] = value
+    return budgets
+
+
+_budgets: Optional[AdaptiveBudgets] = None
+
+
+def enable_adaptive_budgets(budgets: Optional[AdaptiveBudgets]) -> None:
+    """ Use budgets in run_with_timeout_retry(). None disables the adaptive budgets, i.e., the default budgets are used. """
+    global _budgets
+    _budgets = budgets
+
+
+def get_adaptive_budgets() -> Optional[AdaptiveBudgets]:
+    return _budgets
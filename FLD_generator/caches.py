@@ -0,0 +1,218 @@
+""" Bounded LRU caches with a registry.
+
+The memoization caches of the modules are created by get_cache(name) so that
+their budgets can be configured in one place by configure_caches() and
+their statistics can be reported by get_cache_stats().
+
+SQLiteCache is an on-disk cache which can be shared across runs and processes.
+"""
+import os
+import json
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+_DEFAULT_MAX_SIZE = 1000000
+
+
+class LRUCache:
+    """ A cache which evicts the least recently used entry when the number of entries exceeds max_size. """
+
+    def __init__(self, name: str, max_size: int = _DEFAULT_MAX_SIZE):
+        if max_size < 0:
+            raise ValueError(f'max_size must be non-negative: {max_size}')
+        self.name = name
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        """ False if max_size is 0, in which case callers can skip building costly keys. """
+        return self.max_size > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_size == 0:
+            return
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+        entries[key] = value
+        if len(entries) > self.max_size:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, max_size: int) -> None:
+        if max_size < 0:
+            raise ValueError(f'max_size must be non-negative: {max_size}')
+        self.max_size = max_size
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hit': self.hits,
+            'miss': self.misses,
+            'eviction': self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f'LRUCache(name="{self.name}", size={len(self)}, max_size={self.max_size})'
+
+
+_CACHES: Dict[str, LRUCache] = {}
+_CONFIGURED_MAX_SIZES: Dict[str, int] = {}
+
+
+def get_cache(name: str, max_size: int = _DEFAULT_MAX_SIZE) -> LRUCache:
+    """ Get the cache registered by the name, creating it if not yet.
+
+    max_size is the default budget, which is overridden by configure_caches().
+    """
+    cache = _CACHES.get(name, None)
+    if cache is None:
+        cache = LRUCache(name, max_size=_CONFIGURED_MAX_SIZES.get(name, max_size))
+        _CACHES[name] = cache
+    return cache
+
+
+def configure_caches(max_sizes: Dict[str, int]) -> None:
+    """ Set the budgets (the maximum numbers of entries) of the caches by their names.
+
+    The budgets also apply to the caches created later.
+    """
+    for name, max_size in max_sizes.items():
+        _CONFIGURED_MAX_SIZES[name] = max_size
+        if name in _CACHES:
+            _CACHES[name].resize(max_size)
+
+
+def get_cache_stats(name: Optional[str] = None) -> Dict[str, Any]:
+    if name is not None:
+        return _CACHES[name].stats()
+    return {name: cache.stats() for name, cache in sorted(_CACHES.items())}
+
+
+def clear_caches() -> None:
+    for cache in _CACHES.values():
+        cache.clear()
+
+
+class SQLiteCache:
+    """ A persistent cache of json-serializable values stored in an SQLite file.
+
+    Multiple processes can read and append to the same file concurrently.
+    The writes are buffered and committed every flush_interval entries and by flush().
+    When the number of entries exceeds max_size, the oldest entries are deleted down to (1 - eviction_ratio) * max_size,
+    so that the eviction runs only once per eviction_ratio * max_size writes.
+    The entries are only appended and deleted from the oldest, thus, they are counted by the span of the rowids
+    instead of scanning the whole table while the other processes wait for the write lock.
+    """
+
+    def __init__(self,
+                 path: str,
+                 max_size: int = _DEFAULT_MAX_SIZE,
+                 flush_interval: int = 100,
+                 eviction_ratio: float = 0.1,
+                 timeout: float = 60.0):
+        if max_size < 0:
+            raise ValueError(f'max_size must be non-negative: {max_size}')
+        if not 0.0 <= eviction_ratio < 1.0:
+            raise ValueError(f'eviction_ratio must be in [0, 1): {eviction_ratio}')
+        self.path = str(path)
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.eviction_ratio = eviction_ratio
+        self.timeout = timeout
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+        self._pending: List[Tuple[str, str]] = []
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _get_conn(self) -> sqlite3.Connection:
+        # A connection must not be shared with the forked worker processes, so we re-open it in each process.
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self._conn = conn
+            self._conn_pid = os.getpid()
+            self._pending = []
+        return self._conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._get_conn().execute('SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        if self.max_size == 0:
+            return
+        self._get_conn()
+        self._pending.append((key, json.dumps(value)))
+        if len(self._pending) >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if len(self._pending) == 0:
+            return
+        conn = self._get_conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT OR IGNORE INTO cache (key, value) VALUES (?, ?)', self._pending)
+            # MIN() and MAX() are looked up by the b-tree without scanning the table only if each is queried alone.
+            min_rowid, max_rowid = conn.execute('SELECT (SELECT MIN(rowid) FROM cache), (SELECT MAX(rowid) FROM cache)').fetchone()
+            if max_rowid is not None and max_rowid - min_rowid + 1 > self.max_size:
+                num_kept = self.max_size - int(self.max_size * self.eviction_ratio)
+                conn.execute('DELETE FROM cache WHERE rowid <= ?', (max_rowid - num_kept,))
+        self.writes += len(self._pending)
+        self._pending = []
+
+    def close(self) -> None:
+        if self._conn is not None and self._conn_pid == os.getpid():
+            self.flush()
+            self._conn.close()
+        self._conn = None
+        self._conn_pid = None
+
+    def __len__(self) -> int:
+        self.flush()
+        return self._get_conn().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hit': self.hits,
+            'miss': self.misses,
+            'write': self.writes,
+        }
+
+    def __repr__(self) -> str:
+        return f'SQLiteCache(path="{self.path}", max_size={self.max_size})'
@@ -0,0 +1,218 @@
+""" Sharded and compressed JSONL corpus files with an index.
+
+A corpus "train.jsonl" is written as the shards "train.00000.jsonl.gz", "train.00001.jsonl.gz", ...
+and the index "train.index.json", which lists the finalized shards with their instance counts and stats.
+The i-th shard holds the instances of the indices [i * shard_size, (i + 1) * shard_size).
+Each shard is generated from its own seed, so that a crashed build can be resumed by generating only the shards not in the index.
+With create_corpus.py --reproducible, each instance is generated from its own random generator made from the corpus seed and the instance index,
+thus, the shards are also independent of which worker generated the other shards before.
+
+A shard is first written to a temporary file and then renamed, and the index is also replaced atomically,
+thus, a shard in the index is always complete.
+
+Note that the generation also depends on the hash seed of python, so fix PYTHONHASHSEED to reproduce the shards.
+"""
+import io
+import os
+import gzip
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, TextIO, Union
+
+SHARD_INDEX_FORMAT_VERSION = 3
+
+COMPRESSIONS = ['none', 'gzip', 'zstd']
+_COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError('The zstd compression requires the "zstandard" package: pip install zstandard') from e
+    return zstandard
+
+
+def get_shard_seed(seed: int, i_shard: int) -> int:
+    """ The seed of a shard, which depends only on the corpus seed and the shard number. """
+    return random.Random(f'{seed}-{i_shard}').randrange(2 ** 32)
+
+
+def get_shard_path(output_path: Union[str, Path], i_shard: int, compression: str) -> Path:
+    if compression not in COMPRESSIONS:
+        raise ValueError(f'Unknown compression "{compression}". Choose from {COMPRESSIONS}')
+    output_path = Path(output_path)
+    return output_path.with_name(f'{output_path.stem}.{i_shard:05d}{output_path.suffix}{_COMPRESSION_SUFFIXES[compression]}')
+
+
+def get_index_path(output_path: Union[str, Path]) -> Path:
+    output_path = Path(output_path)
+    return output_path.with_name(f'{output_path.stem}.index.json')
+
+
+def _get_tmp_path(path: Path) -> Path:
+    return path.with_name(path.name + '.tmp')
+
+
+def open_shard(path: Union[str, Path], mode: str, compression: str) -> TextIO:
+    """ Open a shard as a text file. mode is "w" or "r". """
+    if mode not in ['w', 'r']:
+        raise ValueError(f'Unknown mode "{mode}"')
+    if compression == 'none':
+        return open(path, mode, encoding='utf-8')
+    elif compression == 'gzip':
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    elif compression == 'zstd':
+        zstandard = _import_zstandard()
+        if mode == 'w':
+            binary = zstandard.ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+        else:
+            binary = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(binary, encoding='utf-8')
+    else:
+        raise ValueError(f'Unknown compression "{compression}". Choose from {COMPRESSIONS}')
+
+
+class ShardWriter:
+    """ Write the json lines of a shard to a temporary file, which is renamed to the shard by finalize(). """
+
+    def __init__(self, path: Union[str, Path], compression: str):
+        self.path = Path(path)
+        self.compression = compression
+        self.count = 0
+        self._tmp_path = _get_tmp_path(self.path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f_out: Optional[TextIO] = open_shard(self._tmp_path, 'w', compression)
+
+    def write(self, instance: Dict[str, Any]) -> None:
+        self._f_out.write(json.dumps(instance) + '\n')
+        self.count += 1
+
+    def finalize(self) -> None:
+        self._f_out.close()
+        self._f_out = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        if self._f_out is not None:
+            self._f_out.close()
+            self._f_out = None
+        if self._tmp_path.exists():
+            self._tmp_path.unlink()
+
+
+def read_shard(path: Union[str, Path], compression: str) -> Iterable[Dict[str, Any]]:
+    with open_shard(path, 'r', compression) as f_in:
+        for line in f_in:
+            yield json.loads(line)
+
+
+class ShardIndex:
+    """ The index of the finalized shards of a corpus. """
+
+    def __init__(self,
+                 output_path: Union[str, Path],
+                 size: int,
+                 shard_size: int,
+                 seed: int,
+                 compression: str,
+                 params: Optional[Dict[str, Any]] = None):
+        """ params are the other option values on which the generated instances depend. """
+        if shard_size < 1:
+            raise ValueError(f'shard_size must be >= 1: {shard_size}')
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'Unknown compression "{compression}". Choose from {COMPRESSIONS}')
+        self.output_path = Path(output_path)
+        self.size = size
+        self.shard_size = shard_size
+        self.seed = seed
+        self.compression = compression
+        # normalized as stored in the index, e.g., the tuples become the lists.
+        self.params = json.loads(json.dumps(params or {}))
+        self.shards: Dict[int, Dict[str, Any]] = {}
+
+    @property
+    def path(self) -> Path:
+        return get_index_path(self.output_path)
+
+    @property
+    def num_shards(self) -> int:
+        return (self.size + self.shard_size - 1) // self.shard_size
+
+    def get_shard_size(self, i_shard: int) -> int:
+        return min(self.shard_size, self.size - i_shard * self.shard_size)
+
+    def get_shard_path(self, i_shard: int) -> Path:
+        return get_shard_path(self.output_path, i_shard, self.compression)
+
+    def get_shard_seed(self, i_shard: int) -> int:
+        return get_shard_seed(self.seed, i_shard)
+
+    def get_shard_instance_indices(self, i_shard: int) -> range:
+        first_instance = i_shard * self.shard_size
+        return range(first_instance, first_instance + self.get_shard_size(i_shard))
+
+    @property
+    def pending_shards(self) -> List[int]:
+        return [i_shard for i_shard in range(self.num_shards) if i_shard not in self.shards]
+
+    def add_shard(self, i_shard: int, count: int, stats: Optional[Dict[str, Any]] = None) -> None:
+        self.shards[i_shard] = {
+            'path': self.get_shard_path(i_shard).name,
+            'count': count,
+            'first_instance': i_shard * self.shard_size,
+            'seed': self.get_shard_seed(i_shard),
+            'stats': stats,
+        }
+
+    def save(self) -> None:
+        index = {
+            'format_version': SHARD_INDEX_FORMAT_VERSION,
+            'size': self.size,
+            'shard_size': self.shard_size,
+            'seed': self.seed,
+            'compression': self.compression,
+            'params': self.params,
+            'shards': [dict(shard=i_shard, **self.shards[i_shard]) for i_shard in sorted(self.shards)],
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = _get_tmp_path(self.path)
+        with open(tmp_path, 'w') as f_out:
+            json.dump(index, f_out, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, output_path: Union[str, Path]) -> 'ShardIndex':
+        """ Load the index, dropping the shards whose files are missing. """
+        with open(get_index_path(output_path)) as f_in:
+            index = json.load(f_in)
+        if index['format_version'] != SHARD_INDEX_FORMAT_VERSION:
+            raise ValueError(f'The shard index of {output_path} has the format version {index["format_version"]}, '
+                             f'but {SHARD_INDEX_FORMAT_VERSION} is expected.')
+        shard_index = cls(output_path, index['size'], index['shard_size'], index['seed'], index['compression'],
+                          params=index['params'])
+        for shard in index['shards']:
+            if shard_index.get_shard_path(shard['shard']).exists():
+                shard_index.shards[shard['shard']] = {key: val for key, val in shard.items() if key != 'shard'}
+        return shard_index
+
+    def check_consistency(self,
+                          size: int,
+                          shard_size: int,
+                          seed: int,
+                          compression: str,
+                          params: Optional[Dict[str, Any]] = None) -> None:
+        """ Check that the index is of the corpus of the same settings, which is required for resuming. """
+        for name, this, that in [('size', self.size, size),
+                                 ('shard_size', self.shard_size, shard_size),
+                                 ('seed', self.seed, seed),
+                                 ('compression', self.compression, compression)]:
+            if this != that:
+                raise ValueError(f'Can not resume since {name} differs from the index: {this} (index) != {that}')
+
+        params = json.loads(json.dumps(params or {}))
+        for name in sorted(set(self.params) | set(params)):
+            this, that = self.params.get(name, None), params.get(name, None)
+            if this != that:
+                raise ValueError(f'Can not resume since the option {name} differs from the index: {this} (index) != {that}')
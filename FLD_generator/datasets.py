@@ -3,7 +3,7 @@ import re
 from enum import Enum
 from abc import abstractmethod, ABC
 from statistics import mean, stdev
-from typing import Dict, List, Optional, Union, Iterable, Tuple, Any, Set, Tuple
+from typing import Dict, List, Optional, Union, Iterable, Tuple, Any, Set, Tuple, Sequence
 import logging
 import copy
 from collections import defaultdict
@@ -13,8 +13,9 @@ from FLD_generator.word_banks import POS, VerbForm, AdjForm, NounForm, WordForm,
 from FLD_generator.proof_tree_generation_pipeline import ProofTreeGenerationPipeline
 from FLD_generator.formula import Formula
 from FLD_generator.proof import ProofTree, ProofNode
-from FLD_generator.utils import flatten_dict, weighted_sampling, make_pretty_msg
+from FLD_generator.utils import flatten_dict, weighted_sampling, make_pretty_msg, get_rng, set_rng, using_rng, make_instance_rng
 from FLD_generator.translators.base import Translator
+from FLD_generator.stats import StatsAccumulator
 from FLD_generator.word_banks.base import WordBank
 from FLD_generator.translation_distractors import build as build_translation_distractor, TranslationDistractorGenerationFailure
 from FLD_generator.utils import (
@@ -28,6 +29,7 @@ from FLD_generator.formula_checkers import (
     is_provable,
     is_disprovable,
     is_unknown,
+    CheckerSession,
 )
 import line_profiling
 
@@ -49,7 +51,7 @@ class WorldAssumption(Enum):
 
 def _generate_random_sentence(translator: Translator) -> Optional[str]:
     acceptable_formula_reps = translator.acceptable_formulas
-    for formula_rep in random.sample(acceptable_formula_reps, len(acceptable_formula_reps)):
+    for formula_rep in get_rng().sample(acceptable_formula_reps, len(acceptable_formula_reps)):
         nls, _ = translator.translate([Formula(formula_rep)], [])
         if nls[0][1] is not None:
             return nls[0][1]
@@ -211,7 +213,8 @@ class NLProofSDataset:
                  allow_smaller_proofs=False,
                  version: str = '0.2',
                  log_stats=True,
-                 raise_if_translation_not_found=True):
+                 raise_if_translation_not_found=True,
+                 seed: Optional[int] = None):
 
         self.pipeline = pipeline
 
@@ -243,6 +246,7 @@ class NLProofSDataset:
         self.pipeline.log_stats = log_stats
         self.version = version
         self.raise_if_translation_not_found = raise_if_translation_not_found
+        self.seed = seed
 
         self.use_collapsed_translation_nodes_for_unknown_tree = use_collapsed_translation_nodes_for_unknown_tree
         if self.use_collapsed_translation_nodes_for_unknown_tree:
@@ -254,18 +258,52 @@ class NLProofSDataset:
         else:
             self.word_swap_distractor = None
 
-    @profile
     def generate(self,
                  size: int,
                  conclude_hypothesis_from_subtree_roots_if_proof_is_unknown=False,
                  conclude_hypothesis_from_random_sent_if_proof_is_unknown=False,
-                 add_randome_sentence_if_context_is_null=True) -> Iterable[Tuple[Dict, ProofTree, Optional[List[Formula]], List[str], Dict[str, Any]]]:
+                 add_randome_sentence_if_context_is_null=True,
+                 stats_accumulator: Optional[StatsAccumulator] = None,
+                 instance_indices: Optional[Sequence[int]] = None) -> Iterable[Tuple[Dict, ProofTree, Optional[List[Formula]], List[str], Dict[str, Any]]]:
         """ Generate dataset
 
         See discussions.md for the options.
+
+        Args:
+            stats_accumulator: the accumulator to which the stats of the instances are added.
+                The caller can merge the accumulators of the workers.
+            instance_indices: the indices of the instances, which are used only if the seed is specified.
+                The i-th instance is generated from its own random generator made from (seed, instance_indices[i]),
+                thus, it is the same whichever worker generates it. Defaults to range(size).
+                Without the seed, the instances are generated from the global random generator and
+                can reuse the proof trees generated for the other instances, which is faster.
         """
-        sample_cum_stats = defaultdict(int)
-        all_sample_stats = defaultdict(list)
+        if instance_indices is not None and len(instance_indices) != size:
+            raise ValueError(f'The number of instance_indices {len(instance_indices)} does not match size {size}')
+        outer_rng = get_rng(default=None)
+        try:
+            yield from self._generate(size,
+                                      conclude_hypothesis_from_subtree_roots_if_proof_is_unknown=conclude_hypothesis_from_subtree_roots_if_proof_is_unknown,
+                                      conclude_hypothesis_from_random_sent_if_proof_is_unknown=conclude_hypothesis_from_random_sent_if_proof_is_unknown,
+                                      add_randome_sentence_if_context_is_null=add_randome_sentence_if_context_is_null,
+                                      stats_accumulator=stats_accumulator,
+                                      instance_indices=instance_indices)
+        finally:
+            set_rng(outer_rng)
+
+    @profile
+    def _generate(self,
+                  size: int,
+                  conclude_hypothesis_from_subtree_roots_if_proof_is_unknown=False,
+                  conclude_hypothesis_from_random_sent_if_proof_is_unknown=False,
+                  add_randome_sentence_if_context_is_null=True,
+                  stats_accumulator: Optional[StatsAccumulator] = None,
+                  instance_indices: Optional[Sequence[int]] = None) -> Iterable[Tuple[Dict, ProofTree, Optional[List[Formula]], List[str], Dict[str, Any]]]:
+        if stats_accumulator is None:
+            stats_accumulator = StatsAccumulator()
+        if instance_indices is None:
+            instance_indices = range(size)
+        instance_rng: Optional[random.Random] = None
         i_sample = 0
         while i_sample < size:
             # print('!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! i_sample', i_sample)
@@ -273,29 +311,13 @@ class NLProofSDataset:
             logger.info('\n\n')
             logger.info(make_pretty_msg(title='generate a dataset instance', status='start', boundary_level=5))
 
-            # -- generate settings --
-            proof_stance = self._sample_proof_stance()
-            depth_idx = weighted_sampling(self._depth_weights)
-            depth = self.depths[depth_idx]
-            if proof_stance == ProofStance.UNKNOWN:
-                depth += 1
-
-            _num_distractors = random.sample(self.num_distractors, 1)[0]
-            _num_translation_distractors = random.sample(self.num_translation_distractors, 1)[0]
-            _branch_extension_steps = random.sample(self.branch_extension_steps, 1)[0]
-
-            # -- make proof tree and distractors  --
-            proof_tree, root_negation_formula, formula_distractors, translation_distractors, others, pipeline_stats = self.pipeline.run(
-                depth,
-                _branch_extension_steps,
-                _num_distractors,
-                _num_translation_distractors,
-                depth_1_reference_weight=self._depth_1_reference_weight,
-                allow_inconsistency=self.allow_inconsistency,
-                allow_smaller_proofs=self.allow_smaller_proofs,
-                force_fix_illegal_intermediate_constants=self._force_fix_illegal_intermediate_constants,
-                raise_if_translation_not_found=self.raise_if_translation_not_found,
-            )
+            # -- make proof trees and distractors  --
+            # The retries of an instance continue its random stream so that the instances keep their order.
+            if self.seed is not None and instance_rng is None:
+                instance_rng = make_instance_rng(self.seed, instance_indices[i_sample])
+            proof_stance,\
+                (proof_tree, root_negation_formula, formula_distractors, translation_distractors, others, pipeline_stats) = self._run_pipeline(instance_rng)
+            prev_rng = set_rng(instance_rng)
 
             # -- sample stance --
             if len(proof_tree.leaf_nodes) == 0:
@@ -305,7 +327,7 @@ class NLProofSDataset:
 
             # -- sample nodes --
             if proof_stance == ProofStance.UNKNOWN:
-                if random.random() < 0.5:
+                if get_rng().random() < 0.5:
                     hypothesis_formula = proof_tree.root_node.formula
                     hypothesis = self._get_sent_from_node(proof_tree.root_node)
                 else:
@@ -313,18 +335,21 @@ class NLProofSDataset:
                     hypothesis = root_negation_formula.translation or root_negation_formula.rep
 
                 could_make_unknown = False
+                leaf_nodes = proof_tree.leaf_nodes
+                leaf_session = CheckerSession([node.formula for node in leaf_nodes])
                 for _ in range(10):
                     # dead_leaf_nodes = random.sample(proof_tree.leaf_nodes, max(1, int(len(proof_tree.leaf_nodes) * 0.3)))
-                    dead_leaf_nodes = random.sample(proof_tree.leaf_nodes, 1)
-                    if is_unknown(
-                        [node.formula for node in proof_tree.leaf_nodes
-                         if node not in dead_leaf_nodes],
+                    dead_leaf_nodes = get_rng().sample(leaf_nodes, 1)
+                    if leaf_session.is_unknown(
                         hypothesis_formula,
+                        dropped_fact_indexes=[i_node for i_node, node in enumerate(leaf_nodes)
+                                              if node in dead_leaf_nodes],
                     ):
                         could_make_unknown = True
                         break
                 if not could_make_unknown:
                     logger.warning('skip the sample because we could not make UNKNOWN proof by sub-sampling nodes.')
+                    set_rng(prev_rng)
                     continue
 
             elif proof_stance == ProofStance.PROVED:
@@ -368,7 +393,7 @@ class NLProofSDataset:
             all_negative_tree_attrs = [val for name, val in others.items()
                                        if name.find('negative_tree') >= 0]
             if len(all_negative_tree_attrs) > 0:
-                negative_tree_attrs = random.choice(all_negative_tree_attrs)
+                negative_tree_attrs = get_rng().choice(all_negative_tree_attrs)
                 negative_tree, negative_tree_dead_leaf_nodes = negative_tree_attrs['tree'], negative_tree_attrs['missing_nodes']
 
             if negative_tree is not None:
@@ -536,33 +561,13 @@ class NLProofSDataset:
                 sample_stats['word_count_all'] = (sample_stats['word_count_hypothesis'] + sample_stats['word_count_context'] + sample_stats['word_count_proof']) if sample_stats['word_count_proof'] is not None else None
                 sample_stats['tree'] = 1
 
-                for name, count in sample_stats.items():
-                    if count is None:
-                        continue
-                    sample_cum_stats[name] += count
-
-                for name, count in sample_stats.items():
-                    if name.find('argument') >= 0 or name.find('translation') >= 0:
-                        continue
-                    if count is None:
-                        continue
-                    all_sample_stats[name].append(count)
-
-                sample_avg_stats = {
-                    name: count / sample_cum_stats['tree']
-                    for name, count in sample_cum_stats.items()
-                    if name != 'tree'
-                }
-
-                sample_std_stats = {
-                    name: stdev(count_list) if len(count_list) >= 2 else None
-                    for name, count_list in all_sample_stats.items()
-                }
-
-                gathered_stats = flatten_dict({'cum': sample_cum_stats, 'avg': sample_avg_stats, 'std': sample_std_stats})
+                stats_accumulator.add(sample_stats)
+                gathered_stats = stats_accumulator.to_dict()
             else:
                 gathered_stats = {}
 
+            set_rng(prev_rng)
+            instance_rng = None
             i_sample += 1
             yield dataset_json,\
                 proof_tree,\
@@ -570,11 +575,40 @@ class NLProofSDataset:
                 translation_distractors,\
                 gathered_stats
 
+    def _run_pipeline(self, rng: Optional[random.Random]) -> Tuple[ProofStance, Tuple]:
+        """ Sample the settings of an instance and run the pipeline on it, using the random generator of the instance if not None. """
+        with using_rng(rng):
+            proof_stance, depth, _branch_extension_steps, _num_distractors, _num_translation_distractors = self._sample_settings()
+        return proof_stance, self.pipeline.run(
+            depth,
+            _branch_extension_steps,
+            _num_distractors,
+            _num_translation_distractors,
+            depth_1_reference_weight=self._depth_1_reference_weight,
+            allow_inconsistency=self.allow_inconsistency,
+            allow_smaller_proofs=self.allow_smaller_proofs,
+            force_fix_illegal_intermediate_constants=self._force_fix_illegal_intermediate_constants,
+            raise_if_translation_not_found=self.raise_if_translation_not_found,
+            rng=rng,
+        )
+
+    def _sample_settings(self) -> Tuple[ProofStance, int, int, int, int]:
+        proof_stance = self._sample_proof_stance()
+        depth_idx = weighted_sampling(self._depth_weights)
+        depth = self.depths[depth_idx]
+        if proof_stance == ProofStance.UNKNOWN:
+            depth += 1
+
+        _num_distractors = get_rng().sample(self.num_distractors, 1)[0]
+        _num_translation_distractors = get_rng().sample(self.num_translation_distractors, 1)[0]
+        _branch_extension_steps = get_rng().sample(self.branch_extension_steps, 1)[0]
+        return proof_stance, depth, _branch_extension_steps, _num_distractors, _num_translation_distractors
+
     def _sample_proof_stance(self) -> ProofStance:
-        if random.random() < self.unknown_ratio:
+        if get_rng().random() < self.unknown_ratio:
             return ProofStance.UNKNOWN
         else:
-            if random.random() < 1 / 2.:
+            if get_rng().random() < 1 / 2.:
                 return ProofStance.PROVED
             else:
                 return ProofStance.DISPROVED
@@ -673,7 +707,7 @@ class NLProofSDataset:
 
         for dead_node in dead_leaf_nodes:
             if self.use_collapsed_translation_nodes_for_unknown_tree:
-                if random.random() <= 0.5 and dead_node.formula.translation is not None:
+                if get_rng().random() <= 0.5 and dead_node.formula.translation is not None:
                     try:
                         collapased_translations = self.word_swap_distractor.generate(
                             [dead_node.formula.translation],
@@ -751,7 +785,7 @@ class NLProofSDataset:
                     _node2id[node] = already_mapped_node_id
                     _id2node[already_mapped_node_id] = node
 
-        for node in random.sample(transformed_proof_and_distractor_nodes, len(transformed_proof_and_distractor_nodes)):
+        for node in get_rng().sample(transformed_proof_and_distractor_nodes, len(transformed_proof_and_distractor_nodes)):
             if self._is_int(node, proof_tree):
                 continue
             if node in _node2id:
@@ -908,7 +942,7 @@ class NLProofSDataset:
 
                 if len(subtree_root_nodes_wo_leaf) == 0:
                     sent_ids = [id_ for id_ in id2node.keys() if id_.startswith('sent')]
-                    hypothesis_premises = random.sample(sent_ids, 1)
+                    hypothesis_premises = get_rng().sample(sent_ids, 1)
                 else:
                     hypothesis_premises = [node2id[node] for node in subtree_root_nodes_wo_leaf]
 
@@ -917,7 +951,7 @@ class NLProofSDataset:
             elif conclude_hypothesis_from_random_sent_if_proof_is_unknown:
 
                 sent_ids = [id_ for id_ in id2node.keys() if id_.startswith('sent')]
-                hypothesis_premises = random.sample(sent_ids, 1)
+                hypothesis_premises = get_rng().sample(sent_ids, 1)
                 proof_elems.append(' & '.join(hypothesis_premises) + ' -> hypothesis')
 
             if len(proof_elems) > 0 and proof_elems[-1].find('void ->') >= 0:
@@ -0,0 +1,107 @@
+""" Cooperative deadlines of the generation trials.
+
+A trial runs inside using_deadline(seconds), and the loops of the generators, the distractors and the translators
+call check_deadline() at the points where it is safe to abandon the trial, which raises DeadlineExceeded once the time is up.
+The z3 checks are bounded by the remaining time via the "timeout" parameter of each solver (see get_remaining_msec()),
+thus, a trial is never interrupted inside z3, unlike the signal-based timeouts, and the deadlines work in any thread.
+
+The deadlines nest: a trial inside another trial ends at the earlier of the two deadlines.
+DeadlineExceeded.deadline tells which deadline has expired, so that an inner retry loop can pass up the expiry of the outer one.
+"""
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional, Union
+
+from .exception import FormalLogicExceptionBase
+
+
+class DeadlineExceeded(FormalLogicExceptionBase):
+
+    def __init__(self, message='', deadline: Optional['Deadline'] = None):
+        super().__init__(message)
+        self.deadline = deadline
+
+
+class Deadline:
+
+    def __init__(self,
+                 seconds: Optional[Union[float, int]] = None,
+                 parent: Optional['Deadline'] = None):
+        """ seconds=None means that this deadline itself never expires, though the parent may. """
+        self.seconds = seconds
+        self.parent = parent
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+
+    def _earliest(self) -> Optional['Deadline']:
+        """ The deadline that expires first among this and its ancestors. """
+        earliest = self if self.expires_at is not None else None
+        parent_earliest = self.parent._earliest() if self.parent is not None else None
+        if parent_earliest is not None and (earliest is None or parent_earliest.expires_at <= earliest.expires_at):
+            earliest = parent_earliest
+        return earliest
+
+    def remaining(self) -> Optional[float]:
+        """ The remaining seconds, or None if no deadline is set. """
+        earliest = self._earliest()
+        if earliest is None:
+            return None
+        return max(earliest.expires_at - time.monotonic(), 0.0)
+
+    def is_expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0.0
+
+    def check(self) -> None:
+        earliest = self._earliest()
+        if earliest is not None and time.monotonic() >= earliest.expires_at:
+            self.raise_exceeded()
+
+    def raise_exceeded(self) -> None:
+        earliest = self._earliest() or self
+        raise DeadlineExceeded(f'the deadline of {earliest.seconds} seconds has expired', deadline=earliest)
+
+
+_local = threading.local()
+
+
+def get_deadline() -> Optional[Deadline]:
+    return getattr(_local, 'deadline', None)
+
+
+@contextmanager
+def using_deadline(seconds: Optional[Union[float, int]] = None):
+    """ Run the context under the deadline of seconds, which also respects the deadline of the enclosing context. """
+    prev_deadline = get_deadline()
+    deadline = Deadline(seconds, parent=prev_deadline)
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = prev_deadline
+
+
+def check_deadline() -> None:
+    """ Raise DeadlineExceeded if the current deadline has expired. Cheap enough to call in the inner loops. """
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is not None:
+        deadline.check()
+
+
+def get_remaining_msec() -> Optional[int]:
+    """ The remaining time in milliseconds to be passed to z3, or None if no deadline is set. """
+    deadline = get_deadline()
+    if deadline is None:
+        return None
+    remaining = deadline.remaining()
+    if remaining is None:
+        return None
+    return max(int(remaining * 1000), 1)
+
+
+def raise_deadline_exceeded() -> None:
+    """ Raise DeadlineExceeded for the current deadline, e.g., when z3 gave up by the timeout we passed to it. """
+    deadline = get_deadline()
+    if deadline is None:
+        raise DeadlineExceeded('no deadline is set')
+    deadline.raise_exceeded()
@@ -1,8 +1,11 @@
 import re
-from typing import List, Optional
-from functools import lru_cache
+import math
+from collections import defaultdict, Counter
+from itertools import permutations, product
+from typing import List, Optional, Dict, Tuple
 
 from FLD_generator.exception import FormalLogicExceptionBase
+from FLD_generator.caches import get_cache
 import line_profiling
 
 
@@ -27,7 +30,7 @@ PREDICATES = [
     for char0 in _PREDICATE_ALPHABETS
     for char1 in _PREDICATE_ALPHABETS
 ][:200]
-_PREDICATE_REGEXP = re.compile('|'.join(PREDICATES))
+_PREDICATE_SET = set(PREDICATES)
 
 # XXX: do not use 'v', which is reserved for OR.
 # XXX: The number of symbols of constants must be similar to that of predicates
@@ -55,53 +58,322 @@ CONSTANTS = [
 # ]  # do not use 'v' = OR
 
 
-_CONSTANT_REGEXP = re.compile('|'.join(CONSTANTS))
+_CONSTANT_SET = set(CONSTANTS)
 
 VARIABLES = ['x', 'y', 'z']  # do not use 'v' = OR
-_VARIABLE_REGEXP = re.compile('|'.join(VARIABLES))
 
 PASs = [
     f'{pred}{arg}'
     for pred in PREDICATES
     for arg in CONSTANTS + VARIABLES + ['']
 ]
-_PAS_REGEXP = re.compile('|'.join(PASs))
-
-_UNARY_PAS_REGEXPs = {
-    f'{pred}': re.compile(
-        '|'.join([
-            f'{pred}{arg}'
-            for arg in CONSTANTS + VARIABLES
-        ])
-    )
-    for pred in PREDICATES
-}
 
-_UNIVERSAL_QUENTIFIER_REGEXP = re.compile(
-    '|'.join([f'\({variable}\)' for variable in VARIABLES])
-)
 
-_EXISTENTIAL_QUENTIFIER_REGEXP = re.compile(
-    '|'.join([f'\(E{variable}\)' for variable in VARIABLES])
+# ---------------------------------------- tokenizer ----------------------------------------
+# A token is a tuple of (type, text, start position in the rep).
+Token = Tuple[str, str, int]
+
+TOKEN_PREDICATE = 'predicate'
+TOKEN_CONSTANT = 'constant'
+TOKEN_VARIABLE = 'variable'
+TOKEN_UNIVERSAL_QUANTIFIER = 'universal_quantifier'  # "(x)"
+TOKEN_EXISTENTIAL_QUANTIFIER = 'existential_quantifier'  # "(Ex)"
+TOKEN_NEGATION = 'negation'
+TOKEN_CONJUNCTION = 'conjunction'
+TOKEN_DISJUNCTION = 'disjunction'
+TOKEN_IMPLICATION = 'implication'
+TOKEN_DERIVE = 'derive'
+TOKEN_CONTRADICTION = 'contradiction'
+TOKEN_LEFT_BRACE = 'left_brace'
+TOKEN_RIGHT_BRACE = 'right_brace'
+TOKEN_COLON = 'colon'
+TOKEN_OTHER = 'other'
+
+_VARIABLE_CHARS = ''.join(VARIABLES)
+
+# The order of the alternatives matters, e.g., "(x)" must be tried before "(", and "->" before the others.
+# Each alternative is a short literal or a character class, thus, the scan is linear in the length of rep.
+_TOKEN_REGEXP = re.compile(
+    '|'.join([
+        r'(?P<symbol>\{[A-Za-z]+\})',
+        f'(?P<{TOKEN_UNIVERSAL_QUANTIFIER}>\\([{_VARIABLE_CHARS}]\\))',
+        f'(?P<{TOKEN_EXISTENTIAL_QUANTIFIER}>\\(E[{_VARIABLE_CHARS}]\\))',
+        f'(?P<{TOKEN_VARIABLE}>[{_VARIABLE_CHARS}])',
+        f'(?P<{TOKEN_IMPLICATION}>{re.escape(IMPLICATION)})',
+        f'(?P<{TOKEN_CONTRADICTION}>{re.escape(CONTRADICTION)})',
+        f'(?P<{TOKEN_NEGATION}>{re.escape(NEGATION)})',
+        f'(?P<{TOKEN_CONJUNCTION}>{re.escape(CONJUNCTION)})',
+        f'(?P<{TOKEN_DISJUNCTION}>{re.escape(DISJUNCTION)})',
+        f'(?P<{TOKEN_DERIVE}>{re.escape(DERIVE)})',
+        f'(?P<{TOKEN_LEFT_BRACE}>\\()',
+        f'(?P<{TOKEN_RIGHT_BRACE}>\\))',
+        f'(?P<{TOKEN_COLON}>:)',
+        f'(?P<{TOKEN_OTHER}>\\S)',
+    ])
 )
 
-_QUANTIFIER_INTRO_REGEXP = re.compile(
-    '|'.join([f'\({variable}\): ' for variable in VARIABLES]\
-             + [f'\(E{variable}\): ' for variable in VARIABLES])
-)
+TOKEN_CONNECTIVES = {TOKEN_NEGATION, TOKEN_CONJUNCTION, TOKEN_DISJUNCTION, TOKEN_IMPLICATION}
+TOKEN_QUANTIFIERS = {TOKEN_UNIVERSAL_QUANTIFIER, TOKEN_EXISTENTIAL_QUANTIFIER}
+TOKEN_ARGUMENTS = {TOKEN_CONSTANT, TOKEN_VARIABLE}
+
+
+def _tokenize(rep: str) -> List[Token]:
+    tokens: List[Token] = []
+    for match in _TOKEN_REGEXP.finditer(rep):
+        type_ = match.lastgroup
+        text = match.group()
+        if type_ == 'symbol':
+            if text in _PREDICATE_SET:
+                type_ = TOKEN_PREDICATE
+            elif text in _CONSTANT_SET:
+                type_ = TOKEN_CONSTANT
+            else:
+                type_ = TOKEN_OTHER
+        tokens.append((type_, text, match.start()))
+    return tokens
+
+
+def tokenize(rep: str) -> List[Token]:
+    """ Tokenize a formula rep. White spaces are skipped.
+
+    The tokens are memoized together with the other structural properties of the formula (see _FormulaCore).
+    Do not modify the returned list.
+    """
+    return _get_formula_core(rep).tokens
+
+
+def token_end(token: Token) -> int:
+    return token[2] + len(token[1])
+
+
+def _next_is_adjacent_argument(tokens: List[Token], i_token: int) -> bool:
+    if i_token + 1 >= len(tokens):
+        return False
+    next_token = tokens[i_token + 1]
+    return next_token[0] in TOKEN_ARGUMENTS and next_token[2] == token_end(tokens[i_token])
 
 
 class ContradictionNegationError(FormalLogicExceptionBase):
     pass
 
 
+_FORMULA_CORES = get_cache('formula_cores', max_size=1000000)
+
+
+class _FormulaCore:
+    """ The structural part of a formula, shared (hash-consed) by all the Formula objects with the same rep.
+
+    The rep is tokenized once and the derived views are computed lazily on first access and memoized.
+    """
+
+    __slots__ = (
+        'rep',
+        '_tokens',
+        '_predicates',
+        '_constants',
+        '_variables',
+        '_PASs',
+        '_unary_predicates',
+        '_zeroary_predicates',
+        '_existential_quantifiers',
+        '_universal_quantifiers',
+        '_existential_variables',
+        '_universal_variables',
+        '_premise_rep',
+        '_conclusion_rep',
+        '_wo_quantifier_rep',
+        '_canonical_rep',
+        '_skeleton',
+        '_slot_template',
+    )
+
+    def __init__(self, rep: str):
+        self.rep = rep
+        self._tokens: Optional[List[Token]] = None
+        self._predicates: Optional[Tuple['Formula', ...]] = None
+        self._constants: Optional[Tuple['Formula', ...]] = None
+        self._variables: Optional[Tuple['Formula', ...]] = None
+        self._PASs: Optional[Tuple['Formula', ...]] = None
+        self._unary_predicates: Optional[Tuple['Formula', ...]] = None
+        self._zeroary_predicates: Optional[Tuple['Formula', ...]] = None
+        self._existential_quantifiers: Optional[Tuple[str, ...]] = None
+        self._universal_quantifiers: Optional[Tuple[str, ...]] = None
+        self._existential_variables: Optional[Tuple['Formula', ...]] = None
+        self._universal_variables: Optional[Tuple['Formula', ...]] = None
+        self._premise_rep: Optional[str] = None
+        self._conclusion_rep: Optional[str] = None
+        self._wo_quantifier_rep: Optional[str] = None
+        self._canonical_rep: Optional[str] = None
+        self._skeleton: Optional[str] = None
+        self._slot_template: Optional[SlotTemplate] = None
+
+    @property
+    def tokens(self) -> List[Token]:
+        if self._tokens is None:
+            self._tokens = _tokenize(self.rep)
+        return self._tokens
+
+    @property
+    def predicates(self) -> Tuple['Formula', ...]:
+        if self._predicates is None:
+            self._predicates = self._symbols(TOKEN_PREDICATE)
+        return self._predicates
+
+    @property
+    def constants(self) -> Tuple['Formula', ...]:
+        if self._constants is None:
+            self._constants = self._symbols(TOKEN_CONSTANT)
+        return self._constants
+
+    @property
+    def variables(self) -> Tuple['Formula', ...]:
+        if self._variables is None:
+            reps = {text for type_, text, _ in self.tokens if type_ == TOKEN_VARIABLE}
+            reps.update(text[-2] for type_, text, _ in self.tokens if type_ in TOKEN_QUANTIFIERS)
+            self._variables = tuple(Formula(rep) for rep in sorted(reps))
+        return self._variables
+
+    @property
+    def PASs(self) -> Tuple['Formula', ...]:
+        if self._PASs is None:
+            tokens = self.tokens
+            reps = set()
+            for i_token, (type_, text, _) in enumerate(tokens):
+                if type_ != TOKEN_PREDICATE:
+                    continue
+                if _next_is_adjacent_argument(tokens, i_token):
+                    reps.add(text + tokens[i_token + 1][1])
+                else:
+                    reps.add(text)
+            self._PASs = tuple(Formula(rep) for rep in sorted(reps))
+        return self._PASs
+
+    @property
+    def unary_predicates(self) -> Tuple['Formula', ...]:
+        if self._unary_predicates is None:
+            tokens = self.tokens
+            unary_reps = {text for i_token, (type_, text, _) in enumerate(tokens)
+                          if type_ == TOKEN_PREDICATE and _next_is_adjacent_argument(tokens, i_token)}
+            self._unary_predicates = tuple(predicate for predicate in self.predicates
+                                           if predicate.rep in unary_reps)
+        return self._unary_predicates
+
+    @property
+    def zeroary_predicates(self) -> Tuple['Formula', ...]:
+        if self._zeroary_predicates is None:
+            unary_predicate_reps = {predicate.rep for predicate in self.unary_predicates}
+            self._zeroary_predicates = tuple(predicate for predicate in self.predicates
+                                             if predicate.rep not in unary_predicate_reps)
+        return self._zeroary_predicates
+
+    @property
+    def existential_quantifiers(self) -> Tuple[str, ...]:
+        if self._existential_quantifiers is None:
+            self._existential_quantifiers = tuple(text for type_, text, _ in self.tokens
+                                                  if type_ == TOKEN_EXISTENTIAL_QUANTIFIER)
+        return self._existential_quantifiers
+
+    @property
+    def universal_quantifiers(self) -> Tuple[str, ...]:
+        if self._universal_quantifiers is None:
+            self._universal_quantifiers = tuple(text for type_, text, _ in self.tokens
+                                                if type_ == TOKEN_UNIVERSAL_QUANTIFIER)
+        return self._universal_quantifiers
+
+    @property
+    def existential_variables(self) -> Tuple['Formula', ...]:
+        if self._existential_variables is None:
+            self._existential_variables = tuple(Formula(rep[2:-1]) for rep in sorted(set(self.existential_quantifiers)))
+        return self._existential_variables
+
+    @property
+    def universal_variables(self) -> Tuple['Formula', ...]:
+        if self._universal_variables is None:
+            self._universal_variables = tuple(Formula(rep[1:-1]) for rep in sorted(set(self.universal_quantifiers)))
+        return self._universal_variables
+
+    @property
+    def premise_rep(self) -> Optional[str]:
+        if self._premise_rep is None and self.rep.find(IMPLICATION) >= 0:
+            self._premise_rep = f' {IMPLICATION} '.join(self.rep.split(f' {IMPLICATION} ')[:-1])
+        return self._premise_rep
+
+    @property
+    def conclusion_rep(self) -> Optional[str]:
+        if self._conclusion_rep is None and self.rep.find(IMPLICATION) >= 0:
+            self._conclusion_rep = self.rep.split(f' {IMPLICATION} ')[-1]
+        return self._conclusion_rep
+
+    @property
+    def wo_quantifier_rep(self) -> str:
+        if self._wo_quantifier_rep is None:
+            self._wo_quantifier_rep = _strip_quantifier_tokens(self.rep, self.tokens)
+        return self._wo_quantifier_rep
+
+    @property
+    def canonical_rep(self) -> str:
+        if self._canonical_rep is None:
+            self._canonical_rep = canonicalize_reps([self.rep])[0][0]
+        return self._canonical_rep
+
+    @property
+    def skeleton(self) -> str:
+        if self._skeleton is None:
+            self._skeleton = _replace_symbol_tokens(
+                self.rep,
+                self.tokens,
+                lambda type_, text: _SKELETON_PREDICATE if type_ == TOKEN_PREDICATE else _SKELETON_CONSTANT,
+            )
+        return self._skeleton
+
+    @property
+    def slot_template(self) -> 'SlotTemplate':
+        if self._slot_template is None:
+            self._slot_template = _make_slot_template(self.rep, self.tokens)
+        return self._slot_template
+
+    def _symbols(self, token_type: str) -> Tuple['Formula', ...]:
+        return tuple(Formula(rep)
+                     for rep in sorted({text for type_, text, _ in self.tokens if type_ == token_type}))
+
+
+def _get_formula_core(rep: str) -> _FormulaCore:
+    core = _FORMULA_CORES.get(rep)
+    if core is None:
+        core = _FormulaCore(rep)
+        _FORMULA_CORES.set(rep, core)
+    return core
+
+
 class Formula:
+    """ A formula.
+
+    The structure is parsed once per rep and shared between the Formula objects with the same rep (see _FormulaCore),
+    so that the structural properties such as predicates or PASs cost O(1) after the first access.
+    The Formula object itself stays a light-weight handle, since translations are attached to each object
+    and the objects are used as dict keys by identity (e.g., Argument.assumptions).
+
+    The Formula objects returned by the structural properties are shared. Do not modify them.
+    """
+
+    __slots__ = ('_formula_str', '_core', 'translation', 'translation_name')
 
     def __init__(self,
                  formula_str: str,
                  translation: Optional[str] = None,
                  translation_name: Optional[str] = None):
         self._formula_str = formula_str
+        self._core = _get_formula_core(formula_str)
+        self.translation = translation
+        self.translation_name = translation_name
+
+    def __getstate__(self):
+        return (self._formula_str, self.translation, self.translation_name)
+
+    def __setstate__(self, state):
+        formula_str, translation, translation_name = state
+        self._formula_str = formula_str
+        self._core = _get_formula_core(formula_str)
         self.translation = translation
         self.translation_name = translation_name
 
@@ -118,17 +390,13 @@ class Formula:
 
     @property
     def premise(self) -> Optional['Formula']:
-        if self.rep.find(IMPLICATION) < 0:
-            return None
-        else:
-            return Formula(f' {IMPLICATION} '.join(self.rep.split(f' {IMPLICATION} ')[:-1]))
+        premise_rep = self._core.premise_rep
+        return Formula(premise_rep) if premise_rep is not None else None
 
     @property
     def conclusion(self) -> Optional['Formula']:
-        if self.rep.find(IMPLICATION) < 0:
-            return None
-        else:
-            return Formula(self.rep.split(f' {IMPLICATION} ')[-1])
+        conclusion_rep = self._core.conclusion_rep
+        return Formula(conclusion_rep) if conclusion_rep is not None else None
 
     @property
     def quantifiers(self) -> List[str]:
@@ -136,36 +404,55 @@ class Formula:
 
     @property
     def existential_quantifiers(self) -> List[str]:
-        return _EXISTENTIAL_QUENTIFIER_REGEXP.findall(self.rep)
+        return list(self._core.existential_quantifiers)
 
     @property
     def universal_quantifiers(self) -> List[str]:
-        return _UNIVERSAL_QUENTIFIER_REGEXP.findall(self.rep)
+        return list(self._core.universal_quantifiers)
 
     @property
     def wo_quantifier(self) -> 'Formula':
-        return Formula(strip_quantifier(self.rep))
+        return Formula(self._core.wo_quantifier_rep)
+
+    @property
+    def canonical_rep(self) -> str:
+        """ The rep where the predicates and constants are renamed in the order of first occurrence.
+
+        Two formulas are identical up to a one-to-one renaming of the predicates and constants
+        if and only if their canonical reps are the same.
+        e.g., "{C}{b} -> ¬{A}{b}" -> "{A}{a} -> ¬{B}{a}"
+        """
+        return self._core.canonical_rep
+
+    @property
+    def skeleton(self) -> str:
+        """ The rep where all the predicates and constants are erased.
+
+        e.g., "{C}{b} -> ¬{A}{b}" -> "[P][c] -> ¬[P][c]"
+        Formulas can be identical by any (possibly many-to-one) mapping only if their skeletons are the same.
+        """
+        return self._core.skeleton
+
+    @property
+    def slot_template(self) -> 'SlotTemplate':
+        """ The rep compiled for the interpretation. See fill_slot_template(). """
+        return self._core.slot_template
 
     @property
     def predicates(self) -> List['Formula']:
-        return [Formula(rep) for rep in self._find(_PREDICATE_REGEXP)]
+        return list(self._core.predicates)
 
     @property
     def zeroary_predicates(self) -> List['Formula']:
-        unary_predicate_reps = {predicate.rep for predicate in self.unary_predicates}
-        return [predicate for predicate in self.predicates
-                if predicate.rep not in unary_predicate_reps]
-        # return [predicate for predicate in self.predicates
-        #         if all((f'{predicate.rep}{argument}' not in self.rep for argument in VARIABLES + CONSTANTS))]
+        return list(self._core.zeroary_predicates)
 
     @property
     def unary_predicates(self) -> List['Formula']:
-        return [predicate for predicate in self.predicates
-                if _UNARY_PAS_REGEXPs[predicate.rep].search(self.rep)]
+        return list(self._core.unary_predicates)
 
     @property
     def constants(self) -> List['Formula']:
-        return [Formula(rep) for rep in self._find(_CONSTANT_REGEXP)]
+        return list(self._core.constants)
 
     @property
     def interprands(self) -> List['Formula']:
@@ -173,19 +460,19 @@ class Formula:
 
     @property
     def variables(self) -> List['Formula']:
-        return [Formula(rep) for rep in self._find(_VARIABLE_REGEXP)]
+        return list(self._core.variables)
 
     @property
     def existential_variables(self) -> List['Formula']:
-        return [Formula(rep[2:-1]) for rep in self._find(_EXISTENTIAL_QUENTIFIER_REGEXP)]
+        return list(self._core.existential_variables)
 
     @property
     def universal_variables(self) -> List['Formula']:
-        return [Formula(rep[1:-1]) for rep in self._find(_UNIVERSAL_QUENTIFIER_REGEXP)]
+        return list(self._core.universal_variables)
 
     @property
     def PASs(self) -> List['Formula']:
-        return [Formula(rep) for rep in self._find(_PAS_REGEXP)]
+        return list(self._core.PASs)
 
     @property
     def zeroary_PASs(self) -> List['Formula']:
@@ -193,12 +480,13 @@ class Formula:
 
     @property
     def unary_PASs(self) -> List['Formula']:
-        return [PAS for PAS in self.PASs
-                if PAS not in self.zeroary_predicates]
+        zeroary_predicate_reps = {predicate.rep for predicate in self._core.zeroary_predicates}
+        return [PAS for PAS in self._core.PASs
+                if PAS.rep not in zeroary_predicate_reps]
 
     @property
     def interprand_PASs(self) -> List['Formula']:
-        return [PAS for PAS in self.PASs
+        return [PAS for PAS in self._core.PASs
                 if len(PAS.variables) == 0]
 
     @property
@@ -210,9 +498,6 @@ class Formula:
         return [PAS for PAS in self.unary_PASs
                 if len(PAS.variables) == 0]
 
-    def _find(self, regexp) -> List[str]:
-        return sorted(set(regexp.findall(self.rep)))
-
 
 def eliminate_double_negation(formula: Formula) -> Formula:
     return Formula(re.sub(f'{NEGATION}{NEGATION}', '', formula.rep))
@@ -286,6 +571,148 @@ def has_contradiction_symbol(formula: Formula) -> bool:
     return formula.rep.find(CONTRADICTION) >= 0
 
 
-@lru_cache(maxsize=10000000)
+def canonicalize_reps(reps: List[str]) -> Tuple[List[str], Dict[str, str]]:
+    """ Rename the predicates and constants jointly over reps in the order of first occurrence.
+
+    Returns:
+        the canonical reps and the mapping from the original symbols to the canonical ones.
+    """
+    mapping: Dict[str, str] = {}
+    num_predicates = 0
+    num_constants = 0
+
+    def rename(type_: str, text: str) -> str:
+        nonlocal num_predicates, num_constants
+        renamed = mapping.get(text, None)
+        if renamed is None:
+            if type_ == TOKEN_PREDICATE:
+                renamed = PREDICATES[num_predicates]
+                num_predicates += 1
+            else:
+                renamed = CONSTANTS[num_constants]
+                num_constants += 1
+            mapping[text] = renamed
+        return renamed
+
+    canonical_reps = [_replace_symbol_tokens(rep, tokenize(rep), rename) for rep in reps]
+    return canonical_reps, mapping
+
+
+def canonicalize_rep_set(reps: List[str], max_orderings: Optional[int] = 100) -> Tuple[str, ...]:
+    """ A canonical form of the set of formulas, which is invariant to the order of formulas
+    and to the one-to-one renaming of the predicates and constants.
+
+    The formulas are ordered by their renaming-invariant signatures
+    (the skeleton and where each symbol occurs in the whole set) and then renamed by canonicalize_reps().
+    Among the formulas with the same signature, we choose the order which gives the smallest result.
+    If the number of such orders exceeds max_orderings, we use one of them, which is still a renaming of the set but may not be canonical.
+    """
+    cores = [_get_formula_core(rep) for rep in reps]
+
+    formula_symbols: List[List[str]] = []
+    symbol_occurrences: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+    for core in cores:
+        symbols = [text for type_, text, _ in core.tokens if type_ == TOKEN_PREDICATE or type_ == TOKEN_CONSTANT]
+        for i_symbol, symbol in enumerate(symbols):
+            symbol_occurrences[symbol].append((core.skeleton, i_symbol))
+        formula_symbols.append(symbols)
+    symbol_signatures = {symbol: tuple(sorted(occurrences)) for symbol, occurrences in symbol_occurrences.items()}
+
+    signatures = [
+        (core.skeleton, tuple(symbol_signatures[symbol] for symbol in symbols))
+        for core, symbols in zip(cores, formula_symbols)
+    ]
+
+    groups: Dict[Tuple, List[str]] = defaultdict(list)
+    for signature, rep in sorted(zip(signatures, reps)):
+        groups[signature].append(rep)
+    group_reps = [groups[signature] for signature in sorted(groups)]
+
+    num_orderings = 1
+    for _reps in group_reps:
+        num_orderings *= math.factorial(len(_reps))
+        for cnt in Counter(_reps).values():
+            num_orderings //= math.factorial(cnt)
+
+    if num_orderings == 1 or (max_orderings is not None and num_orderings > max_orderings):
+        return tuple(canonicalize_reps([rep for _reps in group_reps for rep in _reps])[0])
+
+    group_orderings = [sorted(set(permutations(_reps))) for _reps in group_reps]
+    return min(
+        tuple(canonicalize_reps([rep for _reps in ordering for rep in _reps])[0])
+        for ordering in product(*group_orderings)
+    )
+
+
+_SKELETON_PREDICATE = '[P]'
+_SKELETON_CONSTANT = '[c]'
+
+
+def _replace_symbol_tokens(rep: str, tokens: List[Token], replace_func) -> str:
+    pieces: List[str] = []
+    pos = 0
+    for type_, text, start in tokens:
+        if type_ != TOKEN_PREDICATE and type_ != TOKEN_CONSTANT:
+            continue
+        pieces.append(rep[pos:start])
+        pieces.append(replace_func(type_, text))
+        pos = start + len(text)
+    pieces.append(rep[pos:])
+    return ''.join(pieces)
+
+
+# A slot template is the rep split into the symbols "{...}" and the literal fragments between them,
+# together with the (index in the parts, symbol) of the symbol parts.
+# e.g., "{A}{a} -> ¬{B}" -> (("{A}", "{a}", " -> ¬", "{B}"), ((0, "{A}"), (1, "{a}"), (3, "{B}")))
+SlotTemplate = Tuple[Tuple[str, ...], Tuple[Tuple[int, str], ...]]
+
+
+def _make_slot_template(rep: str, tokens: List[Token]) -> SlotTemplate:
+    parts: List[str] = []
+    slots: List[Tuple[int, str]] = []
+    pos = 0
+    for _, text, start in tokens:
+        # the symbols include those which are neither predicates nor constants, as they are also interpreted by a mapping.
+        if len(text) < 3 or text[0] != '{':
+            continue
+        if start > pos:
+            parts.append(rep[pos:start])
+        slots.append((len(parts), text))
+        parts.append(text)
+        pos = start + len(text)
+    if pos < len(rep):
+        parts.append(rep[pos:])
+    return tuple(parts), tuple(slots)
+
+
+def fill_slot_template(slot_template: SlotTemplate, mapping: Dict[str, str]) -> str:
+    """ Replace the symbols in the slot template by the mapping. The symbols not in the mapping are left as they are. """
+    parts, slots = slot_template
+    filled_parts = list(parts)
+    for i_part, symbol in slots:
+        value = mapping.get(symbol, None)
+        if value is not None:
+            filled_parts[i_part] = value
+    return ''.join(filled_parts)
+
+
 def strip_quantifier(rep: str) -> str:
-    return _QUANTIFIER_INTRO_REGEXP.sub('', rep)
+    return _get_formula_core(rep).wo_quantifier_rep
+
+
+def _strip_quantifier_tokens(rep: str, tokens: List[Token]) -> str:
+    """ Remove the quantifier intros, i.e., "(x): " and "(Ex): " """
+    pieces: List[str] = []
+    pos = 0
+    for type_, text, start in tokens:
+        if type_ not in TOKEN_QUANTIFIERS:
+            continue
+        end = start + len(text)
+        if not rep.startswith(': ', end):
+            continue
+        pieces.append(rep[pos:start])
+        pos = end + 2
+    if pos == 0:
+        return rep
+    pieces.append(rep[pos:])
+    return ''.join(pieces)
@@ -14,4 +14,9 @@ from .z3_logic_checkers import (
     is_equiv,
     is_weaker,
     is_trivial,
+    CheckerSession,
+    get_check_sat_cache_stats,
+    configure_persistent_check_sat_cache,
+    flush_persistent_check_sat_cache,
+    get_persistent_check_sat_cache_stats,
 )
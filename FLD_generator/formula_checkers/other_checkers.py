@@ -11,6 +11,7 @@ from FLD_generator.formula import (
     NEGATION,
     CONSTANTS,
 )
+from FLD_generator.caches import get_cache
 import line_profiling
 
 logger = logging.getLogger(__name__)
@@ -67,8 +68,7 @@ def _is_inconsistent(formula: Formula) -> bool:
     ))
 
 
-_is_inconsistent_set_cache: Dict[str, bool] = {}
-_is_inconsistent_set_cache_size = 10000000
+_is_inconsistent_set_cache = get_cache('is_inconsistent_set', max_size=1000000)
 
 
 @profile
@@ -105,18 +105,17 @@ def _is_inconsistent_set(formulas: List[Formula]) -> bool:
     formulas = [eliminate_double_negation(formula) for formula in formulas]
 
     cache = _is_inconsistent_set_cache
-    cache_size = _is_inconsistent_set_cache_size
-    if len(cache) >= cache_size:
-        cache = {}
     cache_key = formulas[0].rep if len(formulas) == 1 else None
 
-    if cache_key is not None and cache_key in cache:
-        return cache[cache_key]
+    if cache_key is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
 
     # Check whether any of formulas are inconsistent by itself.
     if any((_is_inconsistent(formula) for formula in formulas)):
         if cache_key is not None:
-            cache[cache_key] = True
+            cache.set(cache_key, True)
         return True
 
     # Check whether some PAS (like "Ga") appear both as true and as false in formulas.
@@ -138,16 +137,15 @@ def _is_inconsistent_set(formulas: List[Formula]) -> bool:
                 if ('T' in this_bools and 'F' in that_bools)\
                         or ('F' in this_bools and 'T' in that_bools):
                     if cache_key is not None:
-                        cache[cache_key] = True
+                        cache.set(cache_key, True)
                     return True
 
     if cache_key is not None:
-        cache[cache_key] = False
+        cache.set(cache_key, False)
     return False
 
 
-_is_nonsense_cache: Dict[str, bool] = {}
-_is_nonsense_cache_size = 10000000
+_is_nonsense_cache = get_cache('is_nonsense', max_size=1000000)
 
 
 @profile
@@ -178,18 +176,16 @@ def is_nonsense(formula: Formula,
     rep = formula.rep
 
     cache = _is_nonsense_cache
-    cache_size = _is_nonsense_cache_size
-    if len(cache) >= cache_size:
-        cache = {}
     cache_key = formula.rep
 
-    if cache_key in cache:
-        return cache[cache_key]
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     formula = eliminate_double_negation(formula)
 
     if formula.premise is None and _is_inconsistent_set([formula]):
-        cache[cache_key] = True
+        cache.set(cache_key, True)
         return True
 
     # detect fromulas like: {A} -> ¬{A}
@@ -201,13 +197,13 @@ def is_nonsense(formula: Formula,
             if ('T' in bool_in_conclusion and 'F' in bool_in_premise)\
                     or ('F' in bool_in_conclusion and 'T' in bool_in_premise):
                 # this block means "contradiction getween premise and conclusion"
-                cache[cache_key] = True
+                cache.set(cache_key, True)
                 return True
 
             # this block is like "A -> A", "A -> (A & B)" -> This is OK, for example, &
             if ('T' in bool_in_conclusion and 'T' in bool_in_premise)\
                     or ('F' in bool_in_conclusion and 'F' in bool_in_premise):
-                cache[cache_key] = True
+                cache.set(cache_key, True)
                 return True
     else:
         pass
@@ -218,15 +214,14 @@ def is_nonsense(formula: Formula,
         if match is not None:
             left, right = match.group().lstrip('(').rstrip(')').split(f' {op} ')
             if left == right:
-                cache[cache_key] = True
+                cache.set(cache_key, True)
                 return True
 
-    cache[cache_key] = False
+    cache.set(cache_key, False)
     return False
 
 
-_get_boolean_values_cache: Dict[Tuple[str, str], Set[str]] = {}
-_get_boolean_values_cache_size = 10000000
+_get_boolean_values_cache = get_cache('get_boolean_values', max_size=1000000)
 
 
 @profile
@@ -242,13 +237,11 @@ def _get_boolean_values(formula: Formula, PAS: Formula) -> Set[str]:
         * It might be more robust to use external solvers like tableau generators.
     """
     cache = _get_boolean_values_cache
-    cache_size = _get_boolean_values_cache_size
-    if len(cache) >= cache_size:
-        cache = {}
     cache_key = (formula.rep, PAS.rep)
 
-    if cache_key in cache:
-        return cache[cache_key]
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     if len(PAS.predicates) != 1:
         raise ValueError(f'PAS must have exactly one predicate. actual: {PAS}')
@@ -266,9 +259,9 @@ def _get_boolean_values(formula: Formula, PAS: Formula) -> Set[str]:
             bound_PAS = Formula(PAS.rep.replace(variable.rep, constant))
             booleans_on_bound_formula = _get_boolean_values(bound_formula, bound_PAS)
             if len(booleans_on_bound_formula) >= 1:
-                cache[cache_key] = booleans_on_bound_formula
+                cache.set(cache_key, booleans_on_bound_formula)
                 return booleans_on_bound_formula
-        cache[cache_key] = set()
+        cache.set(cache_key, set())
         return set()
 
     # e.g.) formula: "(Ex): {B}x -> {A}x"     PAS: "{A}x"
@@ -277,11 +270,11 @@ def _get_boolean_values(formula: Formula, PAS: Formula) -> Set[str]:
         if any(target_v in formula_variables for target_v in PAS.variables):
             # We can not determine
             # since we regard "x" without quantification denotes all the constants.
-            cache[cache_key] = set()
+            cache.set(cache_key, set())
             return set()
 
     if PAS.rep not in [_pa.rep for _pa in formula.PASs]:
-        cache[cache_key] = set()
+        cache.set(cache_key, set())
         return set()
 
     values = set()
@@ -346,5 +339,5 @@ def _get_boolean_values(formula: Formula, PAS: Formula) -> Set[str]:
                        rep)
         # raise NotImplementedError(f'Please add patterns to handle {rep}')
 
-    cache[cache_key] = values
+    cache.set(cache_key, values)
     return values
@@ -9,4 +9,9 @@ from .checkers import (
     is_equiv,
     is_weaker,
     is_trivial,
+    CheckerSession,
+    get_check_sat_cache_stats,
+    configure_persistent_check_sat_cache,
+    flush_persistent_check_sat_cache,
+    get_persistent_check_sat_cache_stats,
 )
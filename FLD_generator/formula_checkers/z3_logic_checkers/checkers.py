@@ -1,5 +1,6 @@
-from typing import Optional, Tuple, Any, Union, List, Dict, Iterable
+from typing import Optional, Tuple, Any, Union, List, Dict, Iterable, Set
 import logging
+import hashlib
 from functools import lru_cache
 
 from z3.z3types import Z3Exception
@@ -10,9 +11,8 @@ from FLD_generator.formula import (
     negate,
     is_contradiction_symbol,
     has_contradiction_symbol,
+    canonicalize_rep_set,
 )
-from FLD_generator.interpretation import generate_mappings_from_predicates_and_constants, interpret_formula, interpret_formulas
-from FLD_generator.formula import PREDICATES, CONSTANTS
 from z3 import (
     DeclareSort,
     BoolSort,
@@ -31,9 +31,13 @@ from z3 import (
     Solver,
 
     sat,
+    unknown,
     is_true,
     ModelRef,
 )
+from FLD_generator.caches import get_cache, SQLiteCache
+from FLD_generator.timings import timed
+from FLD_generator.deadlines import check_deadline, get_remaining_msec, raise_deadline_exceeded
 from .intermediates import (
     parse as parse_to_intermediate,
     I_IMPLICATION,
@@ -151,27 +155,73 @@ def parse(rep: str):
     return go(interm)
 
 
-_CHECK_SAT_CACHE = {}
-_CHECK_SAT_CACHE_SIZE = 10000000
-_CHECK_SAT_NORMALIZED_FORMULAS_MAX_SIZE = 20
+_CHECK_SAT_CACHE = get_cache('check_sat', max_size=1000000)
+_CHECK_SAT_CACHE_KEY_MAX_ORDERINGS = 100
+_CHECK_SAT_PERSISTENT_CACHE: Optional[SQLiteCache] = None
 
 
-@profile
-def _get_normalized_formuas(formulas: List[Formula], max_size: Optional[int] = None) -> Iterable[List[Formula]]:
-    predicates = sorted({pred.rep for formula in formulas for pred in formula.predicates})
-    constants = sorted({const.rep for formula in formulas for const in formula.constants})
-    for i, mapping in enumerate(
-            generate_mappings_from_predicates_and_constants(
-            predicates,
-            constants,
-            PREDICATES[:len(predicates)],
-            CONSTANTS[:len(constants)],
-            allow_many_to_one=False,
-        )):
-        if i >= max_size:
-            return
-        # yield [interpret_formula(formula, mapping) for formula in formulas]
-        yield interpret_formulas(formulas, mapping)
+def get_check_sat_cache_stats() -> Dict[str, int]:
+    return _CHECK_SAT_CACHE.stats()
+
+
+def configure_persistent_check_sat_cache(path: Optional[str], max_size: int = 10000000) -> None:
+    """ Back the in-memory check_sat cache by an SQLite file shared across runs and processes.
+
+    path=None disables the persistent cache.
+    """
+    global _CHECK_SAT_PERSISTENT_CACHE
+    if _CHECK_SAT_PERSISTENT_CACHE is not None:
+        _CHECK_SAT_PERSISTENT_CACHE.close()
+    _CHECK_SAT_PERSISTENT_CACHE = SQLiteCache(path, max_size=max_size) if path is not None else None
+
+
+def flush_persistent_check_sat_cache() -> None:
+    if _CHECK_SAT_PERSISTENT_CACHE is not None:
+        _CHECK_SAT_PERSISTENT_CACHE.flush()
+
+
+def get_persistent_check_sat_cache_stats() -> Optional[Dict[str, int]]:
+    if _CHECK_SAT_PERSISTENT_CACHE is None:
+        return None
+    return _CHECK_SAT_PERSISTENT_CACHE.stats()
+
+
+def _is_check_sat_cache_enabled() -> bool:
+    return _CHECK_SAT_CACHE.enabled or _CHECK_SAT_PERSISTENT_CACHE is not None
+
+
+def _get_cached_sat(cache_key: Tuple[str, ...]) -> Optional[bool]:
+    is_sat = _CHECK_SAT_CACHE.get(cache_key)
+    if is_sat is None and _CHECK_SAT_PERSISTENT_CACHE is not None:
+        is_sat = _CHECK_SAT_PERSISTENT_CACHE.get(_persistent_check_sat_cache_key(cache_key))
+        if is_sat is not None:
+            _CHECK_SAT_CACHE.set(cache_key, is_sat)
+    return is_sat
+
+
+def _set_cached_sat(cache_key: Tuple[str, ...], is_sat: bool) -> None:
+    _CHECK_SAT_CACHE.set(cache_key, is_sat)
+    if _CHECK_SAT_PERSISTENT_CACHE is not None:
+        _CHECK_SAT_PERSISTENT_CACHE.set(_persistent_check_sat_cache_key(cache_key), is_sat)
+
+
+def _persistent_check_sat_cache_key(cache_key: Tuple[str, ...]) -> str:
+    return hashlib.sha1('\n'.join(cache_key).encode('utf-8')).hexdigest()
+
+
+_Z3_NO_TIMEOUT_MSEC = 4294967295  # the default of z3
+
+
+def _check_within_deadline(solver: Solver, *assumptions) -> bool:
+    """ solver.check() == sat, where z3 gives up at the current deadline and then DeadlineExceeded is raised. """
+    check_deadline()
+    timeout_msec = get_remaining_msec()
+    solver.set('timeout', timeout_msec if timeout_msec is not None else _Z3_NO_TIMEOUT_MSEC)
+    with timed('z3_check'):
+        result = solver.check(*assumptions)
+    if result == unknown and timeout_msec is not None and solver.reason_unknown() in ['timeout', 'canceled']:
+        raise_deadline_exceeded()
+    return result == sat
 
 
 @profile
@@ -181,35 +231,27 @@ def check_sat(formulas: List[Formula],
     for formula in formulas:
         _raise_with_contradiction(formula)
 
-    global _CHECK_SAT_CACHE
+    cache_key = _check_sat_cache_key(formulas) if _is_check_sat_cache_enabled() else None
 
-    cache_keys = [_check_sat_cache_key(formulas)]
-    for normalized_formulas in _get_normalized_formuas(formulas,
-                                                       max_size=_CHECK_SAT_NORMALIZED_FORMULAS_MAX_SIZE):
-        cache_keys.append(_check_sat_cache_key(normalized_formulas))
-        
     # model and parse is object, thus we do not cache them.
-    if not get_model and not get_parse:
-        for cache_key in cache_keys:
-            if cache_key in _CHECK_SAT_CACHE:
-                return _CHECK_SAT_CACHE[cache_key]
-
+    if cache_key is not None and not get_model and not get_parse:
+        is_sat = _get_cached_sat(cache_key)
+        if is_sat is not None:
+            return is_sat
 
     solver = Solver()
     parsed = [parse(formula.rep) for formula in formulas]
 
     solver.add(*parsed)
 
-    is_sat = solver.check() == sat
+    is_sat = _check_within_deadline(solver)
     if is_sat:
         model = solver.model()
     else:
         model = None
 
-    for cache_key in cache_keys:
-        _CHECK_SAT_CACHE[cache_key] = is_sat
-    if len(_CHECK_SAT_CACHE) >= _CHECK_SAT_CACHE_SIZE:   # reset
-        _CHECK_SAT_CACHE = {}
+    if cache_key is not None:
+        _set_cached_sat(cache_key, is_sat)
 
     if get_model or get_parse:
         ret = [is_sat]
@@ -222,8 +264,10 @@ def check_sat(formulas: List[Formula],
         return is_sat
 
 
-def _check_sat_cache_key(formulas: List[Formula]) -> Tuple:
-    return tuple(sorted(formula.rep for formula in formulas))
+def _check_sat_cache_key(formulas: List[Formula]) -> Tuple[str, ...]:
+    # satisfiability is invariant to the order of formulas and the renaming of predicates and constants.
+    return canonicalize_rep_set([formula.rep for formula in formulas],
+                                max_orderings=_CHECK_SAT_CACHE_KEY_MAX_ORDERINGS)
 
 
 @profile
@@ -297,3 +341,188 @@ def is_trivial(formula: Formula) -> bool:
     if is_contradiction_symbol(formula):
         return True
     return is_tautology(formula) or is_contradiction(formula)
+
+
+class CheckerSession:
+    """ An incremental checker over a fixed set of facts.
+
+    A single solver holds all the facts, each guarded by its own assumption literal,
+    so that the queries which differ by a few facts, such as dropping one fact, do not rebuild the solver.
+    Additional formulas, such as the (negated) hypotheses, are also added once and toggled by their literals.
+    """
+
+    def __init__(self, facts: List[Formula]):
+        for fact in facts:
+            _raise_with_contradiction(fact)
+        self.facts = list(facts)
+
+        self._solver = Solver()
+        self._fact_literals: List[Bool] = []
+        for i_fact, fact in enumerate(self.facts):
+            literal = Bool(f'__fact_{i_fact}')
+            self._solver.add(Implies(literal, parse(fact.rep)))
+            self._fact_literals.append(literal)
+        self._extra_literals: Dict[str, Bool] = {}
+
+    def _get_extra_literal(self, formula: Formula) -> Bool:
+        if formula.rep not in self._extra_literals:
+            _raise_with_contradiction(formula)
+            literal = Bool(f'__extra_{len(self._extra_literals)}')
+            self._solver.add(Implies(literal, parse(formula.rep)))
+            self._extra_literals[formula.rep] = literal
+        return self._extra_literals[formula.rep]
+
+    @profile
+    def check_sat(self,
+                  extra_formulas: Optional[List[Formula]] = None,
+                  dropped_fact_indexes: Optional[Iterable[int]] = None) -> bool:
+        """ check_sat(facts + extra_formulas) where the facts at dropped_fact_indexes are excluded. """
+        extra_formulas = extra_formulas or []
+        dropped_fact_indexes = set(dropped_fact_indexes or [])
+
+        formulas = [fact for i_fact, fact in enumerate(self.facts) if i_fact not in dropped_fact_indexes] + extra_formulas
+        cache_key = _check_sat_cache_key(formulas) if _is_check_sat_cache_enabled() else None
+        if cache_key is not None:
+            is_sat = _get_cached_sat(cache_key)
+            if is_sat is not None:
+                return is_sat
+
+        assumptions = [literal for i_fact, literal in enumerate(self._fact_literals)
+                       if i_fact not in dropped_fact_indexes]
+        assumptions.extend(self._get_extra_literal(formula) for formula in extra_formulas)
+        is_sat = _check_within_deadline(self._solver, *assumptions)
+
+        if cache_key is not None:
+            _set_cached_sat(cache_key, is_sat)
+        return is_sat
+
+    @profile
+    def get_unsat_core(self,
+                       extra_formulas: Optional[List[Formula]] = None,
+                       dropped_fact_indexes: Optional[Iterable[int]] = None,
+                       minimize=False) -> Optional[Tuple[List[int], List[Formula]]]:
+        """ An unsat core of facts + extra_formulas, or None if they are satisfiable.
+
+        The core is returned as the indexes of the facts and the extra formulas in it.
+        If minimize=True, z3 minimizes the core so that dropping any element of it makes the core satisfiable.
+        """
+        extra_formulas = extra_formulas or []
+        dropped_fact_indexes = set(dropped_fact_indexes or [])
+
+        assumptions = [literal for i_fact, literal in enumerate(self._fact_literals)
+                       if i_fact not in dropped_fact_indexes]
+        assumptions.extend(self._get_extra_literal(formula) for formula in extra_formulas)
+
+        self._solver.set('core.minimize', minimize)
+        is_sat = _check_within_deadline(self._solver, *assumptions)
+        if is_sat:
+            core = None
+        else:
+            core_literal_ids = {literal.get_id() for literal in self._solver.unsat_core()}
+            core = (
+                [i_fact for i_fact, literal in enumerate(self._fact_literals)
+                 if i_fact not in dropped_fact_indexes and literal.get_id() in core_literal_ids],
+                [formula for formula in extra_formulas
+                 if self._extra_literals[formula.rep].get_id() in core_literal_ids],
+            )
+        self._solver.set('core.minimize', False)
+        return core
+
+    def is_provable(self, hypothesis: Formula, dropped_fact_indexes: Optional[Iterable[int]] = None) -> bool:
+        if is_contradiction_symbol(hypothesis):
+            return not self.check_sat(dropped_fact_indexes=dropped_fact_indexes)
+        return not self.check_sat(extra_formulas=[negate(hypothesis)], dropped_fact_indexes=dropped_fact_indexes)
+
+    def is_disprovable(self, hypothesis: Formula, dropped_fact_indexes: Optional[Iterable[int]] = None) -> bool:
+        if is_contradiction_symbol(hypothesis):
+            raise ValueError(f'we do not have a concept of "disproving the contradiction {hypothesis.rep}", i.e., proving the negated contradiction'
+                             'because we do not have a concept of "negated contradiction"')
+        return not self.check_sat(extra_formulas=[hypothesis], dropped_fact_indexes=dropped_fact_indexes)
+
+    def is_unknown(self, hypothesis: Formula, dropped_fact_indexes: Optional[Iterable[int]] = None) -> bool:
+        if is_contradiction_symbol(hypothesis):
+            return not self.is_provable(hypothesis, dropped_fact_indexes=dropped_fact_indexes)
+        return not self.is_provable(hypothesis, dropped_fact_indexes=dropped_fact_indexes)\
+            and not self.is_disprovable(hypothesis, dropped_fact_indexes=dropped_fact_indexes)
+
+    def find_droppable_fact(self,
+                            hypothesis: Formula,
+                            droppable_fact_indexes: Optional[Iterable[int]] = None,
+                            disprove=False) -> Optional[int]:
+        """ Find the fact such that the hypothesis is still provable (or disprovable if disprove=True) without it. """
+        droppable_fact_indexes = range(len(self.facts)) if droppable_fact_indexes is None else droppable_fact_indexes
+        for i_fact in droppable_fact_indexes:
+            if disprove:
+                if self.is_disprovable(hypothesis, dropped_fact_indexes=[i_fact]):
+                    return i_fact
+            else:
+                if self.is_provable(hypothesis, dropped_fact_indexes=[i_fact]):
+                    return i_fact
+        return None
+
+    @profile
+    def find_droppable_fact_by_unsat_core(self,
+                                          hypothesis: Formula,
+                                          droppable_fact_indexes: Optional[Iterable[int]] = None,
+                                          disprove=False) -> Optional[int]:
+        """ The same as find_droppable_fact() but usually decided by a single solver call.
+
+        A droppable fact which is not in the minimized unsat core is found directly.
+        Otherwise, a fact in the core is droppable only if the facts outside the core can substitute for it.
+        Since a minimal unsat set of equality-free formulas is connected by the shared predicates,
+        this is possible only when some fact outside the core shares predicates, transitively, with the hypothesis.
+        Only in such case, we fall back on find_droppable_fact().
+        """
+        droppable_fact_indexes = list(range(len(self.facts)) if droppable_fact_indexes is None else droppable_fact_indexes)
+
+        if disprove:
+            if is_contradiction_symbol(hypothesis):
+                raise ValueError(f'we do not have a concept of "disproving the contradiction {hypothesis.rep}", i.e., proving the negated contradiction'
+                                 'because we do not have a concept of "negated contradiction"')
+            extra_formulas = [hypothesis]
+        elif is_contradiction_symbol(hypothesis):
+            extra_formulas = []
+        else:
+            extra_formulas = [negate(hypothesis)]
+
+        core = self.get_unsat_core(extra_formulas=extra_formulas, minimize=True)
+        if core is None:
+            # can not be (dis)proved even with all the facts.
+            return None
+        core_fact_indexes, core_extra_formulas = core
+
+        core_fact_index_set = set(core_fact_indexes)
+        for i_fact in droppable_fact_indexes:
+            if i_fact not in core_fact_index_set:
+                return i_fact
+
+        outside_fact_indexes = [i_fact for i_fact in range(len(self.facts)) if i_fact not in core_fact_index_set]
+        if len(outside_fact_indexes) == 0 and (len(extra_formulas) == 0 or len(core_extra_formulas) > 0):
+            # Dropping a fact from a minimal core which includes the extra formulas leaves them satisfiable, thus, unproved.
+            # A core of only the facts, i.e., of the inconsistent facts, does not tell this, since another core may be left.
+            return None
+        if len(extra_formulas) > 0 and len(core_extra_formulas) > 0:
+            connected_predicates = _get_connected_predicates(extra_formulas, self.facts)
+            if all(connected_predicates.isdisjoint(pred.rep for pred in self.facts[i_fact].predicates)
+                   for i_fact in outside_fact_indexes):
+                # The outside facts can not substitute for the facts in the core unless they are inconsistent by themselves.
+                if self.check_sat(dropped_fact_indexes=core_fact_indexes):
+                    return None
+        return self.find_droppable_fact(hypothesis, droppable_fact_indexes=droppable_fact_indexes, disprove=disprove)
+
+
+def _get_connected_predicates(seed_formulas: List[Formula], formulas: List[Formula]) -> Set[str]:
+    """ The predicates connected to the seed formulas through the formulas sharing the predicates. """
+    connected_predicates = {pred.rep for formula in seed_formulas for pred in formula.predicates}
+    remaining_formulas = list(formulas)
+    while True:
+        unconnected_formulas = []
+        for formula in remaining_formulas:
+            predicates = {pred.rep for pred in formula.predicates}
+            if connected_predicates.isdisjoint(predicates):
+                unconnected_formulas.append(formula)
+            else:
+                connected_predicates.update(predicates)
+        if len(unconnected_formulas) == len(remaining_formulas):
+            return connected_predicates
+        remaining_formulas = unconnected_formulas
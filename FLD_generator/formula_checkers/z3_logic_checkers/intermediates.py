@@ -1,8 +1,15 @@
-from typing import Optional, Tuple, Any, Union
-import re
+from typing import Optional, Tuple, Any, Union, List
 
 from FLD_generator.formula import (
-    Formula,
+    Token,
+    tokenize,
+    token_end,
+    TOKEN_CONNECTIVES,
+    TOKEN_QUANTIFIERS,
+    TOKEN_UNIVERSAL_QUANTIFIER,
+    TOKEN_LEFT_BRACE,
+    TOKEN_RIGHT_BRACE,
+    TOKEN_COLON,
     IMPLICATION,
     CONJUNCTION,
     DISJUNCTION,
@@ -52,68 +59,42 @@ def parse(formula_rep: str,
     if formula_rep.find(DERIVE) > 0:
         raise Exception()
 
-    def head_is_connective(rep: str) -> bool:
-        return any(tail_rep.startswith(op_rep)
-                   for op_rep in [IMPLICATION, CONJUNCTION, DISJUNCTION, NEGATION])
+    tokens = tokenize(formula_rep)
+    parsed, i_token = _parse_tokens(formula_rep, tokens, 0, len(tokens), only_next_element)
 
-    def head_is_quantifier(rep: str) -> bool:
-        return any(rep.startswith(quantifier)
-                   for quantifier in Formula(rep).quantifiers)
+    if return_position:
+        position = token_end(tokens[i_token - 1]) if i_token > 0 else 0
+        return parsed, position
+    else:
+        return parsed
 
-    def head_is_operator(rep: str) -> bool:
-        return head_is_connective(rep) or head_is_quantifier(rep)
 
-    i_char = 0
+def _parse_tokens(formula_rep: str,
+                  tokens: List[Token],
+                  i_token: int,
+                  end: int,
+                  only_next_element: bool) -> Tuple[Union[str, Tuple], int]:
+    """ Parse tokens[i_token:end] into the intermediate, left-associatively. """
     op: Optional[Any] = None
     left: Optional[Union[str, Tuple]] = None
     right: Optional[Union[str, Tuple]] = None
-    while i_char < len(formula_rep):
-        tail_rep = formula_rep[i_char:]
-        tail_formula = Formula(tail_rep)
+    while i_token < end:
+        type_, text, start = tokens[i_token]
 
-        if tail_rep.startswith(' '):
-            i_char += 1
-            continue
+        if type_ in TOKEN_CONNECTIVES or _is_quantifier_intro(tokens, i_token, end):
 
-        if head_is_operator(tail_rep):
-
-            if head_is_connective(tail_rep):
+            if type_ in TOKEN_CONNECTIVES:
                 assert op is None
-                op_rep = [op_rep_ for op_rep_ in [IMPLICATION, CONJUNCTION, DISJUNCTION, NEGATION]
-                          if tail_rep.startswith(op_rep_)][0]
-                op = _FLD_to_interm[op_rep]
-                i_char += len(op_rep)
-
-                operand_rep = formula_rep[i_char:]
-                while operand_rep[0] == ' ':
-                    operand_rep = operand_rep[1:]
-                    i_char += 1
-
-                operand_parsed, j_char = parse(operand_rep,
-                                               return_position=True,
-                                               only_next_element=True)
-                i_char += j_char
-
-            elif head_is_quantifier(tail_rep):
-                univ_vars = tail_formula.universal_variables
-                exist_vars = tail_formula.existential_variables
-
-                if len(univ_vars) == 1:
-                    op = (I_UNIVERSAL, univ_vars[0].rep)
-                elif len(exist_vars) == 1:
-                    op = (I_EXISTS, exist_vars[0].rep)
-                else:
-                    raise NotImplementedError()
-
-                operand_rep = tail_formula.wo_quantifier.rep
-                i_char += tail_formula.rep.find(operand_rep)
-
-                operand_parsed, j_char = parse(operand_rep,
-                                               return_position=True)
-                i_char += j_char
+                op = _FLD_to_interm[text]
+                operand_parsed, i_token = _parse_tokens(formula_rep, tokens, i_token + 1, end, True)
 
             else:
-                raise Exception()
+                if type_ == TOKEN_UNIVERSAL_QUANTIFIER:
+                    op = (I_UNIVERSAL, text[1:-1])
+                else:
+                    op = (I_EXISTS, text[2:-1])
+                # skip the quantifier and the following colon
+                operand_parsed, i_token = _parse_tokens(formula_rep, tokens, i_token + 2, end, False)
 
             assert right is None
             if left is not None:
@@ -125,18 +106,18 @@ def parse(formula_rep: str,
 
         else:
 
-            if tail_rep.startswith('('):
-                operand_rep = _find_brace_content(tail_rep)
-                i_char += 2  # 2 for braces
-
-                operand_parsed, j_char = parse(operand_rep,
-                                               return_position=True)
-                i_char += j_char
+            if type_ == TOKEN_LEFT_BRACE:
+                i_right_brace = _find_right_brace(tokens, i_token, end)
+                operand_parsed, _ = _parse_tokens(formula_rep, tokens, i_token + 1, i_right_brace, False)
+                i_token = i_right_brace + 1
 
             else:
-                operand_rep = tail_rep.split(' ')[0]
-                operand_parsed = operand_rep
-                i_char += len(operand_rep)
+                # the operand such as "{A}{a}" spans the tokens until the next white space.
+                j_token = i_token + 1
+                while j_token < end and tokens[j_token][2] == token_end(tokens[j_token - 1]):
+                    j_token += 1
+                operand_parsed = formula_rep[start:token_end(tokens[j_token - 1])]
+                i_token = j_token
 
             if left is None:
                 left = operand_parsed
@@ -153,7 +134,22 @@ def parse(formula_rep: str,
     else:
         ret = (op, left, right)
 
-    if return_position:
-        return ret, i_char
-    else:
-        return ret
+    return ret, i_token
+
+
+def _is_quantifier_intro(tokens: List[Token], i_token: int, end: int) -> bool:
+    return tokens[i_token][0] in TOKEN_QUANTIFIERS\
+        and i_token + 1 < end and tokens[i_token + 1][0] == TOKEN_COLON
+
+
+def _find_right_brace(tokens: List[Token], i_left_brace: int, end: int) -> int:
+    level = 0
+    for i_token in range(i_left_brace, end):
+        type_ = tokens[i_token][0]
+        if type_ == TOKEN_LEFT_BRACE:
+            level += 1
+        elif type_ == TOKEN_RIGHT_BRACE:
+            level -= 1
+            if level == 0:
+                return i_token
+    raise ValueError('unbalanced braces ().')
@@ -1,7 +1,6 @@
 from typing import List, Any, Iterable, Tuple, Dict, Union
 from abc import abstractmethod, ABC
 from pprint import pprint
-import random
 import math
 from collections import defaultdict
 
@@ -9,7 +8,7 @@ import logging
 from typing import Optional
 from .proof import ProofTree, ProofNode
 from .formula import Formula, PREDICATES, CONSTANTS, negate, ContradictionNegationError, IMPLICATION
-from .utils import shuffle
+from .utils import shuffle, get_rng
 from .interpretation import (
     generate_mappings_from_predicates_and_constants,
     interpret_formula,
@@ -29,6 +28,7 @@ from .formula_checkers import (
 from FLD_generator.utils import provable_from_incomplete_facts, is_consistent_formula_set_with_logs, have_smaller_proofs_with_logs
 from .proof_tree_generators import ProofTreeGenerator
 from .exception import FormalLogicExceptionBase
+from .deadlines import check_deadline
 from .proof_tree_generators import ExtendBranchesFailure, ExtendBranchesImpossible
 from FLD_generator.utils import run_with_timeout_retry, RetryAndTimeoutFailure, make_pretty_msg
 import line_profiling
@@ -84,6 +84,7 @@ class FormulaDistractor(ABC):
 
                 logger=logger,
                 log_title='_generate()',
+                budget_key=f'formula_distractor.{type(self).__name__}.size={size}',
             )
 
         except RetryAndTimeoutFailure as e:
@@ -316,7 +317,7 @@ class VariousFormUnkownInterprandsDistractor(FormulaDistractor):
         def sample_arity_typed_formula():
             # sample a formula the predicate arity of which is consistent of formulas in tree for speedup.
             while True:
-                src_formula = random.sample(prototype_formulas, 1)[0]
+                src_formula = get_rng().sample(prototype_formulas, 1)[0]
                 if tree_predicate_type == 'zeroary':
                     if len(src_formula.zeroary_predicates) >= len(src_formula.unary_predicates):
                         return src_formula
@@ -338,13 +339,14 @@ class VariousFormUnkownInterprandsDistractor(FormulaDistractor):
 
             if len(distractor_formulas) >= size:
                 break
+            check_deadline()
 
             src_formula = sample_arity_typed_formula()
             num_predicate = len(src_formula.predicates)
             num_constant = len(src_formula.constants)
 
             def _sample_at_most(elems: Iterable[Any], num: int) -> List[Any]:
-                return random.sample(elems, min(num, len(elems)))
+                return get_rng().sample(elems, min(num, len(elems)))
 
             # mix unsed predicates constants a little
 
@@ -411,6 +413,7 @@ class VariousFormUnkownInterprandsDistractor(FormulaDistractor):
                     shuffle=True,
                     allow_many_to_one=False,
                 ):
+                    check_deadline()
                     distractor_formula = interpret_formula(src_formula, mapping, elim_dneg=True)
 
                     if all(distractor_PAS.rep in used_PASs
@@ -472,9 +475,10 @@ class SimplifiedFormulaDistractor(FormulaDistractor):
                     simplified_formulas.append(simplified_formula)
 
         distractor_formulas: List[Formula] = []
-        for distractor_formula in random.sample(simplified_formulas, len(simplified_formulas)):
+        for distractor_formula in get_rng().sample(simplified_formulas, len(simplified_formulas)):
             if len(distractor_formulas) >= size:
                 break
+            check_deadline()
 
             # SLOW
             # if any(is_stronger(distractor_formula, leaf_node.formula) for leaf_node in proof_tree.leaf_nodes):
@@ -531,7 +535,7 @@ class NegativeTreeDistractor(FormulaDistractor):
         #     the run_with_timeout_retry() in generate() will have multiple results from different initial_sampling method
         # (ii) However, the final result will provably taken from "various_form" because it tend to have the largest number of distractors.
         # (iii) (ii) contradicts to hour hope that various initial_sampling should be used
-        if random.random() < self.negative_tree_negated_hypothesis_ratio:
+        if get_rng().random() < self.negative_tree_negated_hypothesis_ratio:
             self._initial_sampling = 'negated_hypothesis'
         else:
             self._initial_sampling = 'various_form'
@@ -700,14 +704,14 @@ class MixtureDistractor(FormulaDistractor):
         misc_key_ids: Dict[str, int] = defaultdict(int)
         remaining_size = size
         for enum in range(self.distractors_max_enum):
-            for i_distrator, distractor in enumerate(random.sample(self._distractors, len(self._distractors))):
+            for i_distrator, distractor in enumerate(get_rng().sample(self._distractors, len(self._distractors))):
                 if remaining_size <= 0:
                     break
 
                 if i_distrator == len(self._distractors) - 1:
                     _size = remaining_size
                 else:
-                    _size = random.randint(1, remaining_size)
+                    _size = get_rng().randint(1, remaining_size)
 
                 try:
                     _distractor_formulas, _misc = distractor.generate(proof_tree,
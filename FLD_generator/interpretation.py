@@ -1,10 +1,8 @@
 import re
-import random
 from typing import Dict, List, Any, Iterable, Tuple, Optional, Union, Set
 import copy
+from collections import defaultdict
 from itertools import permutations
-from functools import lru_cache
-from re import Match
 
 from .formula import (
     Formula,
@@ -17,9 +15,18 @@ from .formula import (
     VARIABLES,
     eliminate_double_negation,
     negate,
-    strip_quantifier,
+    tokenize,
+    canonicalize_reps,
+    fill_slot_template,
+    TOKEN_PREDICATE,
+    TOKEN_CONSTANT,
+    TOKEN_LEFT_BRACE,
+    TOKEN_RIGHT_BRACE,
+    TOKEN_ARGUMENTS,
 )
 from .argument import Argument
+from .caches import get_cache
+from .utils import get_rng
 import line_profiling
 
 _QUANTIFICATION_DEGREES = [
@@ -313,134 +320,254 @@ def _generate_mappings(src_objs: List[Any],
                                if key in src_objs}
         else:
             idx_constraints = None
-        for chosen_tgt_objs in _make_permutations(tgt_objs,
-                                                  len(src_objs),
-                                                  constraints=idx_constraints,
-                                                  shuffle=shuffle,
-                                                  allow_many_to_one=allow_many_to_one):
-            mapping = {
+        if many_to_one_ng_src_objs is not None:
+            many_to_one_ng_idxs = [src_objs.index(src_obj) for src_obj in many_to_one_ng_src_objs
+                                   if src_obj in src_objs]
+        else:
+            many_to_one_ng_idxs = None
+        for chosen_tgt_objs in _generate_assignments(tgt_objs,
+                                                     len(src_objs),
+                                                     constraints=idx_constraints,
+                                                     shuffle=shuffle,
+                                                     allow_many_to_one=allow_many_to_one,
+                                                     many_to_one_ng_idxs=many_to_one_ng_idxs):
+            yield {
                 src_obj: tgt_obj
                 for src_obj, tgt_obj in zip(src_objs, chosen_tgt_objs)
             }
-
-            if many_to_one_ng_src_objs is not None:
-                used_by_others = False
-                for many_to_one_ng_src_obj in many_to_one_ng_src_objs:
-                    tgt_obj = mapping[many_to_one_ng_src_obj]
-                    if any(tgt_obj == other_tgt_obj for other_src_obj, other_tgt_obj in mapping.items()
-                           if other_src_obj != many_to_one_ng_src_obj):
-                        used_by_others = True
-                        break
-                if used_by_others:
-                    continue
-
-            yield mapping
     else:
         raise ValueError()
 
 
-def _make_permutations(objs: List[Any],
-                       length: int,
-                       src_idx=0,
-                       constraints: Optional[Dict[int, Any]] = None,
-                       shuffle=False,
-                       allow_many_to_one=True,
-                       indent=0) -> Iterable[List[Any]]:
-    do_print = False
-    if shuffle and do_print:
-        print('\n')
-        print(' ' * indent + '_make_permutations()')
-        print(' ' * indent + '  shuffle:', shuffle)
-        print(' ' * indent + '  objs:', objs)
-        print(' ' * indent + '  length:', length)
+@profile
+def _generate_assignments(objs: List[Any],
+                          length: int,
+                          constraints: Optional[Dict[int, Any]] = None,
+                          shuffle=False,
+                          allow_many_to_one=True,
+                          many_to_one_ng_idxs: Optional[List[int]] = None) -> Iterable[List[Any]]:
+    """ Generate the sequences of the length which assign an element of objs to each position.
+
+    The constrained positions take their constrained elements.
+    The other, free positions take distinct elements not used by the constraints if not allow_many_to_one,
+    and the elements at many_to_one_ng_idxs must not be used at the other positions.
+
+    The sequences are numbered in the lexicographic order of the free positions, and generated in that order,
+    or, if shuffle, in a random order drawn lazily by _generate_random_indices().
+    Thus, taking a few sequences costs O(length) each, whatever the number of the sequences is.
+    """
     if length < 1:
         return
+    constraints = constraints or {}
+    free_idxs = [idx for idx in range(length) if idx not in constraints]
+
+    if allow_many_to_one:
+        free_objs = objs
+        num_assignments = len(free_objs) ** len(free_idxs)
+    else:
+        constrained_objs = set(constraints.values())
+        free_objs = [obj for obj in objs if obj not in constrained_objs]
+        num_assignments = _num_permutations(len(free_objs), len(free_idxs))
+
     if shuffle:
-        objs = random.sample(objs, len(objs))  # shuffle
+        assignment_idxs = _generate_random_indices(num_assignments)
+    else:
+        assignment_idxs = range(num_assignments)
 
-    if length == 1:
-        if constraints is not None and src_idx in constraints:
-            if shuffle and do_print:
-                print(' ' * indent + '  yield0:', [constraints[src_idx]])
-            yield [constraints[src_idx]]
+    for assignment_idx in assignment_idxs:
+        if allow_many_to_one:
+            free_assignment = _decode_product_index(assignment_idx, free_objs, len(free_idxs))
         else:
-            for obj in objs:
-                if shuffle and do_print:
-                    print(' ' * indent + '  yield1:', [obj])
-                yield [obj]
+            free_assignment = _decode_permutation_index(assignment_idx, free_objs, len(free_idxs))
+
+        assignment = [None] * length
+        for idx, obj in constraints.items():
+            assignment[idx] = obj
+        for idx, obj in zip(free_idxs, free_assignment):
+            assignment[idx] = obj
+
+        if many_to_one_ng_idxs is not None\
+                and any(assignment[ng_idx] == obj
+                        for ng_idx in many_to_one_ng_idxs
+                        for idx, obj in enumerate(assignment) if idx != ng_idx):
+            continue
+
+        yield assignment
+
+
+def _num_permutations(num_objs: int, length: int) -> int:
+    if length > num_objs:
+        return 0
+    num = 1
+    for base in range(num_objs - length + 1, num_objs + 1):
+        num *= base
+    return num
+
+
+def _decode_product_index(idx: int, objs: List[Any], length: int) -> List[Any]:
+    """ The idx-th sequence of objs with repetition, in the lexicographic order. """
+    digits = []
+    for _ in range(length):
+        idx, digit = divmod(idx, len(objs))
+        digits.append(digit)
+    return [objs[digit] for digit in reversed(digits)]
+
+
+def _decode_permutation_index(idx: int, objs: List[Any], length: int) -> List[Any]:
+    """ The idx-th sequence of objs without repetition, in the lexicographic order, i.e., decode the Lehmer code. """
+    digits = []
+    for base in range(len(objs) - length + 1, len(objs) + 1):
+        idx, digit = divmod(idx, base)
+        digits.append(digit)
+    # The digit-th remaining element is found by skipping the already chosen ones,
+    # which costs O(length^2) instead of O(len(objs)) for copying objs.
+    chosen_idxs: List[int] = []
+    for digit in reversed(digits):
+        obj_idx = digit
+        for chosen_idx in sorted(chosen_idxs):
+            if chosen_idx <= obj_idx:
+                obj_idx += 1
+        chosen_idxs.append(obj_idx)
+    return [objs[obj_idx] for obj_idx in chosen_idxs]
+
+
+def _generate_random_indices(size: int) -> Iterable[int]:
+    """ Generate range(size) in a random order.
+
+    This is the Fisher-Yates shuffle which draws lazily and keeps only the swapped positions,
+    thus, the memory is O(the number of the drawn indices) instead of O(size).
+    """
+    rng = get_rng()
+    swapped: Dict[int, int] = {}
+    for i in range(size):
+        j = rng.randrange(i, size)
+        yield swapped.get(j, j)
+        swapped[j] = swapped.pop(i, i)
+
+
+@profile
+def generate_unifying_mappings(src_formulas: List[Formula],
+                               tgt_formula_candidates: List[List[Formula]],
+                               constraints: Optional[Dict[str, str]] = None,
+                               intermediate_constants: Optional[List[Formula]] = None,
+                               shuffle=False,
+                               allow_many_to_one=True,
+                               elim_dneg=False) -> Iterable[Dict[str, str]]:
+    """ Generate the mappings which interpret each of src_formulas into one of its candidate target formulas, i.e.,
+    interpret_formula(src_formulas[i], mapping, elim_dneg=elim_dneg).rep == tgt_formula.rep for some tgt_formula in tgt_formula_candidates[i].
+
+    Instead of testing every mapping of generate_mappings_from_formula(), the symbols of the source and target formulas are aligned,
+    thus, only the unifying mappings are generated.
+    The constraints, allow_many_to_one and intermediate_constants are the same as those of generate_mappings_from_formula(),
+    and are enforced while aligning the symbols.
+    The mappings are over the predicates and constants of src_formulas.
+    """
+    if len(src_formulas) != len(tgt_formula_candidates):
+        raise ValueError(f'The numbers of the source formulas and the target candidates differ: {len(src_formulas)} != {len(tgt_formula_candidates)}')
+
+    src_patterns = [_get_unification_pattern(src_formula, elim_dneg) for src_formula in src_formulas]
+
+    if intermediate_constants is not None:
+        many_to_one_ng_symbols = {c.rep for c_formula in intermediate_constants for c in c_formula.constants}
     else:
-        if constraints is not None and src_idx in constraints:
-            heads = [constraints[src_idx]]
-        else:
-            heads = objs
+        many_to_one_ng_symbols = set()
 
-        permutators = []
-        for head in heads:
-            if allow_many_to_one:
-                tail_objs = objs
-            else:
-                tail_objs = objs.copy()
-
-                while head in tail_objs:
-                    tail_objs.remove(head)
-
-                # the samle speed
-                # while True:
-                #     try:
-                #         tail_objs.remove(head)
-                #     except ValueError:
-                #         break
-
-                # slower
-                # for obj in tail_objs:
-                #     if obj == head:
-                #         tail_objs.remove(head)
-
-                # slower
-                # for idx, obj in enumerate(reversed(tail_objs)):
-                #     if obj == head:
-                #         del tail_objs[len(tail_objs) - idx - 1]
-
-                # slower
-                # tail_objs = [obj for obj in objs
-                #              if obj != head]
-
-            tail_permutator = _make_permutations(tail_objs,
-                                                 length - 1,
-                                                 src_idx=src_idx + 1,
-                                                 constraints=constraints,
-                                                 shuffle=shuffle,
-                                                 allow_many_to_one=allow_many_to_one,
-                                                 indent=indent + 8)
-            permutators.append((head, tail_permutator))
-
-        if shuffle and do_print:
-            is_done = [False] * len(permutators)
-            i_head = 0
-            while True:
-                i_head = i_head % len(permutators)
-                head, tail_permutator = permutators[i_head]
-                if shuffle and do_print:
-                    print(' ' * indent + f'  {i_head}: {str(head)}')
-                if all(is_done):
-                    break
-                if is_done[i_head]:
-                    i_head += 1
-                    continue
-                try:
-                    tail = next(tail_permutator)
-                    if shuffle and do_print:
-                        print(' ' * indent + '  yield2:', [head] + tail)
-                    yield [head] + tail
-                except StopIteration:
-                    is_done[i_head] = True
-                i_head += 1
+    done_mappings: Set[Tuple[Tuple[str, str], ...]] = set()
+
+    def _generate(i_formula: int, mapping: Dict[str, str], inverse_mapping: Dict[str, str]) -> Iterable[Dict[str, str]]:
+        if i_formula == len(src_patterns):
+            key = tuple(sorted(mapping.items()))
+            if key not in done_mappings:
+                # different targets may give the same mapping
+                done_mappings.add(key)
+                yield mapping
+            return
+
+        tgt_formulas = tgt_formula_candidates[i_formula]
+        if shuffle:
+            tgt_formulas = get_rng().sample(tgt_formulas, len(tgt_formulas))
+        for tgt_formula in tgt_formulas:
+            unified = _unify_formula(src_patterns[i_formula],
+                                     tgt_formula,
+                                     mapping,
+                                     inverse_mapping,
+                                     constraints=constraints,
+                                     allow_many_to_one=allow_many_to_one,
+                                     many_to_one_ng_symbols=many_to_one_ng_symbols)
+            if unified is not None:
+                yield from _generate(i_formula + 1, *unified)
+
+    yield from _generate(0, {}, {})
+
+
+_UNIFICATION_PATTERN_CACHE = get_cache('unification_pattern', max_size=100000)
+
+
+def _get_unification_pattern(formula: Formula, elim_dneg: bool) -> Tuple[str, Tuple[str, ...]]:
+    """ The skeleton and the symbols of a source formula to be unified.
+
+    The interpretation commutes with the double negation elimination and the operator expansion,
+    thus, we normalize the source formula by them before aligning it with the targets.
+    """
+    cache_key = (formula.rep, elim_dneg)
+    pattern = _UNIFICATION_PATTERN_CACHE.get(cache_key)
+    if pattern is None:
+        normalized_formula = interpret_formula(formula, {}, elim_dneg=elim_dneg)
+        pattern = (normalized_formula.skeleton, _get_symbols(normalized_formula))
+        _UNIFICATION_PATTERN_CACHE.set(cache_key, pattern)
+    return pattern
+
+
+def _get_symbols(formula: Formula) -> Tuple[str, ...]:
+    """ The predicates and constants in the order of appearance, with duplicates. """
+    return tuple(text for type_, text, _ in tokenize(formula.rep)
+                 if type_ == TOKEN_PREDICATE or type_ == TOKEN_CONSTANT)
+
+
+def _unify_formula(src_pattern: Tuple[str, Tuple[str, ...]],
+                   tgt_formula: Formula,
+                   mapping: Dict[str, str],
+                   inverse_mapping: Dict[str, str],
+                   constraints: Optional[Dict[str, str]] = None,
+                   allow_many_to_one=True,
+                   many_to_one_ng_symbols: Optional[Set[str]] = None) -> Optional[Tuple[Dict[str, str], Dict[str, str]]]:
+    """ Extend the mapping so that it interprets the source formula of src_pattern into tgt_formula.
+
+    Returns:
+        the extended mapping and its inverse, which maps each target symbol to one of its source symbols,
+        or None if there is no such extension.
+    """
+    src_skeleton, src_symbols = src_pattern
+    if src_skeleton != tgt_formula.skeleton:
+        # The interpretation only replaces the symbols, and so preserves the skeleton.
+        return None
+
+    mapping = mapping.copy()
+    inverse_mapping = inverse_mapping.copy()
+    # the same skeletons have the same types of symbols in the same order.
+    for src_symbol, tgt_symbol in zip(src_symbols, _get_symbols(tgt_formula)):
+        mapped_symbol = mapping.get(src_symbol, None)
+        if mapped_symbol is not None:
+            if mapped_symbol != tgt_symbol:
+                return None
+            continue
+
+        if constraints is not None and constraints.get(src_symbol, tgt_symbol) != tgt_symbol:
+            return None
+
+        other_src_symbol = inverse_mapping.get(tgt_symbol, None)
+        if other_src_symbol is not None:
+            if not allow_many_to_one:
+                return None
+            if many_to_one_ng_symbols is not None\
+                    and (src_symbol in many_to_one_ng_symbols or other_src_symbol in many_to_one_ng_symbols):
+                return None
         else:
-            for head, tail_permutator in permutators:
-                for tail in tail_permutator:
-                    if shuffle and do_print:
-                        print(' ' * indent + '  yield3:', [head] + tail)
-                    yield [head] + tail
+            inverse_mapping[tgt_symbol] = src_symbol
+
+        mapping[src_symbol] = tgt_symbol
+
+    return mapping, inverse_mapping
 
 
 @profile
@@ -475,13 +602,26 @@ def interpret_formula(formula: Formula,
                       quantifier_types: Dict[str, str] = None,
                       elim_dneg=False) -> Formula:
 
-    interpreted_rep = _interpret_rep(formula.rep, mapping, elim_dneg=elim_dneg)
+    interpreted_rep = _interpret_rep(formula, mapping, elim_dneg=elim_dneg)
     interpreted_formula = Formula(interpreted_rep)
     return _interpret_formula_postprocess(interpreted_formula, quantifier_types=quantifier_types)
 
 
-_INTERPRET_FORMULAS_CACHE = {}
-_INTERPRET_FORMULAS_CACHE_SIZE = 10000000
+@profile
+def interpret_formula_batch(formula: Formula,
+                            mappings: List[Dict[str, str]],
+                            quantifier_types: Dict[str, str] = None,
+                            elim_dneg=False) -> List[Formula]:
+    """ Interpret a formula by each of the mappings. """
+    slot_template = formula.slot_template
+    if all(_is_symbol_mapping(mapping) for mapping in mappings):
+        interpreted_reps = [fill_slot_template(slot_template, mapping) for mapping in mappings]
+        if elim_dneg:
+            interpreted_reps = [eliminate_double_negation(Formula(interpreted_rep)).rep for interpreted_rep in interpreted_reps]
+    else:
+        interpreted_reps = [_interpret_rep(formula, mapping, elim_dneg=elim_dneg) for mapping in mappings]
+    return [_interpret_formula_postprocess(Formula(interpreted_rep), quantifier_types=quantifier_types)
+            for interpreted_rep in interpreted_reps]
 
 
 @profile
@@ -489,38 +629,25 @@ def interpret_formulas(formulas: List[Formula],
                        mapping: Dict[str, str],
                        quantifier_types: Dict[str, str] = None,
                        elim_dneg=False) -> List[Formula]:
-    """ faster than calling interpreted_formula() one by one """
-
+    """ Interpret formulas by the same mapping. """
     # honoka: the cache is slower
-    # cache_key = (
-    #     tuple(sorted(formula.rep for formula in formulas)),
-    #     tuple(sorted(mapping.items())),
-    #     sorted(quantifier_types.items()) if quantifier_types is not None else None,
-    #     elim_dneg,
-    # )
-    # if cache_key in _INTERPRET_FORMULAS_CACHE:
-    #     return _INTERPRET_FORMULAS_CACHE[cache_key]
-
-    interpreted_reps = _interpret_reps([formula.rep for formula in formulas], mapping, elim_dneg=elim_dneg)
-    interpreted_formulas = [Formula(interpreted_rep) for interpreted_rep in interpreted_reps]
+    interpreted_formulas = [Formula(_interpret_rep(formula, mapping, elim_dneg=elim_dneg)) for formula in formulas]
     interpreted_formulas = [_interpret_formula_postprocess(interpreted_formula, quantifier_types=quantifier_types)
                             for interpreted_formula in interpreted_formulas]
-
-    # _INTERPRET_FORMULAS_CACHE[cache_key] = interpreted_formulas
-
     return interpreted_formulas
 
 
-_interpret_formula_postprocess_cache: Dict[str, str] = {}
-_interpret_formula_postprocess_cache_size = 10000000
+_interpret_formula_postprocess_cache = get_cache('interpret_formula_postprocess', max_size=1000000)
 
 
 @profile
 def _interpret_formula_postprocess(interpreted_formula: Formula,
                                    quantifier_types: Dict[str, str] = None) -> Formula:
     cache_key = interpreted_formula.rep
-    if quantifier_types is None and cache_key in _interpret_formula_postprocess_cache:
-        return Formula(_interpret_formula_postprocess_cache[cache_key])
+    if quantifier_types is None:
+        cached_rep = _interpret_formula_postprocess_cache.get(cache_key)
+        if cached_rep is not None:
+            return Formula(cached_rep)
 
     _expand_op_rep = _expand_op(interpreted_formula.rep)
     interpreted_formula = Formula(_expand_op_rep)
@@ -547,43 +674,64 @@ def _interpret_formula_postprocess(interpreted_formula: Formula,
             interpreted_formula = Formula(next_rep)
 
     if quantifier_types is None:
-        _interpret_formula_postprocess_cache[cache_key] = interpreted_formula.rep
+        _interpret_formula_postprocess_cache.set(cache_key, interpreted_formula.rep)
 
     return interpreted_formula
 
 
-_EXPAND_OP_REGEXP = re.compile(f'\([^\(\)]*\)({"|".join([arg for arg in CONSTANTS + VARIABLES])})')
-
-
 @profile
 def _expand_op(rep: str) -> str:
     while True:
-        # rep_wo_quantifier = Formula(rep).wo_quantifier.rep
-        rep_wo_quantifier = strip_quantifier(rep)  # fast
-
-        match = _get_expand_op_match(rep_wo_quantifier)
-        if match is None:
+        found = _find_op_PAS(rep)
+        if found is None:
             break
 
-        op_PAS = match.group()
-        op_pred, constant = op_PAS.lstrip('(').split(')')
+        op_PAS, op_pred, constant = found
         left_pred, op, right_pred = op_pred.split(' ')
         expanded_op_PAS = f'({left_pred}{constant} {op} {right_pred}{constant})'
         rep = rep.replace(f'{op_PAS}', f'{expanded_op_PAS}')
     return rep
 
 
-@lru_cache(maxsize=10000000)
-def _get_expand_op_match(rep: str) -> Optional[Match]:
-    return _EXPAND_OP_REGEXP.search(rep)
+def _find_op_PAS(rep: str) -> Optional[Tuple[str, str, str]]:
+    """ Find the leftmost "operator PAS" such as "({A} v {B}){a}".
+
+    Returns:
+        the operator PAS, the operator predicate "{A} v {B}" and the argument "{a}".
+    """
+    tokens = tokenize(rep)
+    i_left_brace: Optional[int] = None
+    for i_token, (type_, text, start) in enumerate(tokens):
+        if type_ == TOKEN_LEFT_BRACE:
+            i_left_brace = i_token
+        elif type_ == TOKEN_RIGHT_BRACE:
+            if i_left_brace is not None and i_token + 1 < len(tokens):
+                arg_type, arg, arg_start = tokens[i_token + 1]
+                if arg_type in TOKEN_ARGUMENTS and arg_start == start + 1:
+                    left_brace_start = tokens[i_left_brace][2]
+                    return (
+                        rep[left_brace_start:arg_start + len(arg)],
+                        rep[left_brace_start + 1:start],
+                        arg,
+                    )
+            i_left_brace = None
+    return None
 
 
 # _INTERPRET_REP_CACHE = {}
 # _INTERPRET_REP_CACHE_SIZE = 1000000
 
 
+_SYMBOLS = set(PREDICATES + CONSTANTS)
+_SYMBOL_REGEXP = re.compile(r'\{[A-Za-z]+\}')
+
+
+def _is_symbol_mapping(mapping: Dict[str, str]) -> bool:
+    return all(key in _SYMBOLS or _SYMBOL_REGEXP.fullmatch(key) for key in mapping)
+
+
 @profile
-def _interpret_rep(rep: str,
+def _interpret_rep(formula: Formula,
                    mapping: Dict[str, str],
                    elim_dneg=False) -> str:
     # -- the cache does not speedup much
@@ -592,11 +740,15 @@ def _interpret_rep(rep: str,
     # if cache_key in _INTERPRET_REP_CACHE:
     #     return _INTERPRET_REP_CACHE[cache_key]
 
-    interpreted_rep = rep
+    interpreted_rep = formula.rep
 
     if len(mapping) >= 1:
-        pattern = re.compile("|".join(mapping.keys()))
-        interpreted_rep = pattern.sub(lambda m: mapping[m.group(0)], rep)
+        if _is_symbol_mapping(mapping):
+            # fill the symbol slots of the template compiled once per rep.
+            interpreted_rep = fill_slot_template(formula.slot_template, mapping)
+        else:
+            pattern = re.compile("|".join(mapping.keys()))
+            interpreted_rep = pattern.sub(lambda m: mapping[m.group(0)], interpreted_rep)
 
     if elim_dneg:
         interpreted_rep = eliminate_double_negation(Formula(interpreted_rep)).rep
@@ -605,20 +757,7 @@ def _interpret_rep(rep: str,
     return interpreted_rep
 
 
-@profile
-def _interpret_reps(reps: List[str],
-                    mapping: Dict[str, str],
-                    elim_dneg=False) -> List[str]:
-    if len(reps) == 0:
-        return []
-    splitter = '::::'
-    rep = splitter.join(reps)
-    interpreted_rep = _interpret_rep(rep, mapping, elim_dneg=elim_dneg)
-    return interpreted_rep.split(splitter)
-
-
-_FORMULA_IS_IDENTICAL_TO_CACHE = {}
-_FORMULA_IS_IDENTICAL_TO_CACHE_SIZE = 10000000
+_FORMULA_IS_IDENTICAL_TO_CACHE = get_cache('formula_is_identical_to', max_size=1000000)
 
 
 def formula_is_identical_to(this_formula: Formula,
@@ -639,29 +778,58 @@ def formula_is_identical_to(this_formula: Formula,
         formula_is_identical_to(this, that, allow_many_to_one=False): False
         formula_is_identical_to(that, this, allow_many_to_one=False): False
     """
-    global _FORMULA_IS_IDENTICAL_TO_CACHE
     cache_key = (this_formula.rep, that_formula.rep, allow_many_to_one, add_complicated_arguments, elim_dneg)
-    if cache_key in _FORMULA_IS_IDENTICAL_TO_CACHE:
-        return _FORMULA_IS_IDENTICAL_TO_CACHE[cache_key]
+    cached_ans = _FORMULA_IS_IDENTICAL_TO_CACHE.get(cache_key)
+    if cached_ans is not None:
+        return cached_ans
 
     if elim_dneg:
         this_formula = eliminate_double_negation(this_formula)
         that_formula = eliminate_double_negation(that_formula)
 
-    ans = False
-    if not formula_can_not_be_identical_to(this_formula, that_formula, add_complicated_arguments=add_complicated_arguments, elim_dneg=elim_dneg):
-        for mapping in generate_mappings_from_formula([this_formula], [that_formula], add_complicated_arguments=add_complicated_arguments, allow_many_to_one=allow_many_to_one):
-            this_interpreted = interpret_formula(this_formula, mapping, elim_dneg=elim_dneg)
-            if this_interpreted.rep == that_formula.rep:
-                ans = True
-                break
+    if not add_complicated_arguments:
+        if this_formula.skeleton != that_formula.skeleton:
+            ans = False
+        elif this_formula.canonical_rep == that_formula.canonical_rep:
+            ans = True
+        elif not allow_many_to_one or not _has_more_interprands(this_formula, that_formula):
+            # the mapping must be one-to-one, which is already checked by the canonical reps.
+            ans = False
+        else:
+            ans = next(iter(generate_unifying_mappings([this_formula], [[that_formula]],
+                                                       allow_many_to_one=allow_many_to_one)), None) is not None
+    else:
+        ans = _formula_is_identical_to_by_mappings(this_formula, that_formula,
+                                                   allow_many_to_one=allow_many_to_one,
+                                                   add_complicated_arguments=add_complicated_arguments,
+                                                   elim_dneg=elim_dneg)
 
-    _FORMULA_IS_IDENTICAL_TO_CACHE[cache_key] = ans
-    if len(_FORMULA_IS_IDENTICAL_TO_CACHE) > _FORMULA_IS_IDENTICAL_TO_CACHE_SIZE:
-        _FORMULA_IS_IDENTICAL_TO_CACHE = {}
+    _FORMULA_IS_IDENTICAL_TO_CACHE.set(cache_key, ans)
     return ans
 
 
+def _formula_is_identical_to_by_mappings(this_formula: Formula,
+                                         that_formula: Formula,
+                                         allow_many_to_one=True,
+                                         add_complicated_arguments=False,
+                                         elim_dneg=False) -> bool:
+    if formula_can_not_be_identical_to(this_formula, that_formula, add_complicated_arguments=add_complicated_arguments, elim_dneg=elim_dneg):
+        return False
+    for mapping in generate_mappings_from_formula([this_formula], [that_formula], add_complicated_arguments=add_complicated_arguments, allow_many_to_one=allow_many_to_one):
+        this_interpreted = interpret_formula(this_formula, mapping, elim_dneg=elim_dneg)
+        if this_interpreted.rep == that_formula.rep:
+            return True
+    return False
+
+
+def _has_more_interprands(this_formula: Formula, that_formula: Formula) -> bool:
+    """ Whether this formula can be mapped many-to-one (and not one-to-one) onto that formula. """
+    this_num_predicates, that_num_predicates = len(this_formula.predicates), len(that_formula.predicates)
+    this_num_constants, that_num_constants = len(this_formula.constants), len(that_formula.constants)
+    return this_num_predicates >= that_num_predicates and this_num_constants >= that_num_constants\
+        and (this_num_predicates, this_num_constants) != (that_num_predicates, that_num_constants)
+
+
 def formula_can_not_be_identical_to(this_formula: Formula,
                                     that_formula: Formula,
                                     add_complicated_arguments=False,
@@ -752,6 +920,15 @@ def argument_is_identical_to(this_argument: Argument,
                                                add_complicated_arguments=add_complicated_arguments,
                                                elim_dneg=elim_dneg)
 
+    if not add_complicated_arguments and not elim_dneg:
+        if get_argument_skeleton_key(this_argument) != get_argument_skeleton_key(that_argument):
+            return False
+        if not _share_premise_skeleton(this_argument, that_argument):
+            return False
+        if len(this_argument.premises) >= 1\
+                and get_argument_canonical_key(this_argument) == get_argument_canonical_key(that_argument):
+            return True
+
     # early rejections by conclusion
     if _formula_can_not_be_identical_to(this_argument.conclusion, that_argument.conclusion):
         return False
@@ -842,6 +1019,95 @@ def argument_is_identical_to(this_argument: Argument,
     return False
 
 
+def _get_assumption_premise_reps(argument: Argument) -> List[Tuple[str, str]]:
+    return [(argument.assumptions[premise].rep if premise in argument.assumptions else '', premise.rep)
+            for premise in argument.premises]
+
+
+def get_argument_canonical_key(argument: Argument) -> Tuple[str, ...]:
+    """ A hashable key of the argument which is invariant to one-to-one renaming of the predicates and constants and to the order of premises.
+
+    Two arguments with at least one premise are identical (see argument_is_identical_to()) if their keys are the same.
+    """
+    assumption_premise_reps = _get_assumption_premise_reps(argument)
+    intermediate_constant_reps = [constant.rep for constant in argument.intermediate_constants]
+
+    key: Optional[Tuple[str, ...]] = None
+    # the number of premises are at most 3 or so, thus, we can enumerate all the orders.
+    for premise_indexes in permutations(range(len(assumption_premise_reps))):
+        reps = [argument.conclusion.rep]
+        for i_premise in premise_indexes:
+            reps.extend(assumption_premise_reps[i_premise])
+        canonical_reps, mapping = canonicalize_reps(reps)
+        canonical_intermediates = sorted(mapping.get(rep, rep) for rep in intermediate_constant_reps)
+        _key = tuple(canonical_reps + ['<intermediates>'] + canonical_intermediates)
+        if key is None or _key < key:
+            key = _key
+    return key
+
+
+def get_argument_skeleton_key(argument: Argument) -> Tuple[Any, ...]:
+    """ A hashable key of the argument where all the predicates and constants are erased.
+
+    Two arguments can be identical by any (possibly many-to-one) mapping only if their skeleton keys are the same.
+    Since argument_is_identical_to() requires only one of the premises to match, the premises are represented only by their number.
+    """
+    return (argument.conclusion.skeleton, len(argument.premises), len(argument.intermediate_constants))
+
+
+def _get_assumption_premise_skeletons(argument: Argument) -> Set[Tuple[str, str]]:
+    return {(argument.assumptions[premise].skeleton if premise in argument.assumptions else '', premise.skeleton)
+            for premise in argument.premises}
+
+
+def _share_premise_skeleton(this_argument: Argument, that_argument: Argument) -> bool:
+    """ Whether any premise (with its assumption) of this argument can match one of that argument. """
+    return not _get_assumption_premise_skeletons(this_argument).isdisjoint(_get_assumption_premise_skeletons(that_argument))
+
+
+class ArgumentIdentityIndex:
+    """ An index to check whether an argument is identical to any of the added arguments (see argument_is_identical_to()).
+
+    The arguments identical by one-to-one renaming are found by the canonical keys in O(1).
+    Otherwise, the mapping enumeration is used only against the arguments with the same skeleton.
+    """
+
+    def __init__(self, arguments: Optional[Iterable[Argument]] = None):
+        self._canonical_keys: Dict[Tuple[str, ...], Argument] = {}
+        self._skeleton_key_to_arguments: Dict[Tuple[Any, ...], List[Argument]] = defaultdict(list)
+        for argument in arguments or []:
+            self.add(argument)
+
+    def add(self, argument: Argument) -> None:
+        if len(argument.premises) >= 1:
+            self._canonical_keys.setdefault(get_argument_canonical_key(argument), argument)
+        self._skeleton_key_to_arguments[get_argument_skeleton_key(argument)].append(argument)
+
+    def copy(self) -> 'ArgumentIdentityIndex':
+        index = ArgumentIdentityIndex()
+        index._canonical_keys = dict(self._canonical_keys)
+        index._skeleton_key_to_arguments = defaultdict(list, {key: list(arguments)
+                                                              for key, arguments in self._skeleton_key_to_arguments.items()})
+        return index
+
+    def find_identical(self, argument: Argument, allow_many_to_one=True) -> Optional[Argument]:
+        if len(argument.premises) >= 1:
+            identical_argument = self._canonical_keys.get(get_argument_canonical_key(argument), None)
+            if identical_argument is not None:
+                return identical_argument
+
+        for candidate in self._skeleton_key_to_arguments.get(get_argument_skeleton_key(argument), []):
+            if argument_is_identical_to(argument, candidate, allow_many_to_one=allow_many_to_one):
+                return candidate
+        return None
+
+    def __contains__(self, argument: Argument) -> bool:
+        return self.find_identical(argument) is not None
+
+    def __len__(self) -> int:
+        return sum(len(arguments) for arguments in self._skeleton_key_to_arguments.values())
+
+
 @profile
 def generate_quantifier_axiom_arguments(
     argument_type: str,
@@ -8,13 +8,14 @@ from FLD_generator.proof import ProofTree, ProofNode
 from FLD_generator.proof_tree_generators import ProofTreeGenerator
 from FLD_generator.formula_distractors import FormulaDistractor
 from FLD_generator.translators.base import Translator
-from FLD_generator.utils import flatten_dict
+from FLD_generator.utils import flatten_dict, get_rng, using_rng
 from FLD_generator.exception import FormalLogicExceptionBase
 from FLD_generator.proof_tree_generators import ProofTreeGenerationFailure, ProofTreeGenerationImpossible
 from FLD_generator.formula_distractors import FormulaDistractorGenerationFailure, FormulaDistractorGenerationImpossible, NegativeTreeDistractor
 from FLD_generator.translation_distractors import TranslationDistractor, TranslationDistractorGenerationFailure, TranslationDistractorGenerationImpossible
 from FLD_generator.translators import TranslationFailure, TranslationImpossible
 from FLD_generator.utils import make_pretty_msg
+from FLD_generator.timings import timed
 import line_profiling
 
 logger = logging.getLogger(__name__)
@@ -63,14 +64,16 @@ class ProofTreeGenerationPipeline:
                            allow_inconsistency=False,
                            allow_smaller_proofs=False,
                            depth_1_reference_weight: Optional[float] = None,
-                           force_fix_illegal_intermediate_constants=False) -> ProofTree:
+                           force_fix_illegal_intermediate_constants=False,
+                           reuse=True) -> ProofTree:
+        # The reused trees were generated for the other instances, so that reuse=False is required for the instances to be reproducible by themselves.
 
         def _get_cache_key(_depth: int) -> Tuple:
             return (_depth, allow_inconsistency, allow_smaller_proofs, depth_1_reference_weight, force_fix_illegal_intermediate_constants)
 
         reusable_proof_trees = self._reusable_proof_trees[_get_cache_key(depth)]
-        if len(reusable_proof_trees) > 0:
-            idx = random.randint(0, len(reusable_proof_trees) - 1)
+        if reuse and len(reusable_proof_trees) > 0:
+            idx = get_rng().randint(0, len(reusable_proof_trees) - 1)
             reusable_proof_tree = reusable_proof_trees[idx]
             reusable_proof_trees.pop(idx)
             return reusable_proof_tree
@@ -91,6 +94,8 @@ class ProofTreeGenerationPipeline:
 
         trial_proof_trees = sorted(trial_proof_trees, key= lambda proof_tree: proof_tree.depth)
         to_be_cached_trees, to_be_return_tree = trial_proof_trees[:-1], trial_proof_trees[-1]
+        if not reuse:
+            return to_be_return_tree
 
         for to_be_cached_tree in to_be_cached_trees:
             self._reusable_proof_trees[_get_cache_key(to_be_cached_tree.depth)].append(to_be_cached_tree)
@@ -110,7 +115,36 @@ class ProofTreeGenerationPipeline:
             allow_smaller_proofs=False,
             depth_1_reference_weight: Optional[float] = None,
             force_fix_illegal_intermediate_constants=False,
-            raise_if_translation_not_found=True) -> Tuple[ProofTree, Formula, Optional[List[Formula]], List[str], Dict[str, Any], Dict[str, int]]:
+            raise_if_translation_not_found=True,
+            rng: Optional[random.Random] = None) -> Tuple[ProofTree, Formula, Optional[List[Formula]], List[str], Dict[str, Any], Dict[str, int]]:
+        """
+        Args:
+            rng: the random generator of the instance. If specified, the instance is generated only from it,
+                 so that it is the same whatever the other instances are.
+        """
+        with using_rng(rng):
+            return self._run(depth,
+                             branch_extension_steps,
+                             num_distractors,
+                             num_translation_distractors,
+                             allow_inconsistency=allow_inconsistency,
+                             allow_smaller_proofs=allow_smaller_proofs,
+                             depth_1_reference_weight=depth_1_reference_weight,
+                             force_fix_illegal_intermediate_constants=force_fix_illegal_intermediate_constants,
+                             raise_if_translation_not_found=raise_if_translation_not_found,
+                             reuse_proof_trees=rng is None)
+
+    def _run(self,
+             depth: int,
+             branch_extension_steps: int,
+             num_distractors: int,
+             num_translation_distractors: int,
+             allow_inconsistency=False,
+             allow_smaller_proofs=False,
+             depth_1_reference_weight: Optional[float] = None,
+             force_fix_illegal_intermediate_constants=False,
+             raise_if_translation_not_found=True,
+             reuse_proof_trees=True) -> Tuple[ProofTree, Formula, Optional[List[Formula]], List[str], Dict[str, Any], Dict[str, int]]:
         misc = {}
 
         if not self.generator.disallow_contradiction_as_hypothesis:
@@ -125,14 +159,16 @@ class ProofTreeGenerationPipeline:
         while True:
             logger.info(_make_pretty_log('generate proof tree', 'start'))
             try:
-                proof_tree = self._reusable_generate(
-                    depth,
-                    branch_extension_steps,
-                    depth_1_reference_weight=depth_1_reference_weight,
-                    allow_inconsistency=allow_inconsistency,
-                    allow_smaller_proofs=allow_smaller_proofs,
-                    force_fix_illegal_intermediate_constants=force_fix_illegal_intermediate_constants,
-                )
+                with timed('proof_tree'):
+                    proof_tree = self._reusable_generate(
+                        depth,
+                        branch_extension_steps,
+                        depth_1_reference_weight=depth_1_reference_weight,
+                        allow_inconsistency=allow_inconsistency,
+                        allow_smaller_proofs=allow_smaller_proofs,
+                        force_fix_illegal_intermediate_constants=force_fix_illegal_intermediate_constants,
+                        reuse=reuse_proof_trees,
+                    )
             except ProofTreeGenerationFailure as e:
                 raise ProofTreeGenerationPipelineFailure(str(e))
             except ProofTreeGenerationImpossible as e:
@@ -148,11 +184,12 @@ class ProofTreeGenerationPipeline:
             if num_distractors > 0:
                 if self.distractor is not None:
                     try:
-                        formula_distractors, _misc = self.distractor.generate(proof_tree,
-                                                                                num_distractors,
-                                                                                allow_inconsistency=allow_inconsistency,
-                                                                                allow_smaller_proofs=allow_smaller_proofs,
-                                                                                best_effort=True)
+                        with timed('formula_distractors'):
+                            formula_distractors, _misc = self.distractor.generate(proof_tree,
+                                                                                    num_distractors,
+                                                                                    allow_inconsistency=allow_inconsistency,
+                                                                                    allow_smaller_proofs=allow_smaller_proofs,
+                                                                                    best_effort=True)
                         for _misc_key, _misc_val in _misc.items():
                             if _misc_key in misc:
                                 raise ValueError(f'Duplicated misc key {_misc_key}')
@@ -189,11 +226,12 @@ class ProofTreeGenerationPipeline:
                 all_formulas = all_formulas + [formula for formula in other_formulas if formula not in all_formulas]
 
                 try:
-                    named_translations, translator_stats = self.translator.translate(
-                        all_formulas,
-                        list(proof_tree.intermediate_constants),
-                        raise_if_translation_not_found=raise_if_translation_not_found,
-                    )
+                    with timed('translation'):
+                        named_translations, translator_stats = self.translator.translate(
+                            all_formulas,
+                            list(proof_tree.intermediate_constants),
+                            raise_if_translation_not_found=raise_if_translation_not_found,
+                        )
                 except TranslationFailure as e:
                     raise ProofTreeGenerationPipelineFailure(str(e))
                 except TranslationImpossible as e:
@@ -232,7 +270,8 @@ class ProofTreeGenerationPipeline:
                         translation_distractors = []
                     else:
                         try:
-                            translation_distractors: List[str] = self.translation_distractor.generate(leaf_translations, _num_translation_distractors, best_effort=True)
+                            with timed('translation_distractors'):
+                                translation_distractors: List[str] = self.translation_distractor.generate(leaf_translations, _num_translation_distractors, best_effort=True)
                         except TranslationDistractorGenerationFailure as e:
                             raise ProofTreeGenerationPipelineFailure(str(e))
                         except TranslationDistractorGenerationImpossible as e:
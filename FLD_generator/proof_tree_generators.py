@@ -1,4 +1,3 @@
-import random
 import json
 import logging
 import math
@@ -27,18 +26,24 @@ from .argument_checkers import (
 )
 from .interpretation import (
     generate_mappings_from_formula,
+    generate_unifying_mappings,
     generate_complicated_arguments,
     generate_partially_quantifier_arguments,
     interpret_formula,
     interpret_argument,
     formula_is_identical_to,
     argument_is_identical_to,
+    ArgumentIdentityIndex,
     generate_quantifier_axiom_arguments,
 )
 # from .utils import DelayedLogger
 from .proof import ProofTree, ProofNode
 from .exception import FormalLogicExceptionBase
+from .caches import get_cache
+from .timings import timed_function
+from .deadlines import check_deadline
 from .utils import (
+    get_rng,
     weighted_shuffle,
     run_with_timeout_retry,
     RetryAndTimeoutFailure,
@@ -186,6 +191,7 @@ class ProofTreeGenerator:
             elim_dneg=elim_dneg,
         )
         self.arguments = tuple(self.arguments)  # to use cache
+        self._linkable_argument_index = _LinkableArgumentIndex(self.arguments)
 
     @property
     def complex_formula_arguments_weight(self):
@@ -233,6 +239,7 @@ class ProofTreeGenerator:
 
         # --- generate complicated arguments that includes &, v, and negation ---
         complicated_arguments: List[Argument] = []
+        complicated_arguments_index = ArgumentIdentityIndex(arguments)
         if complex_formula_arguments_weight > 0.0:
             for argument in arguments:
                 for complicated_argument, _, name in generate_complicated_arguments(argument,
@@ -242,12 +249,14 @@ class ProofTreeGenerator:
                                                                                     get_name=True):
                     if not _is_numbers_ok_argument(complicated_argument):
                         continue
-                    if _is_argument_new(complicated_argument, arguments + complicated_arguments):
+                    if _is_argument_new(complicated_argument, complicated_arguments_index):
                         complicated_argument.id += f'.{name}'
                         complicated_arguments.append(complicated_argument)
+                        complicated_arguments_index.add(complicated_argument)
 
         # --- generate quantified arguments ---
         quantified_arguments: List[Argument] = []
+        quantified_arguments_index = complicated_arguments_index.copy()
         if quantifier_arguments_weight > 0.0:
             for argument in arguments + complicated_arguments:
                 for quantifier_type in ['universal', 'existential']:
@@ -259,12 +268,14 @@ class ProofTreeGenerator:
                             get_name=True):
                         if not _is_numbers_ok_argument(quantifier_argument):
                             continue
-                        if _is_argument_new(quantifier_argument, arguments + complicated_arguments + quantified_arguments):
+                        if _is_argument_new(quantifier_argument, quantified_arguments_index):
                             quantified_arguments.append(quantifier_argument)
+                            quantified_arguments_index.add(quantifier_argument)
                             quantifier_argument.id += f'.{name}'
 
         # --- generate axioms of quantifiers, such as universal elimination ---
         quantifier_axiom_arguments: List[Argument] = []
+        quantifier_axiom_arguments_index = complicated_arguments_index.copy()
         if quantifier_axiom_arguments_weight > 0.0:
             unique_formulas: List[Formula] = []
             for argument in arguments + complicated_arguments:
@@ -312,8 +323,9 @@ class ProofTreeGenerator:
                     for quantifier_axiom_argument in _generate_quantifier_axiom_arguments(i_formula, formula):
                         if not _is_numbers_ok_argument(quantifier_axiom_argument):
                             continue
-                        if _is_argument_new(quantifier_axiom_argument, arguments + complicated_arguments + quantifier_axiom_arguments):
+                        if _is_argument_new(quantifier_axiom_argument, quantifier_axiom_arguments_index):
                             quantifier_axiom_arguments.append(quantifier_axiom_argument)
+                            quantifier_axiom_arguments_index.add(quantifier_axiom_argument)
 
         def calc_argument_weight(argument: Argument) -> float:
             if argument in arguments:
@@ -388,6 +400,7 @@ class ProofTreeGenerator:
             argument_weights=self.argument_weights,
             elim_dneg=self.elim_dneg,
             disallow_contradiction_as_hypothesis=self.disallow_contradiction_as_hypothesis,
+            linkable_argument_index=self._linkable_argument_index,
             **kwargs,
         )
         if get_all_trial_results:
@@ -405,6 +418,7 @@ class ProofTreeGenerator:
             argument_weights=self.argument_weights,
             elim_dneg=self.elim_dneg,
             disallow_contradiction_as_hypothesis=self.disallow_contradiction_as_hypothesis,
+            linkable_argument_index=self._linkable_argument_index,
             **kwargs,
         )
         if get_all_trial_results:
@@ -426,6 +440,7 @@ class ProofTreeGenerator:
             branch_extension_steps,
             argument_weights=self.argument_weights,
             elim_dneg=self.elim_dneg,
+            linkable_argument_index=self._linkable_argument_index,
             **kwargs,
         )
         if get_all_trial_results:
@@ -463,6 +478,7 @@ def _generate_tree_with_timeout_retry(arguments: Union[List[Argument], Tuple[Arg
 
             logger=logger,
             log_title='generate_tree()',
+            budget_key=f'proof_tree.depth={depth}.branch_extension_steps={branch_extension_steps}',
         )
         return trial_result_proof_trees
     except RetryAndTimeoutFailure as e:
@@ -482,7 +498,9 @@ def _generate_tree(arguments: Union[List[Argument], Tuple[Argument, ...]],
                    allow_smaller_proofs=False,
                    best_effort=False,
                    force_fix_illegal_intermediate_constants=False,
-                   allow_illegal_intermediate_constants=False) -> ProofTree:
+                   allow_illegal_intermediate_constants=False,
+                   linkable_argument_index: Optional['_LinkableArgumentIndex'] = None) -> ProofTree:
+    linkable_argument_index = linkable_argument_index or _LinkableArgumentIndex(arguments)
 
     proof_tree = _generate_stem(
         arguments,
@@ -498,6 +516,7 @@ def _generate_tree(arguments: Union[List[Argument], Tuple[Argument, ...]],
         # since the branch extension may recover the illegal intermediate constants.
         force_fix_illegal_intermediate_constants = force_fix_illegal_intermediate_constants if depth == 1 else False,
         allow_illegal_intermediate_constants = allow_illegal_intermediate_constants if depth == 1 else False,
+        linkable_argument_index=linkable_argument_index,
     )
 
     if depth > 1:
@@ -516,6 +535,7 @@ def _generate_tree(arguments: Union[List[Argument], Tuple[Argument, ...]],
                 allow_reference_arguments_when_depth_1=allow_reference_arguments_when_depth_1,
                 force_fix_illegal_intermediate_constants=force_fix_illegal_intermediate_constants,
                 allow_illegal_intermediate_constants=allow_illegal_intermediate_constants,
+                linkable_argument_index=linkable_argument_index,
                 max_retry=10,   # can be smaller than _MAX_RETRY_DEFAULT because the extend_branches() below can make depth large
             )
 
@@ -541,6 +561,7 @@ def _generate_tree(arguments: Union[List[Argument], Tuple[Argument, ...]],
                 allow_inconsistency=allow_inconsistency,
                 allow_smaller_proofs=allow_smaller_proofs,
                 elim_dneg=elim_dneg,
+                linkable_argument_index=linkable_argument_index,
             )
 
     return proof_tree
@@ -577,6 +598,7 @@ def _generate_stem_with_timeout_retry(arguments: Union[List[Argument], Tuple[Arg
 
             logger=logger,
             log_title='generate_stem()',
+            budget_key=f'stem.depth={depth}',
         )
     except RetryAndTimeoutFailure as e:
         raise GenerateStemFailure(str(e))
@@ -611,11 +633,13 @@ def _extend_branches_with_timeout_retry(proof_tree: ProofTree,
 
             logger=logger,
             log_title='extend_branches()',
+            budget_key=f'branch_extension.steps={num_steps}',
         )
     except RetryAndTimeoutFailure as e:
         raise ExtendBranchesFailure(str(e))
 
 
+@timed_function('stem')
 @profile
 def _generate_stem(arguments: Union[List[Argument], Tuple[Argument, ...]],
                    depth: int,
@@ -628,7 +652,8 @@ def _generate_stem(arguments: Union[List[Argument], Tuple[Argument, ...]],
                    allow_smaller_proofs=False,
                    force_fix_illegal_intermediate_constants=False,
                    allow_illegal_intermediate_constants=False,
-                   best_effort=False) -> ProofTree:
+                   best_effort=False,
+                   linkable_argument_index: Optional['_LinkableArgumentIndex'] = None) -> ProofTree:
     """ Generate stem of proof tree in a top-down manner.
 
     The steps are:
@@ -640,6 +665,7 @@ def _generate_stem(arguments: Union[List[Argument], Tuple[Argument, ...]],
     """
     if depth < 1:
         raise ValueError('depth must be >= 2')
+    linkable_argument_index = linkable_argument_index or _LinkableArgumentIndex(arguments)
 
     def _my_validate_illegal_intermediate_constants(proof_tree: ProofTree) -> ProofTree:
         return _validate_illegal_intermediate_constants(
@@ -650,6 +676,7 @@ def _generate_stem(arguments: Union[List[Argument], Tuple[Argument, ...]],
             arguments,
             argument_weights=argument_weights,
             elim_dneg=elim_dneg,
+            linkable_argument_index=linkable_argument_index,
         )
 
     def update(premise_nodes: List[ProofNode],
@@ -694,7 +721,7 @@ def _generate_stem(arguments: Union[List[Argument], Tuple[Argument, ...]],
                 iter_reference = argument_sampling_reference()
                 iter_non_reference = argument_sampling_non_reference()
                 while True:
-                    rand = random.random()
+                    rand = get_rng().random()
                     if rand < depth_1_reference_weight:
                         try:
                             arg = next(iter_reference)
@@ -722,6 +749,9 @@ def _generate_stem(arguments: Union[List[Argument], Tuple[Argument, ...]],
                 and _is_failure_loop_univ_intro_argument(cur_arg):
             continue
 
+        # copy the argument so that the tree does not share the formula objects, on which the translations are set, with the other trees.
+        cur_arg = Argument.from_json(cur_arg.to_json())
+
         proof_tree = ProofTree()
         cur_conclusion_node = ProofNode(cur_arg.conclusion)
         cur_premise_nodes = [ProofNode(formula) for formula in cur_arg.premises]
@@ -729,6 +759,7 @@ def _generate_stem(arguments: Union[List[Argument], Tuple[Argument, ...]],
 
         is_tree_done = False
         while True:
+            check_deadline()
             log_traces = []
             rejection_stats = defaultdict(int)
             # delayed_logger = DelayedLogger(logger, delayed=_LOG_ONLY_WHEN_FAILED)
@@ -743,7 +774,7 @@ def _generate_stem(arguments: Union[List[Argument], Tuple[Argument, ...]],
             cur_possible_assumption_nodes = list(_find_possible_assumption_nodes(cur_conclusion_node))
             log_traces.append(f'   | cur_conclusion {cur_conclusion}')
 
-            linkable_args = list(_generate_stem_find_linkable_arguments(arguments, cur_conclusion_node))
+            linkable_args = list(_generate_stem_find_linkable_arguments(linkable_argument_index, cur_conclusion_node))
 
             if len(linkable_args) == 0:
                 rejection_stats['len(linkable_args) == 0'] += 1
@@ -765,15 +796,18 @@ def _generate_stem(arguments: Union[List[Argument], Tuple[Argument, ...]],
                     log_traces.append(f'   |   |   | premise {formula}')
 
                     assumption = next_arg.assumptions.get(formula, None)
-                    for premise_mapping in generate_mappings_from_formula(
+                    # The premise is interpreted into the current conclusion and the assumption into one of the possible assumption nodes.
+                    for premise_mapping in generate_unifying_mappings(
                         [formula] + ([assumption] if assumption is not None else []),
-                        [cur_conclusion] + [node.formula for node in cur_possible_assumption_nodes],
+                        [[cur_conclusion]] + ([[node.formula for node in cur_possible_assumption_nodes]] if assumption is not None else []),
                         intermediate_constants=next_arg.intermediate_constants,
                         allow_many_to_one=True,
+                        elim_dneg=elim_dneg,
                         shuffle=True,
                     ):
                         if is_arg_found:
                             break
+                        check_deadline()
 
                         premise_pulled = interpret_formula(formula, premise_mapping, elim_dneg=elim_dneg)
                         assumption_pulled = interpret_formula(assumption, premise_mapping, elim_dneg=elim_dneg) if assumption is not None else None
@@ -782,16 +816,6 @@ def _generate_stem(arguments: Union[List[Argument], Tuple[Argument, ...]],
                         log_traces.append(f'   |   |   | assumption_pulled {assumption_pulled}')
                         log_traces.append(f'   |   |   | intermediate_constants_pulled {intermediate_constants_pulled}')
 
-                        if premise_pulled.rep != cur_conclusion.rep:  # linkable or not
-                            rejection_stats['premise_pulled.rep != cur_conclusion.rep'] += 1
-                            continue
-
-                        if assumption_pulled is not None:
-                            if all(assumption_pulled.rep != cur_assumption_node.formula.rep
-                                   for cur_assumption_node in cur_possible_assumption_nodes):
-                                rejection_stats['all(assumption_pulled.rep != cur_assumption_node.formula.rep)'] += 1
-                                continue
-
                         if not is_predicate_arity_consistent_formula_set([premise_pulled] + formulas_in_tree):
                             rejection_stats['not is_predicate_arity_consistent_formula_set([premise_pulled] + formulas_in_tree)'] += 1
                             continue
@@ -959,11 +983,45 @@ def _generate_stem(arguments: Union[List[Argument], Tuple[Argument, ...]],
     raise Exception('Unexpected')
 
 
+class _LinkableArgumentIndex:
+    """ Index from formula skeletons to the arguments whose premises or conclusion can be identical to the formula.
+
+    formula_is_identical_to(this, that) requires this.skeleton == that.skeleton,
+    thus, the candidates for a node are looked up by the skeleton of the node formula and only they are verified.
+    The candidates are kept in the order of the arguments so that the results are the same as the linear scan.
+    """
+
+    def __init__(self, arguments: Union[List[Argument], Tuple[Argument, ...]]):
+        self.arguments = arguments
+
+        premise_skeleton_to_arg_indexes: Dict[str, List[int]] = defaultdict(list)
+        conclusion_skeleton_to_arg_indexes: Dict[str, List[int]] = defaultdict(list)
+        for i_arg, arg in enumerate(arguments):
+            for skeleton in sorted({premise.skeleton for premise in arg.premises}):
+                premise_skeleton_to_arg_indexes[skeleton].append(i_arg)
+            conclusion_skeleton_to_arg_indexes[arg.conclusion.skeleton].append(i_arg)
+
+        self._premise_skeleton_to_args = {
+            skeleton: tuple(arguments[i_arg] for i_arg in arg_indexes)
+            for skeleton, arg_indexes in premise_skeleton_to_arg_indexes.items()
+        }
+        self._conclusion_skeleton_to_args = {
+            skeleton: tuple(arguments[i_arg] for i_arg in arg_indexes)
+            for skeleton, arg_indexes in conclusion_skeleton_to_arg_indexes.items()
+        }
+
+    def find_premise_candidates(self, formula: Formula) -> Tuple[Argument, ...]:
+        return self._premise_skeleton_to_args.get(formula.skeleton, ())
+
+    def find_conclusion_candidates(self, formula: Formula) -> Tuple[Argument, ...]:
+        return self._conclusion_skeleton_to_args.get(formula.skeleton, ())
+
+
 # _GENERATE_STEM_FIND_LINKABLE_ARGS_CACHE: Dict[Tuple[int, int], List[Argument]] = {}
 # _GENERATE_STEM_FIND_LINKABLE_ARGS_CACHE_SIZE = 1000000
 
 
-def _generate_stem_find_linkable_arguments(arguments: Union[List[Argument], Tuple[Argument, ...]], node: ProofNode) -> Iterable[Argument]:
+def _generate_stem_find_linkable_arguments(linkable_argument_index: _LinkableArgumentIndex, node: ProofNode) -> Iterable[Argument]:
     # global _GENERATE_STEM_FIND_LINKABLE_ARGS_CACHE
     # global _GENERATE_STEM_FIND_LINKABLE_ARGS_CACHE_SIZE
 
@@ -974,7 +1032,7 @@ def _generate_stem_find_linkable_arguments(arguments: Union[List[Argument], Tupl
     cur_possible_assumption_nodes = set(_find_possible_assumption_nodes(node))
 
     linkable_args: List[Argument] = []
-    for arg in arguments:
+    for arg in linkable_argument_index.find_premise_candidates(node.formula):
         one_premise_matched = False
         for premise in arg.premises:
             if not formula_is_identical_to(premise, node.formula):
@@ -1006,6 +1064,7 @@ def _find_possible_assumption_nodes(node: ProofNode) -> Iterable[ProofNode]:
             yield descendant
 
 
+@timed_function('branch_extension')
 @profile
 def _extend_branches(proof_tree: ProofTree,
                      arguments: Union[List[Argument], Tuple[Argument, ...]],
@@ -1022,7 +1081,8 @@ def _extend_branches(proof_tree: ProofTree,
                      # allow_non_canonical_contradiction_use=False,
                      allow_smaller_proofs=False,
                      best_effort=False,
-                     return_alignment=False) -> Union[Tuple[int, ProofTree],
+                     return_alignment=False,
+                     linkable_argument_index: Optional['_LinkableArgumentIndex'] = None) -> Union[Tuple[int, ProofTree],
                                                       Tuple[ProofTree, int, Dict[ProofNode, ProcessLookupError]]]:
     """ Extend branches of the proof_tree tree in a bottom-up manner.
 
@@ -1032,6 +1092,7 @@ def _extend_branches(proof_tree: ProofTree,
     (iii) Add the psemises of the chosen argument into tree.
     (iv) Repeat (ii) and (iii)
     """
+    linkable_argument_index = linkable_argument_index or _LinkableArgumentIndex(arguments)
 
     def _my_validate_illegal_intermediate_constants(proof_tree: ProofTree) -> ProofTree:
         return _validate_illegal_intermediate_constants(
@@ -1042,6 +1103,7 @@ def _extend_branches(proof_tree: ProofTree,
             arguments,
             argument_weights=argument_weights,
             elim_dneg=elim_dneg,
+            linkable_argument_index=linkable_argument_index,
         )
 
     orig_leaf_nodes = set(proof_tree.leaf_nodes)
@@ -1060,6 +1122,7 @@ def _extend_branches(proof_tree: ProofTree,
     while True:
         if cur_step >= num_steps:
             break
+        check_deadline()
 
         formulas_in_tree = [node.formula for node in proof_tree.nodes]
         current_leaf_nodes = proof_tree.leaf_nodes
@@ -1100,7 +1163,7 @@ def _extend_branches(proof_tree: ProofTree,
         if cur_step == 0:
             is_linkable_any = False
             for target_node in _target_leaf_nodes:
-                for _ in _extend_branches_find_linkable_arguments(arguments, target_node):
+                for _ in _extend_branches_find_linkable_arguments(linkable_argument_index, target_node):
                     is_linkable_any = True
                     break
                 if is_linkable_any:
@@ -1123,7 +1186,7 @@ def _extend_branches(proof_tree: ProofTree,
             target_leaf_node = leaf_node
 
             # Choose next argument
-            linkable_args = list(_extend_branches_find_linkable_arguments(arguments, leaf_node))
+            linkable_args = list(_extend_branches_find_linkable_arguments(linkable_argument_index, leaf_node))
             if len(linkable_args) == 0:
                 rejection_stats['len(linkable_args) == 0'] += 1
 
@@ -1140,25 +1203,23 @@ def _extend_branches(proof_tree: ProofTree,
 
                 # Choose mapping
                 # The following two nested loop is for speedup:
-                # 1. First, we generate the small number of mappings by using small number of symbols. Then, we find appropriate sub-mappings
+                # 1. First, we find the sub-mappings on the small number of symbols by unifying the conclusion with the leaf.
                 # 2. Second, we generate full number of mappings, using the sub-mappings as filters.
-                for conclusion_mapping in generate_mappings_from_formula(
+                for conclusion_mapping in generate_unifying_mappings(
                         [next_arg.conclusion],
-                        [leaf_node.formula],
+                        [[leaf_node.formula]],
                         intermediate_constants=next_arg.intermediate_constants,
                         allow_many_to_one=True,
+                        elim_dneg=elim_dneg,
                         shuffle=True,
                 ):
                     if is_arg_found:
                         break
+                    check_deadline()
 
                     conclusion_pulled = interpret_formula(next_arg.conclusion, conclusion_mapping, elim_dneg=elim_dneg)
                     log_traces.append(f'   |   |   | conclusion_pulled {conclusion_pulled}')
 
-                    if conclusion_pulled.rep != leaf_node.formula.rep:
-                        rejection_stats['conclusion_pulled.rep != leaf_node.formula.rep'] += 1
-                        continue
-
                     if not is_predicate_arity_consistent_formula_set([conclusion_pulled] + formulas_in_tree):
                         rejection_stats['not is_predicate_arity_consistent_formula_set([conclusion_pulled] + formulas_in_tree)'] += 1
                         continue
@@ -1289,23 +1350,22 @@ def _extend_branches(proof_tree: ProofTree,
         return proof_tree, cur_step
 
 
-_EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE: Dict[Tuple[int, str], List[Argument]] = {}
-_EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE_SIZE = 1000000
+_EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE = get_cache('extend_branches_find_linkable_arguments', max_size=100000)
 
 
 @profile
-def _extend_branches_find_linkable_arguments(arguments: Union[Tuple[Argument, ...], List[Argument]],
+def _extend_branches_find_linkable_arguments(linkable_argument_index: _LinkableArgumentIndex,
                                              node: ProofNode) -> Iterable[Argument]:
-    global _EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE
-    global _EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE_SIZE
-
+    arguments = linkable_argument_index.arguments
     cache_key = (id(arguments), node.formula.rep)
-    if isinstance(arguments, tuple) and cache_key in _EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE:
-        yield from _EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE[cache_key]
-        return
+    if isinstance(arguments, tuple):
+        cached_linkable_args = _EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE.get(cache_key)
+        if cached_linkable_args is not None:
+            yield from cached_linkable_args
+            return
 
     linkable_args: List[Argument] = []
-    for arg in arguments:
+    for arg in linkable_argument_index.find_conclusion_candidates(node.formula):
 
         if _DO_HEURISTICS_TO_AVOID_UNIV_INTRO_FAILURE_LOOP\
                 and _is_failure_loop_univ_intro_argument(arg):
@@ -1317,9 +1377,7 @@ def _extend_branches_find_linkable_arguments(arguments: Union[Tuple[Argument, ..
             linkable_args.append(arg)
 
     if isinstance(arguments, tuple):
-        _EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE[cache_key] = tuple(linkable_args)
-    if len(_EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE) > _EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE_SIZE:
-        _EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE = {}
+        _EXTEND_BRANCHES_FIND_LINKABLE_ARGS_CACHE.set(cache_key, tuple(linkable_args))
 
 
 @profile
@@ -1355,17 +1413,15 @@ def _choose_target_preds_consts(proof_tree: ProofTree,
     return tgt_preds, tgt_consts
 
 
-def _is_argument_new(argument: Argument, arguments: Union[Tuple[Argument, ...], List[Argument]]) -> bool:
-    is_already_added = False
-    for existent_argument in arguments:
-        if argument_is_identical_to(argument, existent_argument):
-            logger.info(make_pretty_msg(boundary_level=0,
-                                        msg='argument is identical to the already added argument. will be skipped.'))
-            logger.info('tried to add  : %s', str(argument))
-            logger.info('already added : %s', str(existent_argument))
-            is_already_added = True
-            break
-    return not is_already_added
+def _is_argument_new(argument: Argument, arguments_index: ArgumentIdentityIndex) -> bool:
+    existent_argument = arguments_index.find_identical(argument)
+    if existent_argument is not None:
+        logger.info(make_pretty_msg(boundary_level=0,
+                                    msg='argument is identical to the already added argument. will be skipped.'))
+        logger.info('tried to add  : %s', str(argument))
+        logger.info('already added : %s', str(existent_argument))
+        return False
+    return True
 
 
 def _is_formulas_new(formulas: List[Formula], existing_formulas: List[Formula]) -> bool:
@@ -1376,7 +1432,7 @@ def _is_formulas_new(formulas: List[Formula], existing_formulas: List[Formula])
 def _shuffle(elems: List[Any],
              weights: Optional[List[float]] = None) -> Iterable[Any]:
     if weights is None:
-        yield from random.sample(elems, len(elems))
+        yield from get_rng().sample(elems, len(elems))
     else:
         for idx in weighted_shuffle(weights):
             yield elems[idx]
@@ -1412,6 +1468,7 @@ def _fix_illegal_intermediate_constants(
     allow_inconsistency=False,
     allow_smaller_proofs=False,
     elim_dneg=False,
+    linkable_argument_index: Optional[_LinkableArgumentIndex] = None,
 ) -> ProofTree:
     if len(list((_find_illegal_intermediate_constants(proof_tree)))) >= 3:
         raise FixIllegalIntermediateConstantImpossible('We do not fix tree with more than 3 illegal node because it is unlikely this fix will succeed, or otherwise it is too slow.')
@@ -1508,6 +1565,7 @@ def _fix_illegal_intermediate_constants(
                         force_fix_illegal_intermediate_constants=False,
                         allow_illegal_intermediate_constants=True,
                         return_alignment=True,
+                        linkable_argument_index=linkable_argument_index,
 
                         best_effort=True,
                         # timeout_per_trial=99999,
@@ -1566,7 +1624,8 @@ def _validate_illegal_intermediate_constants(
     argument_weights: Optional[Dict[Argument, float]] = None,
     allow_inconsistency=False,
     allow_smaller_proofs=False,
-    elim_dneg=False
+    elim_dneg=False,
+    linkable_argument_index: Optional[_LinkableArgumentIndex] = None,
 ) -> ProofTree:
 
     if force_fix_illegal_intermediate_constants:
@@ -1580,6 +1639,7 @@ def _validate_illegal_intermediate_constants(
                     allow_inconsistency=allow_inconsistency,
                     allow_smaller_proofs=allow_smaller_proofs,
                     elim_dneg=elim_dneg,
+                    linkable_argument_index=linkable_argument_index,
                 )
             except (FixIllegalIntermediateConstantFailure, FixIllegalIntermediateConstantImpossible) as e:
                 raise exception_cls('_fix_illegal_intermediate_constants() failed. the original message is:' + '\n' + str(e))
@@ -0,0 +1,246 @@
+""" Streaming statistics which can be merged across workers.
+
+RunningStats accumulates the count, the sum, the mean and the sum of squared deviations (M2) of a stream of numbers
+by Welford's algorithm in O(1) per value, and optionally keeps a uniform reservoir sample for the quantiles.
+Two RunningStats are merged exactly by the parallel algorithm of Chan et al.
+
+StatsAccumulator holds the RunningStats of the named stats of the dataset instances,
+and reports them in the "cum.*", "avg.*" and "std.*" format of NLProofSDataset.generate().
+It also holds the adaptive budgets of the trials, if any, and reports them as "budget.*".
+"""
+import math
+import random
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from .budgets import AdaptiveBudgets
+
+Number = Union[int, float]
+
+
+class RunningStats:
+
+    def __init__(self, reservoir_size: int = 0, seed: Optional[int] = None):
+        if reservoir_size < 0:
+            raise ValueError(f'reservoir_size must be non-negative: {reservoir_size}')
+        self.count = 0
+        self.sum: Number = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+        self.reservoir_size = reservoir_size
+        self.reservoir: List[Number] = []
+        # we use our own random generator not to change the global random state, which determines the generated dataset.
+        self._random = random.Random(seed)
+
+    def add(self, value: Number) -> None:
+        self.count += 1
+        self.sum += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.M2 += delta * (value - self.mean)
+
+        if self.reservoir_size > 0:
+            if len(self.reservoir) < self.reservoir_size:
+                self.reservoir.append(value)
+            else:
+                i_slot = self._random.randrange(self.count)
+                if i_slot < self.reservoir_size:
+                    self.reservoir[i_slot] = value
+
+    def merge(self, other: 'RunningStats') -> 'RunningStats':
+        """ Merge other into self, as if self had seen the values of other. """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.sum, self.mean, self.M2 = other.count, other.sum, other.mean, other.M2
+            if self.reservoir_size > 0:
+                self.reservoir = list(other.reservoir[:self.reservoir_size])
+            return self
+
+        if self.reservoir_size > 0:
+            self.reservoir = self._merge_reservoirs(self.reservoir, self.count, other.reservoir, other.count)
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.M2 += other.M2 + delta * delta * self.count * other.count / count
+        self.sum += other.sum
+        self.count = count
+        return self
+
+    def _merge_reservoirs(self,
+                          this: List[Number],
+                          this_count: int,
+                          that: List[Number],
+                          that_count: int) -> List[Number]:
+        # We sample the values from the union of the two streams without replacement:
+        # each draw comes from a stream in proportion to the number of its values not yet drawn,
+        # and is a uniformly random value of the reservoir of the stream.
+        this, that = list(this), list(that)
+        this_remaining, that_remaining = this_count, that_count
+
+        merged: List[Number] = []
+        while len(merged) < self.reservoir_size and (len(this) > 0 or len(that) > 0):
+            if len(that) == 0 or (len(this) > 0 and self._random.randrange(this_remaining + that_remaining) < this_remaining):
+                merged.append(this.pop(self._random.randrange(len(this))))
+                this_remaining -= 1
+            else:
+                merged.append(that.pop(self._random.randrange(len(that))))
+                that_remaining -= 1
+        return merged
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {'count': self.count, 'sum': self.sum, 'mean': self.mean, 'M2': self.M2, 'reservoir': list(self.reservoir)}
+
+    @classmethod
+    def from_state_dict(cls, state: Dict[str, Any], reservoir_size: int = 0, seed: Optional[int] = None) -> 'RunningStats':
+        running_stats = cls(reservoir_size=reservoir_size, seed=seed)
+        running_stats.count = state['count']
+        running_stats.sum = state['sum']
+        running_stats.mean = state['mean']
+        running_stats.M2 = state['M2']
+        running_stats.reservoir = list(state['reservoir'][:reservoir_size])
+        return running_stats
+
+    @property
+    def variance(self) -> Optional[float]:
+        """ The unbiased sample variance, which is None for less than two values. """
+        if self.count < 2:
+            return None
+        return max(self.M2 / (self.count - 1), 0.0)
+
+    @property
+    def stdev(self) -> Optional[float]:
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        """ The quantile estimated from the reservoir by the linear interpolation. """
+        if not 0.0 <= q <= 1.0:
+            raise ValueError(f'q must be in [0, 1]: {q}')
+        if len(self.reservoir) == 0:
+            return None
+        values = sorted(self.reservoir)
+        pos = q * (len(values) - 1)
+        lower = math.floor(pos)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+
+class StatsAccumulator:
+    """ The statistics of the named stats of the dataset instances.
+
+    "cum.*" is the sum over the instances and "avg.*" is the sum divided by the number of the instances.
+    "std.*" is the standard deviation over the instances which have the stat,
+    except for the stats whose names contain one of no_distribution_substrs.
+    The counters which are not of the instances, e.g., the cache stats, are reported only as "cum.*".
+    """
+
+    def __init__(self,
+                 no_distribution_substrs: Iterable[str] = ('argument', 'translation'),
+                 reservoir_size: int = 0,
+                 quantiles: Iterable[float] = (0.5, 0.9),
+                 seed: Optional[int] = None):
+        self.no_distribution_substrs = tuple(no_distribution_substrs)
+        self.reservoir_size = reservoir_size
+        self.quantiles = tuple(quantiles)
+        self.seed = seed
+
+        self.num_samples = 0
+        self.cum_stats: Dict[str, Number] = {}
+        self.running_stats: Dict[str, RunningStats] = {}
+        self.counters: Dict[str, Number] = {}
+        self.budgets: Optional[AdaptiveBudgets] = None
+
+    def _has_distribution(self, name: str) -> bool:
+        return all(name.find(substr) < 0 for substr in self.no_distribution_substrs)
+
+    def _get_running_stats(self, name: str) -> RunningStats:
+        running_stats = self.running_stats.get(name, None)
+        if running_stats is None:
+            running_stats = RunningStats(reservoir_size=self.reservoir_size, seed=self.seed)
+            self.running_stats[name] = running_stats
+        return running_stats
+
+    def add(self, sample_stats: Dict[str, Optional[Number]]) -> None:
+        """ Add the stats of an instance. The stats of None are ignored. """
+        self.num_samples += 1
+        for name, value in sample_stats.items():
+            if value is None:
+                continue
+            self.cum_stats[name] = self.cum_stats.get(name, 0) + value
+            if self._has_distribution(name):
+                self._get_running_stats(name).add(value)
+
+    def add_counters(self, counters: Dict[str, Number]) -> None:
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_budgets(self, budgets: AdaptiveBudgets) -> None:
+        """ Add the trials of the adaptive budgets, e.g., get_adaptive_budgets() of a worker. """
+        if self.budgets is None:
+            self.budgets = AdaptiveBudgets.from_state_dict(budgets.state_dict())
+        else:
+            self.budgets.merge(budgets)
+
+    def merge(self, other: 'StatsAccumulator') -> 'StatsAccumulator':
+        self.num_samples += other.num_samples
+        for name, value in other.cum_stats.items():
+            self.cum_stats[name] = self.cum_stats.get(name, 0) + value
+        self.add_counters(other.counters)
+        for name, running_stats in other.running_stats.items():
+            self._get_running_stats(name).merge(running_stats)
+        if other.budgets is not None:
+            self.add_budgets(other.budgets)
+        return self
+
+    def state_dict(self) -> Dict[str, Any]:
+        """ The json-serializable state from which the accumulator can be restored by from_state_dict(). """
+        return {
+            'no_distribution_substrs': list(self.no_distribution_substrs),
+            'reservoir_size': self.reservoir_size,
+            'quantiles': list(self.quantiles),
+            'seed': self.seed,
+            'num_samples': self.num_samples,
+            'cum_stats': dict(self.cum_stats),
+            'running_stats': {name: running_stats.state_dict() for name, running_stats in self.running_stats.items()},
+            'counters': dict(self.counters),
+            'budgets': self.budgets.state_dict() if self.budgets is not None else None,
+        }
+
+    @classmethod
+    def from_state_dict(cls, state: Dict[str, Any]) -> 'StatsAccumulator':
+        accumulator = cls(no_distribution_substrs=state['no_distribution_substrs'],
+                          reservoir_size=state['reservoir_size'],
+                          quantiles=state['quantiles'],
+                          seed=state['seed'])
+        accumulator.num_samples = state['num_samples']
+        accumulator.cum_stats = dict(state['cum_stats'])
+        accumulator.running_stats = {
+            name: RunningStats.from_state_dict(running_stats_state, reservoir_size=accumulator.reservoir_size, seed=accumulator.seed)
+            for name, running_stats_state in state['running_stats'].items()
+        }
+        accumulator.counters = dict(state['counters'])
+        if state.get('budgets', None) is not None:
+            accumulator.budgets = AdaptiveBudgets.from_state_dict(state['budgets'])
+        return accumulator
+
+    def to_dict(self) -> Dict[str, Optional[Number]]:
+        stats: Dict[str, Optional[Number]] = {}
+        for name, value in self.cum_stats.items():
+            stats[f'cum.{name}'] = value
+        for name, value in self.counters.items():
+            stats[f'cum.{name}'] = value
+        for name, value in self.cum_stats.items():
+            if name != 'tree':
+                stats[f'avg.{name}'] = value / self.num_samples
+        for name, running_stats in self.running_stats.items():
+            stats[f'std.{name}'] = running_stats.stdev
+        if self.reservoir_size > 0:
+            for q in self.quantiles:
+                for name, running_stats in self.running_stats.items():
+                    stats[f'p{round(q * 100)}.{name}'] = running_stats.quantile(q)
+        if self.budgets is not None:
+            for key, budget in self.budgets.get_budgets().items():
+                for budget_name, value in budget.items():
+                    stats[f'budget.{key}.{budget_name}'] = value
+        return stats
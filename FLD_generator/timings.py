@@ -0,0 +1,59 @@
+""" Wall-clock timings of the generation stages.
+
+The stages are timed by timed(stage) only while the timings are enabled by enable_timings(),
+e.g., when an instance is replayed by replay_instance.py, thus, the usual generation does not pay for them.
+The time of a stage includes that of the stages nested in it, e.g., "z3_check" is a part of "stem".
+A stage entered again inside itself is timed only at the outermost entry.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Set
+
+_enabled = False
+_timings: Dict[str, Dict[str, float]] = {}
+_active_stages: Set[str] = set()
+
+
+def enable_timings(enabled=True) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+def reset_timings() -> None:
+    _timings.clear()
+
+
+def get_timings() -> Dict[str, Dict[str, float]]:
+    """ {stage: {'sec': total seconds, 'count': number of entries}} """
+    return {stage: dict(timing) for stage, timing in _timings.items()}
+
+
+@contextmanager
+def timed(stage: str):
+    if not _enabled or stage in _active_stages:
+        yield
+        return
+
+    _active_stages.add(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _active_stages.discard(stage)
+        timing = _timings.setdefault(stage, {'sec': 0.0, 'count': 0})
+        timing['sec'] += time.perf_counter() - start
+        timing['count'] += 1
+
+
+def timed_function(stage: str) -> Callable:
+    def decorator(func: Callable) -> Callable:
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,11 +1,11 @@
 from typing import List, Iterable, Optional, Set, Union
 from abc import abstractmethod, ABC
 import re
-import random
 import logging
 
 from .exception import FormalLogicExceptionBase
-from FLD_generator.utils import run_with_timeout_retry, RetryAndTimeoutFailure
+from .deadlines import check_deadline
+from FLD_generator.utils import run_with_timeout_retry, RetryAndTimeoutFailure, get_rng
 from FLD_generator.word_banks.base import WordBank
 from FLD_generator.word_banks import POS, ATTR
 import line_profiling
@@ -47,6 +47,7 @@ class TranslationDistractor(ABC):
 
                 logger=logger,
                 log_title='_generate()',
+                budget_key=f'translation_distractor.{type(self).__name__}.size={size}',
             )
             if len(trial_results) == 0:
                 if best_effort:
@@ -115,7 +116,8 @@ class WordSwapDistractor(TranslationDistractor):
         is_duplicated_translation_generated = False
         num_loop = int(size / len(translations) + 1)
         for i_loop in range(0, num_loop):
-            for translation in random.sample(translations, len(translations)):
+            for translation in get_rng().sample(translations, len(translations)):
+                check_deadline()
                 swapped_translation = self._word_swap_translation(translation)
 
                 if swapped_translation is not None:
@@ -147,16 +149,16 @@ class WordSwapDistractor(TranslationDistractor):
                     swapped_words.append(word)
                     continue
 
-                if random.random() <= self.word_swap_prob:
+                if get_rng().random() <= self.word_swap_prob:
                     POSs = self._word_bank.get_pos(word)
                     if len(POSs) == 0:
                         swapped_words.append(word)
                         continue
 
                     random_word = None
-                    for pos in random.sample(POSs, len(POSs)):
+                    for pos in get_rng().sample(POSs, len(POSs)):
                         if pos in self._words:
-                            random_word = random.choice(self._words[pos])
+                            random_word = get_rng().choice(self._words[pos])
                             break
 
                     if random_word is not None:
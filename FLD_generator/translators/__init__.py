@@ -1,2 +1,2 @@
-from .templated import TemplatedTranslator, build
+from .templated import TemplatedTranslator, build, load
 from .base import TranslationFailure, TranslationImpossible
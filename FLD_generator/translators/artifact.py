@@ -0,0 +1,62 @@
+""" A precompiled translator artifact.
+
+The artifact is an SQLite file which stores the state of a built TemplatedTranslator,
+i.e., the word lists, the compiled template grammar, and the lexicon of the words the translator can use.
+The lexicon is the same table as the lexicon file of FLD_generator.word_banks.lexicon, so that the artifact is loaded as a LexiconWordBank.
+Loading the artifact skips the costly construction, i.e., walking the whole word bank and compiling the templates.
+"""
+import os
+import json
+import pickle
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, Tuple, Union
+
+from FLD_generator.word_banks.base import WordBank
+from FLD_generator.word_banks.lexicon import LexiconWordBank, ReadOnlySQLite, write_lexicon
+
+logger = logging.getLogger(__name__)
+
+TRANSLATOR_ARTIFACT_FORMAT_VERSION = 2
+
+
+def save_translator_artifact(path: Union[str, Path],
+                             state: Dict[str, Any],
+                             grammar: Any,
+                             word_bank: WordBank,
+                             words: Iterable[str]) -> None:
+    """ Write the artifact atomically.
+
+    The lexicon of the words, their inflections and the intermediate constant words is dumped from word_bank.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + f'.tmp.{os.getpid()}')
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(str(tmp_path))
+    try:
+        conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value BLOB NOT NULL)')
+        conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', [
+            ('format_version', json.dumps(TRANSLATOR_ARTIFACT_FORMAT_VERSION)),
+            ('state', json.dumps(state, ensure_ascii=False)),
+            ('grammar', pickle.dumps(grammar, protocol=pickle.HIGHEST_PROTOCOL)),
+        ])
+        write_lexicon(conn, word_bank, words=words)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+
+def load_translator_artifact(path: Union[str, Path]) -> Tuple[Dict[str, Any], Any, LexiconWordBank]:
+    db = ReadOnlySQLite(path)
+    format_version = json.loads(db.get_meta('format_version'))
+    if format_version != TRANSLATOR_ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f'The translator artifact {path} has the format version {format_version}, '
+                         f'but {TRANSLATOR_ARTIFACT_FORMAT_VERSION} is expected. Re-build the artifact.')
+    state = json.loads(db.get_meta('state'))
+    grammar = pickle.loads(db.get_meta('grammar'))
+    return state, grammar, LexiconWordBank(path)
@@ -68,6 +68,7 @@ class Translator(ABC):
                 timeout_per_trial=timeout_per_trial,
                 logger=logger,
                 log_title='_translate()',
+                budget_key=f'translation.formulas={len(formulas)}',
             )
             if len(transls) == 0:
                 raise TranslationFailure()
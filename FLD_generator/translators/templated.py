@@ -1,11 +1,11 @@
 import json
-from typing import List, Dict, Optional, Tuple, Union, Iterable, Any, Set, Container, Callable
+from typing import List, Dict, Optional, Tuple, Union, Iterable, Any, Set, FrozenSet, Container, Callable, Collection
 from collections import OrderedDict, defaultdict
+from itertools import chain
 import traceback
 import statistics
 import re
 import copy
-import random
 import logging
 from pprint import pformat, pprint
 from functools import lru_cache
@@ -13,19 +13,22 @@ import math
 from pathlib import Path
 
 from tqdm import tqdm
-from FLD_generator.utils import nested_merge
-from FLD_generator.formula import Formula, PREDICATES, CONSTANTS
+from FLD_generator.utils import nested_merge, get_rng
+from FLD_generator.deadlines import check_deadline
+from FLD_generator.formula import Formula, PREDICATES, CONSTANTS, canonicalize_reps
 from FLD_generator.word_banks.base import WordBank, ATTR
 from FLD_generator.interpretation import (
-    generate_mappings_from_formula,
     generate_mappings_from_predicates_and_constants,
+    generate_unifying_mappings,
     interpret_formula,
+    interpret_formula_batch,
     formula_can_not_be_identical_to,
 )
-from FLD_generator.utils import make_combination, chained_sampling_from_weighted_iterators
+from FLD_generator.utils import chained_sampling_from_weighted_iterators
 from FLD_generator.word_banks import POS, VerbForm, AdjForm, NounForm, WordForm
 from FLD_generator.utils import starts_with_vowel_sound, compress, decompress, make_pretty_msg
 from .base import Translator, TranslationNotFoundError, calc_formula_specificity
+from .artifact import save_translator_artifact, load_translator_artifact
 import line_profiling
 
 logger = logging.getLogger(__name__)
@@ -52,6 +55,40 @@ class _PosFormConditionTuple(tuple):
 
 
 NLAndCondition = Iterable[Tuple[str, _PosFormConditionSet]]
+_PosFormCondition = Tuple[str, POS, WordForm]
+
+
+class _NLNode:
+    """ A node of the compiled template grammar, which is an nl with templates, e.g., "{A}[ADJ] is <<clause::{B}{b}>>".
+
+    The node expands to the product of the expansions of its templates.
+    """
+    __slots__ = ('nl', 'condition', 'templates', 'children', 'volume', 'required_conditions', 'all_conditions')
+
+    def __init__(self, nl: str, condition: _PosFormConditionSet):
+        self.nl = nl
+        self.condition = condition
+        self.templates: List[str] = []
+        self.children: List['_TemplateNode'] = []
+        self.volume = 0
+        self.required_conditions: Collection[_PosFormCondition] = frozenset()
+        self.all_conditions: Collection[_PosFormCondition] = frozenset()
+
+
+class _TemplateNode:
+    """ A node of the compiled template grammar, which is a template, e.g., "clause::{B}{b}", or a sentence key.
+
+    The node expands to the union of the expansions of its nls.
+    """
+    __slots__ = ('template', 'weight_types', 'children', 'volume', 'required_conditions', 'all_conditions')
+
+    def __init__(self, template: str):
+        self.template = template
+        self.weight_types: List[str] = []
+        self.children: List[_NLNode] = []
+        self.volume = 0
+        self.required_conditions: Collection[_PosFormCondition] = frozenset()
+        self.all_conditions: Collection[_PosFormCondition] = frozenset()
 
 
 def _compress_nls(texts: List[str]) -> bytes:
@@ -62,6 +99,21 @@ def _decompress_nls(binary: bytes) -> List[str]:
     return decompress(binary).split('<<SEP>>')
 
 
+def _generate_merging_mappings(symbols: List[str]) -> Iterable[Dict[str, str]]:
+    """ Generate all the ways to merge the symbols, i.e., the set partitions,
+    as the mappings from each symbol to the first symbol of its block.
+    The identity mapping comes first.
+    """
+    if len(symbols) == 0:
+        yield {}
+        return
+    *heads, last = symbols
+    for mapping in _generate_merging_mappings(heads):
+        yield {**mapping, last: last}
+        for representative in sorted(set(mapping.values()), key=heads.index):
+            yield {**mapping, last: representative}
+
+
 class TemplatedTranslator(Translator):
 
     _TEMPLATE_BRACES = ['<<', '>>']
@@ -98,6 +150,12 @@ class TemplatedTranslator(Translator):
             logger.debug('translation key = "%s"', key)
             for nl in nls:
                 logger.debug('    "%s"', nl)
+        self._translation_keys_by_canonical_rep = self._build_translation_key_index()
+
+        self._config_keys_by_skeleton: Dict[str, Dict[str, List[str]]] = {}
+        self._nl_nodes: Dict[Tuple[str, FrozenSet[str]], _NLNode] = {}
+        self._template_nodes: Dict[Tuple[str, FrozenSet[str]], _TemplateNode] = {}
+        self._sentence_nodes: Dict[str, _TemplateNode] = self._compile_template_grammar()
 
         self.words_per_type = words_per_type
 
@@ -114,23 +172,117 @@ class TemplatedTranslator(Translator):
         self._unary_predicate_set = set(self._unary_predicates)
         self._constant_set = set(self._constants)
 
+        self._volume_to_weight_func = self._make_volume_to_weight_func(volume_to_weight)
+        self._do_translate_to_nl = do_translate_to_nl
+
+    @staticmethod
+    def _make_volume_to_weight_func(volume_to_weight: str) -> Callable[[int], float]:
         if volume_to_weight == 'linear':
-            self._volume_to_weight_func = lambda volume: volume
+            return lambda volume: volume
         elif volume_to_weight == 'sqrt':
-            self._volume_to_weight_func = lambda volume: (math.sqrt(volume) if volume > 0 else 0)
+            return lambda volume: (math.sqrt(volume) if volume > 0 else 0)
         elif volume_to_weight == 'logE':
-            self._volume_to_weight_func = lambda volume: (1 + math.log(volume) if volume > 0 else 0)
+            return lambda volume: (1 + math.log(volume) if volume > 0 else 0)
         elif volume_to_weight == 'log10':
-            self._volume_to_weight_func = lambda volume: (1 + math.log10(volume) if volume > 0 else 0)
+            return lambda volume: (1 + math.log10(volume) if volume > 0 else 0)
         elif volume_to_weight == 'inv_linear':
-            self._volume_to_weight_func = lambda volume: (1.0 / volume if volume > 0 else 0)
+            return lambda volume: (1.0 / volume if volume > 0 else 0)
         elif volume_to_weight.startswith('pow-'):
             ind = float(volume_to_weight.split('-')[1])
-            self._volume_to_weight_func = lambda volume: (math.pow(volume, ind) if volume > 0 else 0)
+            return lambda volume: (math.pow(volume, ind) if volume > 0 else 0)
         else:
             raise ValueError()
 
-        self._do_translate_to_nl = do_translate_to_nl
+    def save(self, path: Union[str, Path]) -> None:
+        """ Save the built translator as a precompiled artifact, which can be loaded by TemplatedTranslator.load() """
+        state = {
+            'default_weight_factor_type': self._default_weight_factor_type,
+            'two_layered_config': self._two_layered_config,
+            'translations': list(self._translations.items()),
+            'words_per_type': self.words_per_type,
+            'zeroary_predicates': self._zeroary_predicates,
+            'unary_predicates': self._unary_predicates,
+            'constants': self._constants,
+        }
+        save_translator_artifact(path, state, self._sentence_nodes, self._word_bank, self._collect_lexicon_words())
+
+    @classmethod
+    def load(cls,
+             path: Union[str, Path],
+             use_fixed_translation: bool,
+             reused_object_nouns_max_factor=0.0,
+             volume_to_weight: str = 'log10',
+             do_translate_to_nl=True,
+             log_stats=False) -> 'TemplatedTranslator':
+        """ Load the translator from the artifact saved by save().
+
+        The word bank of the loaded translator is backed by the artifact,
+        which knows only the words the translator can use.
+        """
+        state, sentence_nodes, word_bank = load_translator_artifact(path)
+
+        translator = cls.__new__(cls)
+        Translator.__init__(translator, log_stats=log_stats)
+
+        translator._default_weight_factor_type = state['default_weight_factor_type']
+        translator._two_layered_config = defaultdict(dict, {
+            prefix: {transl_key: [tuple(weighted_nl) for weighted_nl in weighted_nls]
+                     for transl_key, weighted_nls in config.items()}
+            for prefix, config in state['two_layered_config'].items()
+        })
+        translator._load_words_by_pos_attrs_cache = {}
+        translator._load_words_by_pos_attrs_cache_interm = defaultdict(set)
+        translator._translations = OrderedDict(
+            (key, [tuple(weighted_nl) for weighted_nl in weighted_nls])
+            for key, weighted_nls in state['translations']
+        )
+        translator._translation_keys_by_canonical_rep = translator._build_translation_key_index()
+        translator._config_keys_by_skeleton = {}
+        translator._nl_nodes = {}
+        translator._template_nodes = {}
+        translator._sentence_nodes = sentence_nodes
+
+        translator.words_per_type = state['words_per_type']
+        translator._word_bank = word_bank
+
+        translator.use_fixed_translation = use_fixed_translation
+        translator.reused_object_nouns_max_factor = reused_object_nouns_max_factor
+        translator._zeroary_predicates = state['zeroary_predicates']
+        translator._unary_predicates = state['unary_predicates']
+        translator._constants = state['constants']
+        translator._zeroary_predicate_set = set(translator._zeroary_predicates)
+        translator._unary_predicate_set = set(translator._unary_predicates)
+        translator._constant_set = set(translator._constants)
+
+        translator._volume_to_weight_func = cls._make_volume_to_weight_func(volume_to_weight)
+        translator._do_translate_to_nl = do_translate_to_nl
+        return translator
+
+    def _collect_lexicon_words(self) -> List[str]:
+        """ Collect the words the translator can look up at translation time.
+
+        These are the words in the word lists, whose inflections are added by the lexicon,
+        and the words in the templates, which can be looked up by _fix_pred_singularity().
+        """
+        words: List[str] = []
+        for word in chain(self._zeroary_predicates,
+                          self._unary_predicates,
+                          self._constants):
+            verb, obj = self._parse_word_with_obj(word)
+            words.append(verb)
+            if obj is not None:
+                words.append(obj)
+
+        template_words = {
+            template_word
+            for config in self._two_layered_config.values()
+            for weighted_nls in config.values()
+            for _, nl in weighted_nls
+            for template_word in re.findall(r'[a-zA-Z][a-zA-Z\'\-]*', re.sub(r'\[[^\]]*\]|\{[^\}]*\}', ' ', nl))
+        }
+        template_words.update(['are', 'were', 'wer', 'do'])  # the words substituted by _fix_pred_singularity()
+        words.extend(sorted(template_words))
+        return words
 
     def _build_two_layered_config(self, config: Dict) -> Dict[str, Dict[str, List[Tuple[str, str]]]]:
         flat_config = self._completely_flatten_config(config)
@@ -339,6 +491,7 @@ class TemplatedTranslator(Translator):
         interpret_mapping = self._choose_interpret_mapping(formulas, intermediate_constant_formulas)
 
         for formula in formulas:
+            check_deadline()
             # find translation key
             found_keys = 0
             is_found = False
@@ -456,14 +609,36 @@ class TemplatedTranslator(Translator):
 
     @profile
     def _find_translation_key(self, formula: Formula) -> Iterable[Tuple[str, Dict[str, str]]]:
-        for _transl_key, _ in self._translations.items():
-            if formula_can_not_be_identical_to(Formula(_transl_key), formula):  # early rejection
-                continue
-
-            for push_mapping in generate_mappings_from_formula([Formula(_transl_key)], [formula]):
-                _transl_key_pushed = interpret_formula(Formula(_transl_key), push_mapping).rep
-                if _transl_key_pushed == formula.rep:
-                    yield _transl_key, push_mapping
+        (canonical_rep,), to_canonical = canonicalize_reps([formula.rep])
+        from_canonical = {canonical_symbol: symbol for symbol, canonical_symbol in to_canonical.items()}
+        for transl_key, canonical_push_mapping in self._translation_keys_by_canonical_rep.get(canonical_rep, []):
+            yield transl_key, {key_symbol: from_canonical[canonical_symbol]
+                               for key_symbol, canonical_symbol in canonical_push_mapping.items()}
+
+    def _build_translation_key_index(self) -> Dict[str, List[Tuple[str, Dict[str, str]]]]:
+        """ The translation keys and their push mappings to the canonical symbols, indexed by the canonical reps of the formulas the keys can be pushed to.
+
+        A key can be pushed to a formula by a (possibly many-to-one) mapping
+        if and only if the formula is a one-to-one renaming of the key with some of its predicates and constants merged.
+        Thus, we enumerate such merged keys.
+        The keys are in the order of self._translations, i.e., the specificity.
+        """
+        index: Dict[str, List[Tuple[str, Dict[str, str]]]] = defaultdict(list)
+        for transl_key in self._translations:
+            key_formula = Formula(transl_key)
+            merging_mappings = [
+                {**predicate_mapping, **constant_mapping}
+                for predicate_mapping in _generate_merging_mappings([predicate.rep for predicate in key_formula.predicates])
+                for constant_mapping in _generate_merging_mappings([constant.rep for constant in key_formula.constants])
+            ]
+            for merging_mapping, merged_key_formula in zip(merging_mappings,
+                                                           interpret_formula_batch(key_formula, merging_mappings)):
+                (canonical_rep,), to_canonical = canonicalize_reps([merged_key_formula.rep])
+                index[canonical_rep].append(
+                    (transl_key, {key_symbol: to_canonical[merged_symbol]
+                                  for key_symbol, merged_symbol in merging_mapping.items()})
+                )
+        return dict(index)
 
     @profile
     def _sample_interpret_mapping_consistent_nl(self,
@@ -479,56 +654,106 @@ class TemplatedTranslator(Translator):
             print(' ' * log_indent + '**** _sample_interpret_mapping_consistent_nl() ****')
             print(' ' * log_indent + '    sentence_key:', sentence_key)
 
-        iterators = []
-        weight_types: List[str] = []
-        volumes: List[int] = []
-        for weight_type, transl_nl in self._translations[sentence_key]:
-            iterator_with_volume = self._make_resolved_translation_sampler(  # SLOW
-                transl_nl,
-                # set(['::'.join([_SENTENCE_TRANSLATION_PREFIX, sentence_key])]),
-                set([transl_nl]),
-                constraint_interpret_mapping=interpret_mapping,
-                constraint_push_mapping=push_mapping,
-                block_shuffle=block_shuffle,
-                volume_to_weight=volume_to_weight,
-                log_indent = log_indent + 4,
-            )
+        condition_cache: Dict[_PosFormCondition, bool] = {}
+        volume_cache: Dict[int, int] = {}
+
+        def is_consistent(condition: Iterable[_PosFormCondition]) -> bool:
+            for elem in condition:
+                is_elem_consistent = condition_cache.get(elem, None)
+                if is_elem_consistent is None:
+                    is_elem_consistent = self._interpret_mapping_is_consistent_with_condition([elem],
+                                                                                             interpret_mapping,
+                                                                                             push_mapping)
+                    condition_cache[elem] = is_elem_consistent
+                if not is_elem_consistent:
+                    return False
+            return True
+
+        def get_volume(node: Union[_NLNode, _TemplateNode]) -> int:
+            """ The number of the expansions of the node consistent with interpret_mapping. """
+            volume = volume_cache.get(id(node), None)
+            if volume is not None:
+                return volume
+
+            if node.volume == 0 or not is_consistent(node.required_conditions):
+                volume = 0
+            elif is_consistent(node.all_conditions):
+                volume = node.volume
+            elif isinstance(node, _NLNode):
+                volume = 1
+                for child in node.children:
+                    volume *= get_volume(child)
+                    if volume == 0:
+                        break
+            else:
+                volume = sum(get_volume(child) for child in node.children)
 
-            iterators.append(iterator_with_volume[0])
-            weight_types.append(weight_type)
-            volumes.append(iterator_with_volume[1])
+            volume_cache[id(node)] = volume
+            return volume
 
-        if block_shuffle:
+        resolved = self._sample_from_template_node(self._sentence_nodes[sentence_key],
+                                                   get_volume,
+                                                   block_shuffle,
+                                                   volume_to_weight)
+        if resolved is None:
+            return None
 
-            volume_weights = [volume_to_weight(volume) for volume in volumes]
-            weights = [self._get_weight_factor_func(weight_type)(volume_weights, i_iterator)
-                       for i_iterator, weight_type in enumerate(weight_types)]
+        resolved_nl, condition = resolved
+        condition_is_consistent = self._interpret_mapping_is_consistent_with_condition(
+            condition,
+            interpret_mapping,
+            push_mapping,
+        )
+        assert condition_is_consistent  # the consistency should have been checked by the volumes.
+        return resolved_nl
 
-            @profile
-            def generate():
-                for resolved_nl, condition in chained_sampling_from_weighted_iterators(
-                    iterators,
-                    weights,
-                ):
-                    yield resolved_nl, condition
+    @profile
+    def _sample_from_template_node(self,
+                                   node: _TemplateNode,
+                                   get_volume: Callable[[Union[_NLNode, _TemplateNode]], int],
+                                   block_shuffle: bool,
+                                   volume_to_weight: Callable[[int], float]) -> Optional[Tuple[str, _PosFormConditionSet]]:
+        """ Sample an expansion of the template by the weighted random descent through the compiled grammar. """
+
+        def sample_nl(nl_node: _NLNode) -> Optional[Tuple[str, _PosFormConditionSet]]:
+            if get_volume(nl_node) == 0:
+                return None
+            resolved_nl = nl_node.nl
+            condition = nl_node.condition
+            for template, child in zip(nl_node.templates, nl_node.children):
+                resolved_template = self._sample_from_template_node(child, get_volume, block_shuffle, volume_to_weight)
+                if resolved_template is None:
+                    return None
+                resolved_nl = resolved_nl.replace(
+                    f'{self._TEMPLATE_BRACES[0]}{template}{self._TEMPLATE_BRACES[1]}',
+                    resolved_template[0],
+                    1,
+                )
+                condition = self._merge_condition(condition, resolved_template[1])
+            return resolved_nl, condition
 
-        else:
+        if block_shuffle:
 
-            @profile
-            def generate():
-                for iterator in iterators:
-                    for resolved_nl, condition in iterator:
-                        yield resolved_nl, condition
+            def generate(nl_node: _NLNode) -> Iterable[Tuple[str, _PosFormConditionSet]]:
+                resolved = sample_nl(nl_node)
+                if resolved is not None:
+                    yield resolved
 
-        for resolved_nl, condition in generate():   # SLOW
+            volume_weights = [volume_to_weight(get_volume(child)) for child in node.children]
+            weights = [self._get_weight_factor_func(weight_type)(volume_weights, i_child)
+                       for i_child, weight_type in enumerate(node.weight_types)]
+            for resolved in chained_sampling_from_weighted_iterators(
+                [generate(child) for child in node.children],
+                weights,
+            ):
+                return resolved
 
-            condition_is_consistent = self._interpret_mapping_is_consistent_with_condition(
-                condition,
-                interpret_mapping,
-                push_mapping,
-            )
-            assert condition_is_consistent  # the consistency should have been checked recursively.
-            return resolved_nl
+        else:
+
+            for child in node.children:
+                resolved = sample_nl(child)
+                if resolved is not None:
+                    return resolved
 
         return None
 
@@ -567,161 +792,137 @@ class TemplatedTranslator(Translator):
 
         return get_weight
 
-    @profile
-    def _make_resolved_translation_sampler(self,
-                                           nl: str,
-                                           # ancestor_keys: Set[str],
-                                           ancestor_nls: Set[str],
-                                           constraint_interpret_mapping: Optional[Dict[str, str]] = None,
-                                           constraint_push_mapping: Optional[Dict[str, str]] = None,
-                                           block_shuffle=True,
-                                           volume_to_weight = lambda volume: volume,
-                                           check_condition=True,
-                                           log_indent=0) -> Tuple[Iterable[NLAndCondition], int]:
-        # SLOW due to the many calls
-        if _DEBUG:
-            print()
-            print(' ' * log_indent + '== _make_resolved_translation_sampler() ==')
-            print(' ' * log_indent + '    nl:', nl)
-            # print(' ' * log_indent + '    ancestor_keys:', ancestor_keys)
-            print(' ' * log_indent + '    ancestor_nls:', ancestor_nls)
-        if nl.startswith('__'):
-            return iter([]), 0
-
-        condition = self._get_pos_form_consistency_condition(nl)  # SLOW
-        if constraint_push_mapping is not None\
-                and check_condition\
-                and not self._interpret_mapping_is_consistent_with_condition(condition,
-                                                                             constraint_interpret_mapping,
-                                                                             constraint_push_mapping):
-            return iter([]), 0
+    def _compile_template_grammar(self) -> Dict[str, _TemplateNode]:
+        """ Compile the translations into a DAG of nls and templates with precomputed volumes and conditions.
 
-        templates = list(self._extract_templates(nl))
-        if len(templates) == 0:
-            volume = 1
-
-            def generate():
-                yield nl, condition
-
-        else:
-
-            class ResolveTemplateGenerator:
-
-                # @profile
-                def __init__(self, parent_translator: TemplatedTranslator, template: str):
-                    self._template = template
-                    self._parent_translator = parent_translator
-                    self.volume = self._resolve()[1]
-
-                # @profile
-                def __call__(self) -> Iterable[NLAndCondition]:
-                    return self._resolve()[0]
-
-                # @profile
-                def _resolve(self) -> Tuple[Iterable[NLAndCondition], int]:
-                    return self._parent_translator._make_resolved_template_sampler(
-                        self._template,
-                        # ancestor_keys,
-                        ancestor_nls,
-                        constraint_interpret_mapping=constraint_interpret_mapping,
-                        constraint_push_mapping=constraint_push_mapping,
-                        shuffle=block_shuffle,
-                        volume_to_weight=volume_to_weight,
-                        check_condition=check_condition,
-                        log_indent = log_indent + 4
-                    )
-
-            template_resolve_generators = [ResolveTemplateGenerator(self, template) for template in templates]
-
-            volumes = [generator.volume for generator in template_resolve_generators]
-            volume = 1
-            for _volume in volumes:
-                volume *= _volume
-
-            def generate():
-                for combination in make_combination(template_resolve_generators):
-                    template_updated_condition = condition.copy()
-                    template_resolved_nl = nl
-
-                    for template, (resolved_template, template_condition) in zip(templates, combination):
-                        template_resolved_nl = template_resolved_nl.replace(
-                            f'{self._TEMPLATE_BRACES[0]}{template}{self._TEMPLATE_BRACES[1]}',
-                            resolved_template,
-                            1,
-                        )
-                        template_updated_condition = self._merge_condition(template_updated_condition, template_condition)
-
-                    yield template_resolved_nl, template_updated_condition
+        The grammar can be recursive, e.g., "¬{A}" -> "the fact that <<sentence::{A}>> is not true" -> ...,
+        and a recursion is cut when an nl appears again among its ancestors.
+        Thus, a node depends on its ancestors, but only on those in the same strongly connected component.
+        We share a node among the paths with the same such ancestors.
+        """
+        self._nl_templates: Dict[str, List[str]] = {}
+        self._nl_sccs = self._find_strongly_connected_nls(
+            [nl for weighted_nls in self._translations.values() for _, nl in weighted_nls]
+        )
 
-        return generate(), volume
+        sentence_nodes: Dict[str, _TemplateNode] = {}
+        for sentence_key, weighted_nls in self._translations.items():
+            node = _TemplateNode(sentence_key)
+            for weight_type, nl in weighted_nls:
+                node.weight_types.append(weight_type)
+                node.children.append(self._compile_nl_node(nl, frozenset([nl])))
+            self._set_template_node_stats(node)
+            sentence_nodes[sentence_key] = node
+
+        # The conditions are only iterated from now on. Tuples are faster than frozensets to iterate and to unpickle.
+        for node in chain(self._nl_nodes.values(), self._template_nodes.values(), sentence_nodes.values()):
+            node.required_conditions = tuple(node.required_conditions)
+            node.all_conditions = tuple(node.all_conditions)
+
+        logger.info('compiled the template grammar into %d nl nodes and %d template nodes',
+                    len(self._nl_nodes), len(self._template_nodes))
+        return sentence_nodes
+
+    def _get_nl_templates(self, nl: str) -> List[str]:
+        if nl not in self._nl_templates:
+            self._nl_templates[nl] = [] if nl.startswith('__') else list(self._extract_templates(nl))
+        return self._nl_templates[nl]
+
+    def _get_template_nls(self, template: str) -> List[Tuple[str, str]]:
+        template_key, template_nls = self._find_template_nls(template)
+        return template_nls or []
+
+    def _find_strongly_connected_nls(self, root_nls: List[str]) -> Dict[str, FrozenSet[str]]:
+        """ Tarjan's algorithm over the graph where an nl links to the nls of its templates. """
+        index: Dict[str, int] = {}
+        lowlink: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        sccs: Dict[str, FrozenSet[str]] = {}
+
+        def visit(nl: str) -> None:
+            index[nl] = lowlink[nl] = len(index)
+            stack.append(nl)
+            on_stack.add(nl)
+            for template in self._get_nl_templates(nl):
+                for _, child_nl in self._get_template_nls(template):
+                    if child_nl not in index:
+                        visit(child_nl)
+                        lowlink[nl] = min(lowlink[nl], lowlink[child_nl])
+                    elif child_nl in on_stack:
+                        lowlink[nl] = min(lowlink[nl], index[child_nl])
+
+            if lowlink[nl] == index[nl]:
+                scc = []
+                while True:
+                    scc_nl = stack.pop()
+                    on_stack.discard(scc_nl)
+                    scc.append(scc_nl)
+                    if scc_nl == nl:
+                        break
+                scc_set = frozenset(scc)
+                for scc_nl in scc:
+                    sccs[scc_nl] = scc_set
+
+        for nl in root_nls:
+            if nl not in index:
+                visit(nl)
+        return sccs
+
+    def _compile_nl_node(self, nl: str, ancestor_nls: FrozenSet[str]) -> _NLNode:
+        node_key = (nl, ancestor_nls.intersection(self._nl_sccs[nl]))
+        if node_key in self._nl_nodes:
+            return self._nl_nodes[node_key]
 
-    @profile
-    def _make_resolved_template_sampler(self,
-                                        template: str,
-                                        # ancestor_keys: Set[str],
-                                        ancestor_nls: Set[str],
-                                        constraint_interpret_mapping: Optional[Dict[str, str]] = None,
-                                        constraint_push_mapping: Optional[Dict[str, str]] = None,
-                                        shuffle=True,
-                                        volume_to_weight = lambda volume: volume,
-                                        check_condition=True,
-                                        log_indent=0) -> Tuple[Iterable[NLAndCondition], int]:
-        if _DEBUG:
-            print()
-            print(' ' * log_indent + '-- _make_resolved_template_sampler() --')
-            print(' ' * log_indent + '    template:', template)
-            # print(' ' * log_indent + '    ancestor_keys:', ancestor_keys)
-            print(' ' * log_indent + '    ancestor_nls:', ancestor_nls)
-        template_key, template_nls = self._find_template_nls(template,
-                                                             # tuple(sorted(ancestor_keys)),
-                                                             # tuple(sorted(ancestor_nls.union(set([template])))),
-                                                             log_indent = log_indent + 4)
-        if template_key is None:
-            raise Exception(f'template for {template} not found.')
-
-        iterators = []
-        weight_types: List[str] = []
-        volumes: List[int] = []
-        for weight, template_nl in template_nls:
+        if nl.startswith('__'):
+            node = _NLNode(nl, _PosFormConditionSet([]))
+            self._nl_nodes[node_key] = node
+            return node
+
+        node = _NLNode(nl, self._get_pos_form_consistency_condition(nl))
+        for template in self._get_nl_templates(nl):
+            node.templates.append(template)
+            node.children.append(self._compile_template_node(template, ancestor_nls))
+
+        node.volume = 1
+        required_conditions = set(node.condition)
+        all_conditions = set(node.condition)
+        for child in node.children:
+            node.volume *= child.volume
+            required_conditions.update(child.required_conditions)
+            all_conditions.update(child.all_conditions)
+        node.required_conditions = frozenset(required_conditions)
+        node.all_conditions = frozenset(all_conditions)
+
+        self._nl_nodes[node_key] = node
+        return node
+
+    def _compile_template_node(self, template: str, ancestor_nls: FrozenSet[str]) -> _TemplateNode:
+        template_nls = self._get_template_nls(template)
+        child_sccs = frozenset().union(*[self._nl_sccs[template_nl] for _, template_nl in template_nls])
+        node_key = (template, ancestor_nls.intersection(child_sccs))
+        if node_key in self._template_nodes:
+            return self._template_nodes[node_key]
+
+        node = _TemplateNode(template)
+        if len(template_nls) == 0:
+            logger.warning('template for "%s" not found. It will not be expanded.', template)
+        for weight_type, template_nl in template_nls:
             if template_nl in ancestor_nls:
                 continue
+            node.weight_types.append(weight_type)
+            node.children.append(self._compile_nl_node(template_nl, ancestor_nls.union([template_nl])))
+        self._set_template_node_stats(node)
 
-            iterator_with_volume = self._make_resolved_translation_sampler(template_nl,
-                                                                           # ancestor_keys.union(set([template_key])),
-                                                                           ancestor_nls.union(set([template_nl])),
-                                                                           constraint_interpret_mapping=constraint_interpret_mapping,
-                                                                           constraint_push_mapping=constraint_push_mapping,
-                                                                           block_shuffle=shuffle,
-                                                                           volume_to_weight=volume_to_weight,
-                                                                           check_condition=check_condition,
-                                                                           log_indent = log_indent + 4)
-            iterators.append(iterator_with_volume[0])
-            weight_types.append(weight)
-            volumes.append(iterator_with_volume[1])
-
-        if shuffle:
-
-            volume_weights = [volume_to_weight(volume) for volume in volumes]
-            weights = [self._get_weight_factor_func(weight_type)(volume_weights, i_iterator)
-                       for i_iterator, weight_type in enumerate(weight_types)]
-
-            @profile
-            def generate():
-                for resolved_template_nl, condition in chained_sampling_from_weighted_iterators(
-                    iterators,
-                    weights,
-                ):
-                    yield resolved_template_nl, condition
-
-        else:
-
-            @profile
-            def generate():
-                for iterator in iterators:
-                    for resolved_template_nl, condition in iterator:
-                        yield resolved_template_nl, condition
+        self._template_nodes[node_key] = node
+        return node
 
-        return generate(), sum(volumes)
+    def _set_template_node_stats(self, node: _TemplateNode) -> None:
+        node.volume = sum(child.volume for child in node.children)
+        alive_children = [child for child in node.children if child.volume > 0]
+        if len(alive_children) > 0:
+            node.required_conditions = frozenset.intersection(*[child.required_conditions for child in alive_children])
+        node.all_conditions = frozenset().union(*[child.all_conditions for child in node.children])
 
     @profile
     def _interpret_mapping_is_consistent_with_condition(self,
@@ -767,21 +968,20 @@ class TemplatedTranslator(Translator):
         found_template_key = None
 
         config = self._two_layered_config[template_prefix]
-        for transl_key, transl_nls in config.items():
+        for transl_key in self._get_config_keys_by_skeleton(template_prefix).get(template_key_formula.skeleton, []):
+            transl_nls = config[transl_key]
             key_formula = Formula(transl_key)
             if formula_can_not_be_identical_to(key_formula, template_key_formula):
                 continue
 
-            for mapping in generate_mappings_from_formula([key_formula],
-                                                          [template_key_formula]):
-                key_formula_pulled = interpret_formula(key_formula, mapping)
-                if key_formula_pulled.rep == template_key_formula.rep:
-                    found_template_key = transl_key
-                    found_template_nls = []
-                    for weighted_nl in transl_nls:
-                        weight_type, nl = weighted_nl
-                        found_template_nls.append((weight_type, interpret_formula(Formula(nl), mapping).rep))
-                    break
+            for mapping in generate_unifying_mappings([key_formula],
+                                                      [[template_key_formula]]):
+                found_template_key = transl_key
+                found_template_nls = []
+                for weighted_nl in transl_nls:
+                    weight_type, nl = weighted_nl
+                    found_template_nls.append((weight_type, interpret_formula(Formula(nl), mapping).rep))
+                break
 
             if found_template_nls is not None:
                 break
@@ -791,6 +991,18 @@ class TemplatedTranslator(Translator):
             found_template_nls,
         )
 
+    def _get_config_keys_by_skeleton(self, prefix: str) -> Dict[str, List[str]]:
+        """ The keys of the config for the prefix grouped by their skeletons, in the order of the config.
+
+        A key can be identical to a template only if their skeletons are the same.
+        """
+        if prefix not in self._config_keys_by_skeleton:
+            keys_by_skeleton: Dict[str, List[str]] = defaultdict(list)
+            for transl_key in self._two_layered_config[prefix]:
+                keys_by_skeleton[Formula(transl_key).skeleton].append(transl_key)
+            self._config_keys_by_skeleton[prefix] = keys_by_skeleton
+        return self._config_keys_by_skeleton[prefix]
+
     def _merge_condition(self, this: _PosFormConditionSet, that: _PosFormConditionSet) -> _PosFormConditionSet:
         return this.union(that)
 
@@ -829,7 +1041,7 @@ class TemplatedTranslator(Translator):
             from_second = with_definite[first_pos + len(constant):]
 
             if re.match(f'.*a {constant} is.*', from_second):
-                replace_with_it = random.random() >= 0.5
+                replace_with_it = get_rng().random() >= 0.5
             else:
                 replace_with_it = False
 
@@ -943,9 +1155,9 @@ class TemplatedTranslator(Translator):
             logger.warning('Can\'t sample %d elements. Will sample only %d elements.',
                            size,
                            len(elems))
-            return random.sample(elems, len(elems))
+            return get_rng().sample(elems, len(elems))
         else:
-            return random.sample(elems, size)
+            return get_rng().sample(elems, size)
 
     @profile
     def _take(self, elems: List[Any], size: int) -> List[Any]:
@@ -981,7 +1193,7 @@ class TemplatedTranslator(Translator):
                     logger.critical('got antonyms for word "%s": %s', word, str(inflated_words))
 
                 assert len(inflated_words) > 0
-                inflated_word = random.choice(inflated_words)
+                inflated_word = get_rng().choice(inflated_words)
             else:
                 raise Exception(
                     f'Something wrong. Since we have checked in that the translation indeed exists, this program must not pass this block.  The problematic translation is "{interprand_templated_translation_pushed}" and unfound string is "{interprand_rep}["',
@@ -1188,3 +1400,8 @@ def build(config_paths: List[str],
         **kwargs,
     )
     return translator
+
+
+def load(artifact_path: str, **kwargs) -> TemplatedTranslator:
+    logger.info('loading the translator artifact "%s"', artifact_path)
+    return TemplatedTranslator.load(artifact_path, **kwargs)
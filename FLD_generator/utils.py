@@ -1,19 +1,23 @@
 from typing import Optional, Callable, List, Iterable, Any, Tuple, Optional, Union
+from types import ModuleType
+from contextlib import contextmanager
 import math
 from typing import Dict, Any, List, Iterable, Set
 import random
 import logging
+import threading
 import zlib
+import time
 from pprint import pformat
-from ctypes import ArgumentError
 
 from z3.z3types import Z3Exception
 from FLD_generator.argument import Argument
 from nltk.corpus import cmudict
-import timeout_decorator
 from .exception import FormalLogicExceptionBase
+from .deadlines import using_deadline, DeadlineExceeded
+from .budgets import get_adaptive_budgets
 from FLD_generator.formula import Formula
-from FLD_generator.formula_checkers import is_provable, is_disprovable, is_consistent_set as is_consistent_formula_set
+from FLD_generator.formula_checkers import is_provable, is_disprovable, is_consistent_set as is_consistent_formula_set, CheckerSession
 import line_profiling
 
 utils_logger = logging.getLogger(__name__)
@@ -23,6 +27,44 @@ class RetryAndTimeoutFailure(FormalLogicExceptionBase):
     pass
 
 
+# The random generator of the instance being generated, which is per thread so that the threads can generate instances concurrently.
+# The generation draws all its random numbers from get_rng(), which falls back to the global random module.
+_local = threading.local()
+
+
+def get_rng(default: Any = random) -> Union[random.Random, ModuleType, Any]:
+    rng = getattr(_local, 'rng', None)
+    return rng if rng is not None else default
+
+
+def set_rng(rng: Optional[random.Random]) -> Optional[random.Random]:
+    """ Set the random generator used by get_rng() in this thread, or the global random module if None. Returns the previous one. """
+    prev_rng = getattr(_local, 'rng', None)
+    _local.rng = rng
+    return prev_rng
+
+
+@contextmanager
+def using_rng(rng: Optional[random.Random]):
+    """ Use rng in the context. rng=None keeps the current one. """
+    if rng is None:
+        yield
+        return
+    prev_rng = set_rng(rng)
+    try:
+        yield
+    finally:
+        set_rng(prev_rng)
+
+
+def make_instance_rng(seed: int, idx: int) -> random.Random:
+    """ The random generator of the idx-th instance, which depends only on the seed and idx.
+
+    A str seed is hashed by sha512, thus, is stable across processes unlike hash().
+    """
+    return random.Random(f'{seed}-{idx}')
+
+
 def starts_with_vowel_sound(word, pronunciations=cmudict.dict()):
     for syllables in pronunciations.get(word, []):
         return syllables[0][-1].isdigit()  # use only the first one
@@ -41,7 +83,7 @@ def flatten_dict(dic: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def shuffle(elems: List[Any]) -> List[Any]:
-    return random.sample(elems, len(elems))
+    return get_rng().sample(elems, len(elems))
 
 
 def weighted_shuffle(weights: List[float]) -> Iterable[int]:
@@ -74,7 +116,7 @@ def weighted_sampling(weights: List[float]) -> int:
     if weight_sum == 0.0:
         raise ValueError()
     normalized_weights = [weight / weight_sum for weight in weights]
-    r = random.random()
+    r = get_rng().random()
     cum = min(1e-7, min(normalized_weights))  # start from positive value in order to ensure that cum reached 1.0 at the end of the for loop
     for idx, weight in enumerate(normalized_weights):
         cum += weight
@@ -124,14 +166,24 @@ def run_with_timeout_retry(
 
     logger = None,
     log_title: Optional[str] = None,
+
+    budget_key: Optional[str] = None,
 ) -> Any:
+    """ Run func until its result is accepted by should_retry_func.
+
+    If the adaptive budgets are enabled (see budgets.py), the timeout_per_trial and the max_retry are those learned for budget_key,
+    and the trials are recorded to them.
+    """
     if max_retry is not None and max_retry <= 0:
         raise ValueError()
 
     func_args = func_args or []
     func_kwargs = func_kwargs or {}
     max_retry = max_retry or 99999
-    timeout_per_trial = timeout_per_trial or 99999
+    budgets = get_adaptive_budgets() if budget_key is not None else None
+    if budgets is not None:
+        timeout_per_trial = budgets.get_timeout(budget_key, default=timeout_per_trial)
+        max_retry = budgets.get_max_retry(budget_key, default=max_retry)
     logger = logger or utils_logger
     log_title = log_title or str(func)
 
@@ -142,49 +194,47 @@ def run_with_timeout_retry(
 
     trial_results = []
     for i_trial in range(0, max_retry):
-        timeout_func = timeout_decorator.timeout(
-            timeout_per_trial,
-            timeout_exception=TimeoutError,
-            use_signals=True,
-            # use_signals=False,  # XXX this does not work
-        )(func)
-
         is_fatal = False
         do_log_args = False
         exception = None
+        start = time.perf_counter()
         try:
-            result = timeout_func(*func_args, **func_kwargs)
+            # The deadline is checked cooperatively by func (see deadlines.py), thus, func is never interrupted in the middle of z3.
+            with using_deadline(timeout_per_trial) as deadline:
+                result = func(*func_args, **func_kwargs)
             trial_results.append(result)
 
             if not should_retry_func(result):
+                if budgets is not None:
+                    budgets.observe(budget_key, time.perf_counter() - start, True)
                 logger.info(_make_pretty_msg(i_trial, 'success', msg=None))
                 return trial_results
 
             retry_msg = 'is_retry_func(result)'
 
-        except ArgumentError as e:
-            if str(e).find('TimeoutError') >= 0:
-                exception = e
-                retry_msg = f'ArgumentError(TimeoutError(timeout={timeout_per_trial})) (we guess this error occurs when timeout is come during the extenral z3 library is being executed)'
-            else:
-                raise e
         except Z3Exception as e:
             exception = e
             do_log_args = True
             logger.fatal('[checkers.py] Z3Exception occurred. We will continue the trials, however, we do not know the root cause of this.')
 
-        except TimeoutError as e:
+        except DeadlineExceeded as e:
+            if e.deadline is not deadline:
+                # the deadline of an enclosing trial has expired, which the enclosing retry loop handles.
+                raise e
             exception = e
-            retry_msg = f'TimeoutError(timeout={timeout_per_trial})'
+            retry_msg = f'DeadlineExceeded(timeout={timeout_per_trial})'
 
         except should_retry_exception as e:
             exception = e
             retry_msg = str(e)
 
+        if budgets is not None:
+            budgets.observe(budget_key, time.perf_counter() - start, False)
+
         if do_log_args:
             logger.info(pformat(func_args))
             logger.info(pformat(func_kwargs))
-            logger.info(str(timeout_func))
+            logger.info(str(func))
             logger.info(str(exception))
             logger.info(str(type(exception)))
 
@@ -246,7 +296,7 @@ def chained_sampling_from_weighted_iterators(iterators: List[Iterable[Any]], wei
     while True:
         if len(aliving_iterators) == 0:
             break
-        rand = random.random()
+        rand = get_rng().random()
         _w = 0.0
         chosen_idx = None
         margin = 0.000001
@@ -367,31 +417,34 @@ def make_pretty_msg(title: Optional[str] = None,
 @profile
 def provable_from_incomplete_facts(fact_formulas: List[Formula],
                                    distractor_formulas: List[Formula],
-                                   hypothesis: Formula) -> Tuple[bool, Optional[Formula]]:
+                                   hypothesis: Formula,
+                                   use_unsat_core=False) -> Tuple[bool, Optional[Formula]]:
     # XXX: we can not find the other proofs constructed from all the fact_formulas.
-    for remaining_formulas, dropped_formula in _drop_one_element(fact_formulas):
-        if is_provable(remaining_formulas + distractor_formulas, hypothesis):
-            return True, dropped_formula
+    session = CheckerSession(fact_formulas + distractor_formulas)
+    if use_unsat_core:
+        i_dropped = session.find_droppable_fact_by_unsat_core(hypothesis, droppable_fact_indexes=range(len(fact_formulas)))
+    else:
+        i_dropped = session.find_droppable_fact(hypothesis, droppable_fact_indexes=range(len(fact_formulas)))
+    if i_dropped is not None:
+        return True, fact_formulas[i_dropped]
     return False, None
 
 
 def disprovable_from_incomplete_facts(fact_formulas: List[Formula],
                                       distractor_formulas: List[Formula],
-                                      hypothesis: Formula) -> Tuple[bool, Optional[Formula]]:
+                                      hypothesis: Formula,
+                                      use_unsat_core=False) -> Tuple[bool, Optional[Formula]]:
     # XXX: we can not find the other disproofs constructed from all the fact_formulas.
-    for remaining_formulas, dropped_formula in _drop_one_element(fact_formulas):
-        if is_disprovable(remaining_formulas + distractor_formulas, hypothesis):
-            return True, dropped_formula
+    session = CheckerSession(fact_formulas + distractor_formulas)
+    if use_unsat_core:
+        i_dropped = session.find_droppable_fact_by_unsat_core(hypothesis, droppable_fact_indexes=range(len(fact_formulas)), disprove=True)
+    else:
+        i_dropped = session.find_droppable_fact(hypothesis, droppable_fact_indexes=range(len(fact_formulas)), disprove=True)
+    if i_dropped is not None:
+        return True, fact_formulas[i_dropped]
     return False, None
 
 
-def _drop_one_element(elems: List[Any]) -> Iterable[Tuple[List[Any], Any]]:
-    for i_drop in range(len(elems)):
-        dropped_elem = elems[i_drop]
-        remaining_elems = elems[:i_drop] + elems[i_drop + 1:]
-        yield remaining_elems, dropped_elem
-
-
 @profile
 def have_smaller_proofs_with_logs(org_leaf_formulas: List[Formula],
                                   new_leaf_formulas: List[Formula],
@@ -411,6 +464,7 @@ def have_smaller_proofs_with_logs(org_leaf_formulas: List[Formula],
         remaining_leaf_formulas,
         distractor_formulas,
         new_hypothesis_formula,
+        use_unsat_core=True,
     )
     if _is_provable:
         log_msgs.append('original leafs:')
@@ -1,2 +1,8 @@
-from .base import POS, ATTR, VerbForm, AdjForm, NounForm, WordForm, get_form_types
-from .wordnet import build as build_wordnet_wordbank
+from .base import POS, ATTR, VerbForm, AdjForm, NounForm, WordForm, get_form_types, WordBank
+from .lexicon import LexiconWordBank, build_lexicon
+
+
+def build_wordnet_wordbank(*args, **kwargs) -> WordBank:
+    # imported here so that the other word banks, e.g., LexiconWordBank, do not load nltk.
+    from .wordnet import build
+    return build(*args, **kwargs)
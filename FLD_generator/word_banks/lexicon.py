@@ -0,0 +1,284 @@
+""" A word bank precomputed into a compact SQLite table.
+
+write_lexicon() dumps the POSs, ATTRs, inflections, synonyms, antonyms and negnyms of the words of a word bank into the "lexicon" table,
+and LexiconWordBank implements the WordBank interface from the table by indexed lookups, without loading nltk.
+The inflected words are also stored so that their POSs and forms can be looked up.
+
+The table is stored either alone in a lexicon file built by build_lexicon(), or in a translator artifact together with the translator state.
+The file is opened read-only and memory-mapped, so that the worker processes share its pages through the OS page cache.
+"""
+import os
+import json
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from tqdm import tqdm
+
+from .base import WordBank, POS, ATTR, VerbForm, AdjForm, NounForm, WordForm, get_form_types
+
+logger = logging.getLogger(__name__)
+
+LEXICON_FORMAT_VERSION = 2
+
+_MMAP_SIZE = 1 << 30
+
+_POSs = list(POS)
+_ATTRs = list(ATTR)
+
+
+def _form_key(form: WordForm, force: bool) -> str:
+    key = f'{type(form).__name__}.{form.value}'
+    return key + '.force' if force else key
+
+
+def _encode_flags(elems: Iterable[Any], all_elems: List[Any]) -> int:
+    flags = 0
+    for elem in elems:
+        flags |= 1 << all_elems.index(elem)
+    return flags
+
+
+def _decode_flags(flags: int, all_elems: List[Any]) -> List[Any]:
+    return [elem for i_elem, elem in enumerate(all_elems) if flags & (1 << i_elem)]
+
+
+def _call_or_none(func, *args, **kwargs) -> Optional[Any]:
+    try:
+        return func(*args, **kwargs)
+    except NotImplementedError:
+        return None
+
+
+def _dumps_or_none(obj: Optional[Any]) -> Optional[str]:
+    return json.dumps(obj, ensure_ascii=False) if obj is not None else None
+
+
+class ReadOnlySQLite:
+    """ A read-only and memory-mapped connection to an SQLite file, which is re-opened in each process. """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = str(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_pid: Optional[int] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # A connection must not be shared with the forked worker processes, so we re-open it in each process.
+        if self._conn is None or self._conn_pid != os.getpid():
+            if not Path(self.path).exists():
+                raise FileNotFoundError(f'file not found: {self.path}')
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            conn.execute(f'PRAGMA mmap_size={_MMAP_SIZE}')
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def get_meta(self, key: str) -> Any:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError(f'"{key}" not found in {self.path}')
+        return row[0]
+
+
+def write_lexicon(conn: sqlite3.Connection,
+                  word_bank: WordBank,
+                  words: Optional[Iterable[str]] = None) -> None:
+    """ Dump the word bank into the "lexicon" table and its metadata into the "meta" table of conn.
+
+    Args:
+        words: the words to dump. All the words of the word bank by default.
+    """
+    intermediate_constant_words = list(word_bank.get_intermediate_constant_words())
+    _intermediate_constant_words = set(intermediate_constant_words)
+    real_words = list(dict.fromkeys(
+        word for word in (words if words is not None else word_bank.get_words())
+        if word not in _intermediate_constant_words
+    ))
+
+    rows: List[str] = real_words + intermediate_constant_words
+    row_set = set(rows)
+    records: List[Tuple[int, str, int, int, Optional[str], Optional[str], Optional[str], str]] = []
+
+    num_base_rows = len(rows)
+    i_row = 0
+    with tqdm(total=num_base_rows, desc='building lexicon') as pbar:
+        while i_row < len(rows):
+            word = rows[i_row]
+            POSs = word_bank.get_pos(word)
+
+            # the forced form is stored only if the force changes something.
+            word_forms: Dict[str, Optional[List[str]]] = {}
+            for pos in POSs:
+                try:
+                    form_klass = get_form_types(pos)
+                except NotImplementedError:
+                    continue
+                for form in form_klass:
+                    for force in [False, True]:
+                        inflected_words = _call_or_none(word_bank.change_word_form, word, form, force=force)
+                        if not force or inflected_words != word_forms[_form_key(form, False)]:
+                            word_forms[_form_key(form, force)] = inflected_words
+
+                        # we also store the inflected words of the base words, which can be looked up, e.g., by the translator.
+                        if i_row < num_base_rows and inflected_words is not None:
+                            for inflected_word in inflected_words:
+                                if inflected_word not in row_set and inflected_word.find(' ') < 0:
+                                    rows.append(inflected_word)
+                                    row_set.add(inflected_word)
+
+            records.append((
+                i_row,
+                word,
+                _encode_flags(POSs, _POSs),
+                _encode_flags(word_bank.get_attrs(word), _ATTRs),
+                _dumps_or_none(_call_or_none(word_bank.get_synonyms, word)),
+                _dumps_or_none(_call_or_none(word_bank.get_antonyms, word)),
+                _dumps_or_none(_call_or_none(word_bank.get_negnyms, word)),
+                json.dumps(word_forms, ensure_ascii=False),
+            ))
+
+            i_row += 1
+            if i_row <= num_base_rows:
+                pbar.update(1)
+
+    conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value BLOB NOT NULL)')
+    conn.execute('CREATE TABLE lexicon (i_row INTEGER PRIMARY KEY, word TEXT NOT NULL UNIQUE, pos INTEGER NOT NULL, attrs INTEGER NOT NULL, '
+                 'synonyms TEXT, antonyms TEXT, negnyms TEXT, forms TEXT NOT NULL)')
+    conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', [
+        ('lexicon_format_version', json.dumps(LEXICON_FORMAT_VERSION)),
+        ('intermediate_constant_words', json.dumps(intermediate_constant_words, ensure_ascii=False)),
+        ('num_real_words', json.dumps(len(real_words))),
+    ])
+    conn.executemany('INSERT INTO lexicon (i_row, word, pos, attrs, synonyms, antonyms, negnyms, forms) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                     records)
+    logger.info('built the lexicon of %d words (%d real words)', len(rows), len(real_words))
+
+
+def build_lexicon(word_bank: WordBank,
+                  path: Union[str, Path],
+                  words: Optional[Iterable[str]] = None) -> None:
+    """ Dump the word bank into the lexicon file atomically.
+
+    Args:
+        words: the words to dump. All the words of the word bank by default.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + f'.tmp.{os.getpid()}')
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(str(tmp_path))
+    try:
+        write_lexicon(conn, word_bank, words=words)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    logger.info('saved the lexicon into "%s"', str(path))
+
+
+class LexiconWordBank(WordBank):
+    """ The word bank backed by the lexicon table written by write_lexicon(),
+    which is either a lexicon file built by build_lexicon() or a translator artifact.
+
+    The words not in the lexicon have no POS, as well as no synonyms, antonyms and negnyms.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self._db = ReadOnlySQLite(path)
+        format_version = json.loads(self._db.get_meta('lexicon_format_version'))
+        if format_version != LEXICON_FORMAT_VERSION:
+            raise ValueError(f'The lexicon {path} has the format version {format_version}, '
+                             f'but {LEXICON_FORMAT_VERSION} is expected. Re-build the lexicon.')
+
+        self.__intermediate_constant_words: List[str] = json.loads(self._db.get_meta('intermediate_constant_words'))
+        self._num_real_words: int = json.loads(self._db.get_meta('num_real_words'))
+        self._entries: Dict[str, Optional[Tuple]] = {}
+        self._POSs_by_flags: Dict[int, List[POS]] = {}
+        logger.info('opened the lexicon "%s"', str(path))
+
+    def _get_entry(self, word: str) -> Optional[Tuple]:
+        if word not in self._entries:
+            row = self._db.conn.execute(
+                'SELECT pos, attrs, synonyms, antonyms, negnyms, forms FROM lexicon WHERE word = ?', (word,)
+            ).fetchone()
+            self._entries[word] = row[:5] + (json.loads(row[5]),) if row is not None else None
+        return self._entries[word]
+
+    def _get_real_words(self) -> Iterable[str]:
+        for row in self._db.conn.execute('SELECT word FROM lexicon WHERE i_row < ? ORDER BY i_row', (self._num_real_words,)):
+            yield row[0]
+
+    @property
+    def _intermediate_constant_words(self) -> List[str]:
+        return self.__intermediate_constant_words
+
+    def _get_pos(self, word: str) -> List[POS]:
+        entry = self._get_entry(word)
+        if entry is None:
+            return []
+        flags = entry[0]
+        if flags not in self._POSs_by_flags:
+            self._POSs_by_flags[flags] = _decode_flags(flags, _POSs)
+        return list(self._POSs_by_flags[flags])
+
+    def _get_form(self, word: str, form: WordForm, force: bool) -> List[str]:
+        entry = self._get_entry(word)
+        if entry is None:
+            return []
+        word_forms = entry[5]
+        key = _form_key(form, force)
+        if key not in word_forms:
+            key = _form_key(form, False)
+        inflected_words = word_forms.get(key, None)
+        if inflected_words is None:
+            raise NotImplementedError(f'The form {str(form)} of "{word}" is not available')
+        return list(inflected_words)
+
+    def _change_verb_form(self, verb: str, form: VerbForm, force=False) -> List[str]:
+        return self._get_form(verb, form, force)
+
+    def _change_adj_form(self, adj: str, form: AdjForm, force=False) -> List[str]:
+        return self._get_form(adj, form, force)
+
+    def _change_noun_form(self, noun: str, form: NounForm, force=False) -> List[str]:
+        return self._get_form(noun, form, force)
+
+    def _has_attr(self, word: str, attr: ATTR) -> bool:
+        entry = self._get_entry(word)
+        if entry is None:
+            return False
+        return bool(entry[1] & (1 << _ATTRs.index(attr)))
+
+    def _can_be_intransitive_verb(self, verb: str) -> bool:
+        return self._has_attr(verb, ATTR.can_be_intransitive_verb)
+
+    def _can_be_transitive_verb(self, verb: str) -> bool:
+        return self._has_attr(verb, ATTR.can_be_transitive_verb)
+
+    def _can_be_event_noun(self, noun: str) -> bool:
+        return self._has_attr(noun, ATTR.can_be_event_noun)
+
+    def _can_be_entity_noun(self, noun: str) -> bool:
+        return self._has_attr(noun, ATTR.can_be_entity_noun)
+
+    def _get_nyms(self, i_column: int, word: str) -> List[str]:
+        entry = self._get_entry(word)
+        if entry is None:
+            return []
+        nyms = entry[i_column]
+        if nyms is None:
+            raise NotImplementedError()
+        return json.loads(nyms)
+
+    def get_synonyms(self, word: str) -> List[str]:
+        return self._get_nyms(2, word)
+
+    def get_antonyms(self, word: str) -> List[str]:
+        return self._get_nyms(3, word)
+
+    def get_negnyms(self, word: str) -> List[str]:
+        return self._get_nyms(4, word)
@@ -0,0 +1,97 @@
+""" Benchmark the check_sat() cache keys.
+
+Compares the canonical key of a formula set (canonicalize_rep_set()) with
+the previous keys made by enumerating up to 20 renamings of the predicates and constants.
+Queries are renamed and shuffled copies of earlier ones, so that an ideal key hits on all of them.
+
+    $ python ./benchmarks/check_sat_cache_key.py
+"""
+import time
+import random
+from typing import List, Tuple, Set
+
+from FLD_generator.formula import Formula, PREDICATES, CONSTANTS, canonicalize_rep_set
+from FLD_generator.interpretation import (
+    generate_mappings_from_predicates_and_constants,
+    interpret_formula,
+    interpret_formulas,
+)
+
+_ENUMERATED_KEYS_MAX_SIZE = 20
+
+
+def _enumerated_keys(formulas: List[Formula]) -> List[Tuple[str, ...]]:
+    keys = [tuple(sorted(formula.rep for formula in formulas))]
+    predicates = sorted({pred.rep for formula in formulas for pred in formula.predicates})
+    constants = sorted({const.rep for formula in formulas for const in formula.constants})
+    for i, mapping in enumerate(generate_mappings_from_predicates_and_constants(
+            predicates,
+            constants,
+            PREDICATES[:len(predicates)],
+            CONSTANTS[:len(constants)],
+            allow_many_to_one=False)):
+        if i >= _ENUMERATED_KEYS_MAX_SIZE:
+            break
+        keys.append(tuple(sorted(formula.rep for formula in interpret_formulas(formulas, mapping))))
+    return keys
+
+
+def _sample_formula_set() -> List[Formula]:
+    templates = [
+        '{A}{a}',
+        '¬{A}{b}',
+        '{A}{a} -> {B}{a}',
+        '(x): {A}x -> ¬{B}x',
+        '({A}{a} & {B}{a}) -> {C}{b}',
+        '(Ex): ({A}x v {C}x)',
+    ]
+    preds = random.sample(PREDICATES[:26], 6)
+    consts = random.sample(CONSTANTS[:26], 3)
+    formulas = []
+    for _ in range(random.randint(3, 7)):
+        rep = random.choice(templates)
+        mapping = {'{A}': random.choice(preds), '{B}': random.choice(preds), '{C}': random.choice(preds),
+                   '{a}': random.choice(consts), '{b}': random.choice(consts)}
+        formulas.append(interpret_formula(Formula(rep), mapping))
+    return formulas
+
+
+def _rename_and_shuffle(formulas: List[Formula]) -> List[Formula]:
+    predicates = sorted({pred.rep for formula in formulas for pred in formula.predicates})
+    constants = sorted({const.rep for formula in formulas for const in formula.constants})
+    mapping = dict(zip(predicates, random.sample(PREDICATES, len(predicates))))
+    mapping.update(zip(constants, random.sample(CONSTANTS, len(constants))))
+    renamed = interpret_formulas(formulas, mapping)
+    random.shuffle(renamed)
+    return renamed
+
+
+def main():
+    random.seed(0)
+    originals = [_sample_formula_set() for _ in range(300)]
+    queries = [_rename_and_shuffle(formulas) for formulas in originals]
+
+    enumerated_cache: Set[Tuple[str, ...]] = set()
+    for formulas in originals:
+        enumerated_cache.update(_enumerated_keys(formulas))
+    start = time.perf_counter()
+    enumerated_hits = 0
+    for formulas in queries:
+        if any(key in enumerated_cache for key in _enumerated_keys(formulas)):
+            enumerated_hits += 1
+    enumerated_sec = (time.perf_counter() - start) / len(queries)
+
+    canonical_cache = {canonicalize_rep_set([formula.rep for formula in formulas]) for formulas in originals}
+    start = time.perf_counter()
+    canonical_hits = 0
+    for formulas in queries:
+        if canonicalize_rep_set([formula.rep for formula in formulas]) in canonical_cache:
+            canonical_hits += 1
+    canonical_sec = (time.perf_counter() - start) / len(queries)
+
+    print(f'enumerated keys  : {enumerated_sec * 1000:.3f} [msec/query]    hit rate: {enumerated_hits / len(queries):.3f}')
+    print(f'canonical key    : {canonical_sec * 1000:.3f} [msec/query]    hit rate: {canonical_hits / len(queries):.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+""" Benchmark the per-formula cost of the structural property extraction.
+
+Compares the tokenizer in FLD_generator.formula with the giant regex alternations used before it.
+
+    $ python ./benchmarks/formula_tokenization.py
+"""
+import re
+import time
+import random
+from typing import List, Callable
+
+from FLD_generator.formula import (
+    PREDICATES,
+    CONSTANTS,
+    VARIABLES,
+    PASs,
+    _tokenize,
+    _FormulaCore,
+)
+
+
+def _compile_regexps():
+    predicate_regexp = re.compile('|'.join(PREDICATES))
+    constant_regexp = re.compile('|'.join(CONSTANTS))
+    variable_regexp = re.compile('|'.join(VARIABLES))
+    PAS_regexp = re.compile('|'.join(PASs))
+    unary_PAS_regexps = {
+        pred: re.compile('|'.join([f'{pred}{arg}' for arg in CONSTANTS + VARIABLES]))
+        for pred in PREDICATES
+    }
+    return predicate_regexp, constant_regexp, variable_regexp, PAS_regexp, unary_PAS_regexps
+
+
+def _sample_reps(num: int) -> List[str]:
+    templates = [
+        '{A}{a}',
+        '¬{A}{a} -> {B}{b}',
+        '({A}{a} & ¬{B}{a}) -> {C}{b}',
+        '(x): ¬({A}x v {B}x) -> {C}x',
+        '(Ex): ({A}x & {B}x)',
+        '¬(({A} v ¬{B}) & {C}) -> ¬{D}',
+    ]
+    reps = []
+    for _ in range(num):
+        rep = random.choice(templates)
+        rep = re.sub(r'\{[A-Z]\}', lambda _: random.choice(PREDICATES), rep)
+        rep = re.sub(r'\{[a-z]\}', lambda _: random.choice(CONSTANTS), rep)
+        reps.append(rep)
+    return reps
+
+
+def _measure(func: Callable, reps: List[str]) -> float:
+    start = time.perf_counter()
+    for rep in reps:
+        func(rep)
+    return (time.perf_counter() - start) / len(reps)
+
+
+def main():
+    random.seed(0)
+    reps = _sample_reps(20000)
+
+    start = time.perf_counter()
+    predicate_regexp, constant_regexp, variable_regexp, PAS_regexp, unary_PAS_regexps = _compile_regexps()
+    compile_sec = time.perf_counter() - start
+
+    def regexp_extract(rep: str):
+        predicates = sorted(set(predicate_regexp.findall(rep)))
+        sorted(set(constant_regexp.findall(rep)))
+        sorted(set(variable_regexp.findall(rep)))
+        sorted(set(PAS_regexp.findall(rep)))
+        [pred for pred in predicates if unary_PAS_regexps[pred].search(rep)]
+
+    def tokenizer_extract(rep: str):
+        core = _FormulaCore(rep)
+        core.predicates
+        core.constants
+        core.variables
+        core.PASs
+        core.unary_predicates
+
+    print(f'regexp compile                 : {compile_sec * 1000:.1f} [msec]')
+    print(f'tokenize only                  : {_measure(_tokenize, reps) * 1e6:.2f} [usec/formula]')
+    print(f'regexp   (all properties)      : {_measure(regexp_extract, reps) * 1e6:.2f} [usec/formula]')
+    print(f'tokenizer (all properties)     : {_measure(tokenizer_extract, reps) * 1e6:.2f} [usec/formula]')
+
+
+if __name__ == '__main__':
+    main()
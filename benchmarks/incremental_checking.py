@@ -0,0 +1,72 @@
+""" Benchmark the drop-one-fact provability queries used by have_smaller_proofs_with_logs().
+
+Compares re-building a solver per query (is_provable()) with a CheckerSession holding all the facts,
+and the drop-one enumeration with the unsat core based detection.
+The check_sat cache is disabled so that every query reaches the solver.
+
+    $ python ./benchmarks/incremental_checking.py
+"""
+import time
+import random
+from typing import List, Tuple
+
+from FLD_generator.formula import Formula, PREDICATES, CONSTANTS
+from FLD_generator.caches import configure_caches
+from FLD_generator.formula_checkers.z3_logic_checkers.checkers import is_provable, CheckerSession
+
+
+def _sample_chain(num_facts: int, num_distractors: int) -> Tuple[List[Formula], List[Formula], Formula]:
+    preds = random.sample(PREDICATES, num_facts + num_distractors + 1)
+    const = random.choice(CONSTANTS)
+    facts = [Formula(f'{preds[0]}{const}')]
+    for i in range(num_facts - 1):
+        facts.append(Formula(f'(x): {preds[i]}x -> {preds[i + 1]}x'))
+    distractors = [Formula(f'(x): {preds[num_facts + i]}x -> ¬{preds[i]}x') for i in range(num_distractors)]
+    hypothesis = Formula(f'{preds[num_facts - 1]}{const}')
+    return facts, distractors, hypothesis
+
+
+def main():
+    random.seed(0)
+    configure_caches({'check_sat': 0})  # disable the cache.
+    instances = [_sample_chain(8, 8) for _ in range(20)]
+
+    start = time.perf_counter()
+    num_queries = 0
+    for facts, distractors, hypothesis in instances:
+        for i_drop in range(len(facts)):
+            remainings = facts[:i_drop] + facts[i_drop + 1:]
+            is_provable(remainings + distractors, hypothesis)
+            num_queries += 1
+    rebuild_sec = (time.perf_counter() - start) / num_queries
+
+    start = time.perf_counter()
+    for facts, distractors, hypothesis in instances:
+        session = CheckerSession(facts + distractors)
+        for i_drop in range(len(facts)):
+            session.is_provable(hypothesis, dropped_fact_indexes=[i_drop])
+    session_sec = (time.perf_counter() - start) / num_queries
+
+    print(f'rebuild solver per query       : {rebuild_sec * 1000:.2f} [msec/query]')
+    print(f'incremental session            : {session_sec * 1000:.2f} [msec/query]')
+
+    for num_distractors in [0, 8]:
+        instances = [_sample_chain(8, num_distractors) for _ in range(20)]
+
+        start = time.perf_counter()
+        for facts, distractors, hypothesis in instances:
+            session = CheckerSession(facts + distractors)
+            session.find_droppable_fact(hypothesis, droppable_fact_indexes=range(len(facts)))
+        enumeration_sec = (time.perf_counter() - start) / len(instances)
+
+        start = time.perf_counter()
+        for facts, distractors, hypothesis in instances:
+            session = CheckerSession(facts + distractors)
+            session.find_droppable_fact_by_unsat_core(hypothesis, droppable_fact_indexes=range(len(facts)))
+        unsat_core_sec = (time.perf_counter() - start) / len(instances)
+
+        print(f'drop-one enumeration ({num_distractors} dists) : {enumeration_sec * 1000:.2f} [msec/instance]')
+        print(f'unsat core           ({num_distractors} dists) : {unsat_core_sec * 1000:.2f} [msec/instance]')
+
+if __name__ == '__main__':
+    main()
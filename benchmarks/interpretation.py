@@ -0,0 +1,53 @@
+""" Benchmark the interpretation of formulas by mappings.
+
+Compares the slot templates (fill_slot_template()) with the regex substitution used before them,
+which compiled the alternation of the mapping keys on every call.
+
+    $ python ./benchmarks/interpretation.py
+"""
+import re
+import time
+import random
+from typing import List, Dict, Tuple
+
+from FLD_generator.formula import Formula, PREDICATES, CONSTANTS, fill_slot_template
+from FLD_generator.proof_tree_generators import load_arguments
+
+
+def _regexp_interpret(rep: str, mapping: Dict[str, str]) -> str:
+    pattern = re.compile('|'.join(mapping.keys()))
+    return pattern.sub(lambda m: mapping[m.group(0)], rep)
+
+
+def _sample_queries(formulas: List[Formula], num: int) -> List[Tuple[Formula, Dict[str, str]]]:
+    queries = []
+    for _ in range(num):
+        formula = random.choice(formulas)
+        mapping: Dict[str, str] = {}
+        mapping.update({pred.rep: random.choice(PREDICATES) for pred in formula.predicates})
+        mapping.update({const.rep: random.choice(CONSTANTS) for const in formula.constants})
+        queries.append((formula, mapping))
+    return queries
+
+
+def main():
+    random.seed(0)
+    arguments = load_arguments(['./configs/arguments/axioms/'])
+    formulas = list({formula.rep: formula for argument in arguments for formula in argument.all_formulas}.values())
+    queries = [(formula, mapping) for formula, mapping in _sample_queries(formulas, 100000) if len(mapping) > 0]
+
+    start = time.perf_counter()
+    regexp_reps = [_regexp_interpret(formula.rep, mapping) for formula, mapping in queries]
+    regexp_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    slot_reps = [fill_slot_template(formula.slot_template, mapping) for formula, mapping in queries]
+    slot_sec = time.perf_counter() - start
+    assert slot_reps == regexp_reps
+
+    print(f'regexp substitution            : {regexp_sec / len(queries) * 1e6:.2f} [usec/formula]')
+    print(f'slot template                  : {slot_sec / len(queries) * 1e6:.2f} [usec/formula]')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+""" Benchmark the random generation of the mappings from a few source symbols to many target symbols.
+
+Compares _generate_assignments(), which decodes the lazily shuffled indices of the assignments,
+with the nested permutation generators used before it, which shuffled the targets at every level of the recursion.
+We measure the time to take the first and the first 100 mappings, as the generators are usually abandoned after a few mappings.
+
+    $ python ./benchmarks/mapping_sampler.py
+"""
+import time
+import random
+from typing import Any, Callable, Iterable, List
+
+from FLD_generator.interpretation import _generate_assignments
+
+
+def _make_permutations(objs: List[Any],
+                       length: int,
+                       shuffle=False,
+                       allow_many_to_one=True) -> Iterable[List[Any]]:
+    """ The previous implementation without the constraints. """
+    if length < 1:
+        return
+    if shuffle:
+        objs = random.sample(objs, len(objs))
+
+    if length == 1:
+        for obj in objs:
+            yield [obj]
+    else:
+        permutators = []
+        for head in objs:
+            if allow_many_to_one:
+                tail_objs = objs
+            else:
+                tail_objs = objs.copy()
+                while head in tail_objs:
+                    tail_objs.remove(head)
+            permutators.append((head, _make_permutations(tail_objs, length - 1, shuffle=shuffle, allow_many_to_one=allow_many_to_one)))
+        for head, tail_permutator in permutators:
+            for tail in tail_permutator:
+                yield [head] + tail
+
+
+def _measure(generate: Callable[[], Iterable[List[Any]]], num_takes: int, num_trials: int) -> float:
+    start = time.perf_counter()
+    for _ in range(num_trials):
+        for i_take, _ in enumerate(generate()):
+            if i_take + 1 >= num_takes:
+                break
+    return (time.perf_counter() - start) / num_trials
+
+
+def main():
+    random.seed(0)
+    for num_tgts in [200, 500]:
+        tgt_objs = [f'{{T{i}}}' for i in range(num_tgts)]
+        for allow_many_to_one in [False, True]:
+            for length in [3, 4, 5, 6]:
+                for num_takes in [1, 100]:
+                    prev_sec = _measure(lambda: _make_permutations(tgt_objs, length, shuffle=True, allow_many_to_one=allow_many_to_one),
+                                        num_takes, 20)
+                    new_sec = _measure(lambda: _generate_assignments(tgt_objs, length, shuffle=True, allow_many_to_one=allow_many_to_one),
+                                       num_takes, 20)
+                    print(f'targets={num_tgts:<4} many_to_one={str(allow_many_to_one):<6} sources={length} take={num_takes:<4}'
+                          f'   previous: {prev_sec * 1000:8.3f} [msec]   new: {new_sec * 1000:8.3f} [msec]')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+""" Benchmark the mapping search of a stem step, i.e., finding the mappings which interpret a premise of an argument into the current conclusion.
+
+Compares generate_unifying_mappings() with the previous search which tests every mapping of generate_mappings_from_formula().
+The conclusions are the premises of the axiom arguments renamed into random symbols,
+and half of the queries pair a premise with the conclusion made from another premise, most of which do not unify.
+
+    $ python ./benchmarks/mapping_unification.py
+"""
+import time
+import random
+from typing import List, Tuple, Dict
+
+from FLD_generator.formula import Formula, PREDICATES, CONSTANTS
+from FLD_generator.interpretation import (
+    generate_mappings_from_formula,
+    generate_unifying_mappings,
+    interpret_formula,
+)
+from FLD_generator.proof_tree_generators import load_arguments
+
+
+def _sample_queries(premises: List[Formula], num: int) -> List[Tuple[Formula, Formula]]:
+    queries = []
+    for i_query in range(num):
+        premise = random.choice(premises)
+        source = premise if i_query % 2 == 0 else random.choice(premises)
+        mapping: Dict[str, str] = {}
+        mapping.update({pred.rep: random.choice(PREDICATES[:8]) for pred in source.predicates})
+        mapping.update({const.rep: random.choice(CONSTANTS[:4]) for const in source.constants})
+        queries.append((premise, interpret_formula(source, mapping)))
+    return queries
+
+
+def _search_by_test(premise: Formula, conclusion: Formula) -> List[Dict[str, str]]:
+    return [mapping
+            for mapping in generate_mappings_from_formula([premise], [conclusion], allow_many_to_one=True, shuffle=True)
+            if interpret_formula(premise, mapping).rep == conclusion.rep]
+
+
+def _search_by_unification(premise: Formula, conclusion: Formula) -> List[Dict[str, str]]:
+    return list(generate_unifying_mappings([premise], [[conclusion]], allow_many_to_one=True, shuffle=True))
+
+
+def main():
+    random.seed(0)
+    arguments = load_arguments(['./configs/arguments/axioms/'])
+    premises = list({premise.rep: premise for argument in arguments for premise in argument.premises}.values())
+    queries = _sample_queries(premises, 2000)
+
+    results = {}
+    for name, search in [('generate-then-test', _search_by_test), ('unification', _search_by_unification)]:
+        start = time.perf_counter()
+        results[name] = [search(premise, conclusion) for premise, conclusion in queries]
+        sec = time.perf_counter() - start
+        print(f'{name:<20}: {sec / len(queries) * 1e6:.1f} [usec/query]')
+
+    num_matched = sum(len(mappings) > 0 for mappings in results['unification'])
+    print(f'{num_matched} of {len(queries)} queries have a unifying mapping')
+    for mappings_by_test, mappings_by_unification in zip(results['generate-then-test'], results['unification']):
+        assert sorted(sorted(mapping.items()) for mapping in mappings_by_test)\
+            == sorted(sorted(mapping.items()) for mapping in mappings_by_unification)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+""" Dump the wordnet word bank into a lexicon file, which is loaded by create_corpus.py --word-bank-lexicon.
+
+    $ python ./build_lexicon.py ./res/word_banks/english/lexicon.sqlite
+"""
+import logging
+
+import click
+
+from FLD_generator.word_banks import build_wordnet_wordbank, build_lexicon
+from logger_setup import setup as setup_logger
+
+logger = logging.getLogger(__name__)
+
+
+@click.command()
+@click.argument('output_path')
+@click.option('--lang', type=str, default='eng')
+@click.option('--transitive-verbs-path', type=str, default=None)
+@click.option('--intransitive-verbs-path', type=str, default=None)
+def main(output_path,
+         lang,
+         transitive_verbs_path,
+         intransitive_verbs_path):
+    setup_logger(do_stderr=True, level=logging.INFO)
+
+    word_bank = build_wordnet_wordbank(lang,
+                                       transitive_verbs_path=transitive_verbs_path,
+                                       intransitive_verbs_path=intransitive_verbs_path)
+    build_lexicon(word_bank, output_path)
+
+
+if __name__ == '__main__':
+    main()
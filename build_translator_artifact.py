@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+""" Build the translator once and save it as a precompiled artifact, which is loaded by create_corpus.py --translation-artifact.
+
+    $ python ./build_translator_artifact.py ./res/translator.artifact --tc ./configs/translations/thing.v1
+"""
+import random
+import time
+import logging
+
+import click
+
+from FLD_generator.translators import build as build_translator, load as load_translator
+from FLD_generator.word_banks import build_wordnet_wordbank
+from FLD_generator.utils import _build_bounded_msg
+from logger_setup import setup as setup_logger
+
+logger = logging.getLogger(__name__)
+
+
+@click.command()
+@click.argument('output_path')
+@click.option('--translation-config', '--tc',
+              multiple=True,
+              default=['./configs/translations/thing.v1'],
+              help='natural language translation config files')
+@click.option('--limit-vocab-size-per-type', type=int, default=None)
+@click.option('--translation-default-weight-factor-type', type=str, default='W_VOL__1.0')
+@click.option('--translation-adj-verb-noun-ratio', type=str, default='1-1-1')
+@click.option('--seed', type=int, default=0)
+def main(output_path,
+         translation_config,
+         limit_vocab_size_per_type,
+         translation_default_weight_factor_type,
+         translation_adj_verb_noun_ratio,
+         seed):
+    setup_logger(do_stderr=True, level=logging.INFO)
+    random.seed(seed)
+
+    logger.info(_build_bounded_msg(f'{"[start] building translator":<30}', 3))
+    translator = build_translator(list(translation_config),
+                                  build_wordnet_wordbank('eng'),
+                                  adj_verb_noun_ratio=translation_adj_verb_noun_ratio,
+                                  use_fixed_translation=False,
+                                  limit_vocab_size_per_type=limit_vocab_size_per_type,
+                                  default_weight_factor_type=translation_default_weight_factor_type)
+    logger.info(_build_bounded_msg(f'{"[finish] building translator":<30}', 3))
+
+    translator.save(output_path)
+
+    start = time.time()
+    load_translator(output_path, use_fixed_translation=False)
+    logger.info('saved the translator artifact to "%s", which is loaded in %.3f [sec]', output_path, time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,43 @@
 #!/usr/bin/env python
+import os
 import math
 import random
 import json
-from typing import List, Dict, Optional, Tuple
+import time
+import copy
+from typing import List, Dict, Optional, Tuple, Any, Iterator, Iterable, Set, Sequence
 from pathlib import Path
 from pprint import pformat
 import logging
-from collections import defaultdict
+import multiprocessing
+import queue as queue_lib
+import traceback
 
 import click
 from tqdm import tqdm
 import dill
 
-from FLD_generator.translators import build as build_translator
-from FLD_generator.word_banks import build_wordnet_wordbank
+from FLD_generator.translators import build as build_translator, load as load_translator
+from FLD_generator.word_banks import build_wordnet_wordbank, LexiconWordBank
 from FLD_generator.formula_distractors import FormulaDistractor
 from FLD_generator.argument import Argument
 from FLD_generator.proof_tree_generation_pipeline import ProofTreeGenerationPipeline
 from FLD_generator.proof_tree_generators import build as build_generator
 from FLD_generator.datasets import NLProofSDataset
+from FLD_generator.stats import StatsAccumulator
+from FLD_generator.budgets import AdaptiveBudgets, enable_adaptive_budgets, get_adaptive_budgets, load_budgets
+from FLD_generator.corpus_shards import ShardIndex, ShardWriter, COMPRESSIONS, get_index_path
 from FLD_generator.proof import ProofTree
 from FLD_generator.utils import nested_merge
 from FLD_generator.formula_distractors import build as build_distractor
 from FLD_generator.translation_distractors import build as build_translation_distractor
 from FLD_generator.utils import _build_bounded_msg, log_results
+from FLD_generator.caches import configure_caches, get_cache_stats
+from FLD_generator.formula_checkers import (
+    configure_persistent_check_sat_cache,
+    flush_persistent_check_sat_cache,
+    get_persistent_check_sat_cache_stats,
+)
 from joblib import Parallel, delayed
 
 from logger_setup import setup as setup_logger
@@ -63,7 +77,14 @@ def load_dataset(argument_config: List[str],
                  depth_range: Tuple[int, int],
                  depth_distrib: str,
                  force_fix_illegal_intermediate_constants: bool,
-                 branch_extensions_range: Tuple[int, int]):
+                 branch_extensions_range: Tuple[int, int],
+                 translation_artifact: Optional[str] = None,
+                 word_bank_lexicon: Optional[str] = None,
+                 seed: Optional[int] = None):
+    if seed is not None:
+        # Every worker must build the same dataset, since the instances are generated from their own random generators with the dataset.
+        random.seed(seed)
+
     generator = build_generator(
         argument_config,
         elim_dneg=not keep_dneg,
@@ -73,9 +94,19 @@ def load_dataset(argument_config: List[str],
         quantification_degree=quantification_degree,
     )
 
-    logger.info(_build_bounded_msg(f'{"[start] building wordnet":<30}', 3))
-    word_bank = build_wordnet_wordbank('eng')
-    logger.info(_build_bounded_msg(f'{"[finish] building wordnet":<30}', 3))
+    if translation_artifact is not None\
+            and translation_distractors_range[1] == 0\
+            and not use_collapsed_translation_nodes_for_unknown_tree:
+        # the translator loaded from the artifact does not need the word bank.
+        word_bank = None
+    elif word_bank_lexicon is not None:
+        logger.info(_build_bounded_msg(f'{"[start] loading lexicon":<30}', 3))
+        word_bank = LexiconWordBank(word_bank_lexicon)
+        logger.info(_build_bounded_msg(f'{"[finish] loading lexicon":<30}', 3))
+    else:
+        logger.info(_build_bounded_msg(f'{"[start] building wordnet":<30}', 3))
+        word_bank = build_wordnet_wordbank('eng')
+        logger.info(_build_bounded_msg(f'{"[finish] building wordnet":<30}', 3))
 
     if distractors_range[1] > 0:
         logger.info(_build_bounded_msg(f'{"[start] building distractor":<30}', 3))
@@ -102,16 +133,26 @@ def load_dataset(argument_config: List[str],
     else:
         _translation_distractor = None
 
-    logger.info(_build_bounded_msg(f'{"[start] building translator":<30}', 3))
-    translator = build_translator(translation_config,
-                                  word_bank,
-                                  adj_verb_noun_ratio=translation_adj_verb_noun_ratio,
-                                  use_fixed_translation=use_fixed_translation,
-                                  reused_object_nouns_max_factor=reused_object_nouns_max_factor,
-                                  limit_vocab_size_per_type=limit_vocab_size_per_type,
-                                  volume_to_weight=translation_volume_to_weight,
-                                  default_weight_factor_type=translation_default_weight_factor_type)
-    logger.info(_build_bounded_msg(f'{"[finish] building translator":<30}', 3))
+    if translation_artifact is not None:
+        logger.info(_build_bounded_msg(f'{"[start] loading translator":<30}', 3))
+        logger.info('the translation config, the vocabulary and the weight factor type are taken from the artifact "%s"',
+                    translation_artifact)
+        translator = load_translator(translation_artifact,
+                                     use_fixed_translation=use_fixed_translation,
+                                     reused_object_nouns_max_factor=reused_object_nouns_max_factor,
+                                     volume_to_weight=translation_volume_to_weight)
+        logger.info(_build_bounded_msg(f'{"[finish] loading translator":<30}', 3))
+    else:
+        logger.info(_build_bounded_msg(f'{"[start] building translator":<30}', 3))
+        translator = build_translator(translation_config,
+                                      word_bank,
+                                      adj_verb_noun_ratio=translation_adj_verb_noun_ratio,
+                                      use_fixed_translation=use_fixed_translation,
+                                      reused_object_nouns_max_factor=reused_object_nouns_max_factor,
+                                      limit_vocab_size_per_type=limit_vocab_size_per_type,
+                                      volume_to_weight=translation_volume_to_weight,
+                                      default_weight_factor_type=translation_default_weight_factor_type)
+        logger.info(_build_bounded_msg(f'{"[finish] building translator":<30}', 3))
 
     pipeline = ProofTreeGenerationPipeline(
         generator,
@@ -150,26 +191,487 @@ def load_dataset(argument_config: List[str],
                            unknown_ratio=unknown_ratio,
                            use_collapsed_translation_nodes_for_unknown_tree=use_collapsed_translation_nodes_for_unknown_tree,
                            swap_ng_words=swap_ng_words,
-                           word_bank = word_bank if use_collapsed_translation_nodes_for_unknown_tree else None)
+                           word_bank = word_bank if use_collapsed_translation_nodes_for_unknown_tree else None,
+                           seed=seed)
+
+
+def build_dataset_args(params: Dict[str, Any]) -> Tuple[Tuple, Dict[str, Any]]:
+    """ The arguments of load_dataset() and _setup_worker() from the option values of main(), e.g., those in OUTPUT_PATH.config.json. """
+    depth_range = tuple(json.loads(params['depth_range']))
+    branch_extensions_range = json.loads(params['branch_extensions_range'])
+    distractors_range = json.loads(params['distractors_range'])
+    translation_distractors_range = json.loads(params['translation_distractors_range'])
+    proof_stances = json.loads(params['proof_stances'])
+    swap_ng_words = json.load(open(params['swap_ng_words_config'])) if params['swap_ng_words_config'] is not None else None
+    cache_max_sizes = json.loads(params['cache_max_sizes']) if params['cache_max_sizes'] is not None else None
+    # the configs of the runs before the adaptive budgets do not have the options.
+    budgets_warm_start_path = params.get('budgets_warm_start', None)
+    budgets_warm_start = load_budgets(json.load(open(budgets_warm_start_path))) if budgets_warm_start_path is not None else None
+
+    if len(params['argument_config']) == 0:
+        raise ValueError()
+
+    dataset_args = (
+        params['argument_config'],
+        params['translation_config'],
+        params['use_fixed_translation'],
+        params['reused_object_nouns_max_factor'],
+        params['limit_vocab_size_per_type'],
+        params['translation_volume_to_weight'],
+        params['translation_default_weight_factor_type'],
+        params['translation_adj_verb_noun_ratio'],
+        params['complex_formula_arguments_weight'],
+        params['quantifier_axiom_arguments_weight'],
+        params['quantifier_axiom'],
+        params['quantification_degree'],
+        params['keep_dneg'],
+        params['distractor'],
+        distractors_range,
+        params['sample_distractor_prototype_formulas_from_all_possible_formulas'],
+        params['disallow_simplified_tree_formulas_as_distractor_prototype'],
+        params['disallow_hard_negative_distractors'],
+        # params['negative_tree_negated_hypothesis_ratio'],
+        params['disallow_subj_obj_swapped_distractor'],
+        params['translation_distractor'],
+        params['fallback_from_formula_to_translation_distractor'],
+        translation_distractors_range,
+        proof_stances,
+        params['world_assump'],
+        params['unknown_ratio'],
+        params['use_collapsed_translation_nodes_for_unknown_tree'],
+        swap_ng_words,
+        depth_range,
+        params['depth_distrib'],
+        params['force_fix_illegal_intermediate_constants'],
+        branch_extensions_range,
+        params['translation_artifact'],
+        params['word_bank_lexicon'],
+        params['seed'] if params['reproducible'] else None,
+    )
+    setup_kwargs = {
+        'cache_max_sizes': cache_max_sizes,
+        'sat_cache_path': params['sat_cache_path'],
+        'sat_cache_max_size': params['sat_cache_max_size'],
+        'adaptive_budgets': params.get('adaptive_budgets', False) or budgets_warm_start is not None,
+        'budgets_warm_start': budgets_warm_start,
+    }
+    return dataset_args, setup_kwargs
+
+
+def _write_config(path: Path, params: Dict[str, Any]) -> None:
+    """ Write the option values with the hash seed of python, on which the generation also depends. """
+    config = {
+        'params': params,
+        'python_hash_seed': os.environ.get('PYTHONHASHSEED', None),
+    }
+    with open(path, 'w') as f_out:
+        json.dump(config, f_out, ensure_ascii=False, indent=4)
+
+
+# the options which do not change the generated instances, thus, can be changed when resuming the sharded corpus.
+# size, shard_size, seed and compression are checked by the shard index by themselves.
+_NON_GENERATION_PARAMS = {
+    'output_path',
+    'size',
+    'shard_size',
+    'seed',
+    'compression',
+    'resume',
+    'num_workers',
+    'min_size_per_worker',
+    'batch_size_per_worker',
+    'streaming',
+    'stats_interval',
+    'cache_max_sizes',
+    'sat_cache_path',
+    'sat_cache_max_size',
+}
+
+
+def _get_generation_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """ The option values and the hash seed of python, on which the generated instances depend. """
+    generation_params = {name: val for name, val in params.items() if name not in _NON_GENERATION_PARAMS}
+    generation_params['python_hash_seed'] = os.environ.get('PYTHONHASHSEED', None)
+    return generation_params
+
+
+def _setup_caches(cache_max_sizes: Optional[Dict[str, int]] = None,
+                  sat_cache_path: Optional[str] = None,
+                  sat_cache_max_size: int = 10000000) -> None:
+    if cache_max_sizes is not None:
+        configure_caches(cache_max_sizes)
+    if sat_cache_path is not None:
+        configure_persistent_check_sat_cache(sat_cache_path, max_size=sat_cache_max_size)
+
+
+def _setup_worker(cache_max_sizes: Optional[Dict[str, int]] = None,
+                  sat_cache_path: Optional[str] = None,
+                  sat_cache_max_size: int = 10000000,
+                  adaptive_budgets=False,
+                  budgets_warm_start: Optional[Dict[str, Dict[str, float]]] = None) -> None:
+    _setup_caches(cache_max_sizes=cache_max_sizes,
+                  sat_cache_path=sat_cache_path,
+                  sat_cache_max_size=sat_cache_max_size)
+    enable_adaptive_budgets(AdaptiveBudgets(warm_start=budgets_warm_start) if adaptive_budgets else None)
+
+
+def _add_worker_stats(stats_accumulator: StatsAccumulator,
+                      prev_cache_counters: Optional[Dict[str, int]] = None) -> None:
+    """ Add the stats of the worker, which are not of the instances, i.e., the cache counters and the adaptive budgets.
+
+    prev_cache_counters are subtracted from the cache counters, so that only those since then are added.
+    """
+    cache_counters = _get_cache_counters()
+    if prev_cache_counters is not None:
+        cache_counters = {name: count - prev_cache_counters.get(name, 0) for name, count in cache_counters.items()}
+    stats_accumulator.add_counters(cache_counters)
+    budgets = get_adaptive_budgets()
+    if budgets is not None:
+        stats_accumulator.add_budgets(budgets)
+
+
+def _get_cache_counters() -> Dict[str, int]:
+    counters: Dict[str, int] = {}
+    for cache_name, cache_stats in get_cache_stats().items():
+        for stat_name in ['hit', 'miss', 'eviction', 'size']:
+            counters[f'cache.{cache_name}.{stat_name}'] = cache_stats[stat_name]
+
+    flush_persistent_check_sat_cache()
+    persistent_cache_stats = get_persistent_check_sat_cache_stats()
+    if persistent_cache_stats is not None:
+        for stat_name, count in persistent_cache_stats.items():
+            counters[f'cache.check_sat.persistent.{stat_name}'] = count
+    return counters
+
+
+def _write_stats(path: Path, stats_accumulator: StatsAccumulator) -> None:
+    """ Write the stats atomically so that the file can be read while the corpus is being generated. """
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f_out:
+        json.dump(stats_accumulator.to_dict(), f_out,
+                  ensure_ascii=False, indent=4, sort_keys=True, separators=(',', ': '))
+    tmp_path.replace(path)
+
+
+def _split_size(size: int, num_workers: int) -> List[int]:
+    return [size // num_workers + (1 if i_worker < size % num_workers else 0)
+            for i_worker in range(num_workers)]
 
 
-def generate_instances(size: int, *args):
+def generate_instances(size: int,
+                       *args,
+                       instance_indices: Optional[Sequence[int]] = None,
+                       **setup_kwargs):
+    _setup_worker(**setup_kwargs)
     dataset = load_dataset(*args)
     data = []
-    agg_stats = defaultdict(int)
-    for i_sample, (nlproof_json, proof_tree, distractors, translation_distractors, stats) in tqdm(enumerate(dataset.generate(size))):
+    stats_accumulator = StatsAccumulator()
+    for i_sample, (nlproof_json, proof_tree, distractors, translation_distractors, _) in tqdm(enumerate(dataset.generate(size, stats_accumulator=stats_accumulator, instance_indices=instance_indices))):
         data.append((nlproof_json, proof_tree, distractors, translation_distractors))
 
         log_results(logger, i_sample=i_sample, nlproof_json=nlproof_json, proof_tree=proof_tree,
                     distractors=distractors, translation_distractors=translation_distractors,
                     stats=None)
 
-        if stats is not None:
-            for name, count in stats.items():
-                if count is not None:
-                    agg_stats[name] += count
-
-    return data, agg_stats
+    _add_worker_stats(stats_accumulator)
+
+    return data, stats_accumulator
+
+
+def _generate_shard(dataset: NLProofSDataset,
+                    shard_path: Path,
+                    instance_indices: Sequence[int],
+                    compression: str) -> Tuple[int, StatsAccumulator]:
+    """ Generate the instances of a shard and finalize it. """
+    stats_accumulator = StatsAccumulator()
+    writer = ShardWriter(shard_path, compression)
+    try:
+        for i_sample, (nlproof_json, proof_tree, distractors, translation_distractors, _) in enumerate(dataset.generate(len(instance_indices), stats_accumulator=stats_accumulator, instance_indices=instance_indices)):
+            log_results(logger, i_sample=i_sample, nlproof_json=nlproof_json, proof_tree=proof_tree,
+                        distractors=distractors, translation_distractors=translation_distractors,
+                        stats=None)
+            writer.write(nlproof_json)
+        writer.finalize()
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.count, stats_accumulator
+
+
+def _generate_shards_from_queue(i_worker: int,
+                                task_queue: multiprocessing.Queue,
+                                result_queue: multiprocessing.Queue,
+                                args: Tuple,
+                                setup_kwargs: Dict[str, Any]) -> None:
+    """ A long-lived worker of the sharded mode.
+
+    The worker builds the dataset once and generates the shards taken from task_queue until it takes None.
+    The stats of each shard are put to result_queue as soon as the shard is finalized.
+    They are only of the shard: the cache counters are those counted while the shard is generated,
+    and the adaptive budgets of the shard are warm-started from those learned by the worker so far.
+    """
+    try:
+        _setup_worker(**setup_kwargs)
+        dataset = load_dataset(*args)
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            i_shard, shard_path, instance_indices, shard_seed, compression = task
+            # without --reproducible, the instances are generated from this global random generator.
+            random.seed(shard_seed)
+
+            prev_cache_counters = _get_cache_counters()
+            budgets = get_adaptive_budgets()
+            if budgets is not None:
+                enable_adaptive_budgets(AdaptiveBudgets(warm_start=budgets.get_budgets()))
+
+            count, stats_accumulator = _generate_shard(dataset, shard_path, instance_indices, compression)
+            _add_worker_stats(stats_accumulator, prev_cache_counters=prev_cache_counters)
+            result_queue.put(('shard', i_worker, (i_shard, count, stats_accumulator)))
+        result_queue.put(('done', i_worker, None))
+    except Exception:
+        result_queue.put(('error', i_worker, traceback.format_exc()))
+
+
+def generate_shards(shard_index: ShardIndex,
+                    num_workers: int,
+                    args: Tuple,
+                    setup_kwargs: Dict[str, Any],
+                    stats_path: Optional[Path] = None) -> StatsAccumulator:
+    """ Generate the shards not in the index by long-lived workers, each of which builds the dataset once.
+
+    The index and the stats are updated each time a shard is finalized.
+    """
+    pending_shards = shard_index.pending_shards
+    logger.info('%d shards out of %d are to be generated', len(pending_shards), shard_index.num_shards)
+    num_workers = min(num_workers, len(pending_shards))
+
+    task_queue = multiprocessing.Queue()
+    for i_shard in pending_shards:
+        task_queue.put((i_shard,
+                        shard_index.get_shard_path(i_shard),
+                        shard_index.get_shard_instance_indices(i_shard),
+                        shard_index.get_shard_seed(i_shard),
+                        shard_index.compression))
+    for _ in range(num_workers):
+        task_queue.put(None)
+
+    result_queue = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_generate_shards_from_queue,
+                                args=(i_worker, task_queue, result_queue, args, setup_kwargs),
+                                daemon=True)
+        for i_worker in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    done_workers: Set[int] = set()
+    try:
+        while len(done_workers) < num_workers:
+            try:
+                kind, i_worker, payload = result_queue.get(timeout=10)
+            except queue_lib.Empty:
+                for i_worker, worker in enumerate(workers):
+                    if i_worker not in done_workers and not worker.is_alive():
+                        raise RuntimeError(f'worker {i_worker} exited without finishing (exitcode={worker.exitcode})')
+                continue
+
+            if kind == 'error':
+                raise RuntimeError(f'worker {i_worker} failed:\n{payload}')
+            elif kind == 'done':
+                done_workers.add(i_worker)
+                continue
+
+            i_shard, count, stats_accumulator = payload
+            shard_index.add_shard(i_shard, count, stats=stats_accumulator.state_dict())
+            shard_index.save()
+
+            stats_accumulator = _merge_shard_stats(shard_index)
+            logger.info('=========================== gathered stats (%d / %d shards) ============================',
+                        len(shard_index.shards), shard_index.num_shards)
+            logger.info('\n' + pformat(stats_accumulator.to_dict()))
+            if stats_path is not None:
+                _write_stats(stats_path, stats_accumulator)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+    return _merge_shard_stats(shard_index)
+
+
+def _warm_start_budgets(setup_kwargs: Dict[str, Any], stats_accumulator: StatsAccumulator) -> Dict[str, Any]:
+    """ The setup of the next workers, which start from the budgets learned by the previous workers. """
+    if not setup_kwargs.get('adaptive_budgets', False) or stats_accumulator.budgets is None:
+        return setup_kwargs
+    return dict(setup_kwargs, budgets_warm_start=stats_accumulator.budgets.get_budgets())
+
+
+def _merge_shard_stats(shard_index: ShardIndex) -> StatsAccumulator:
+    return _merge_stats(StatsAccumulator.from_state_dict(shard['stats'])
+                        for shard in shard_index.shards.values()
+                        if shard['stats'] is not None)
+
+
+def _generate_instances_to_queue(i_worker: int,
+                                 instance_indices: Sequence[int],
+                                 seed: int,
+                                 instance_queue: multiprocessing.Queue,
+                                 control_queue: multiprocessing.Queue,
+                                 args: Tuple,
+                                 setup_kwargs: Dict[str, Any],
+                                 stats_interval: float = 60.0) -> None:
+    """ A long-lived worker of the streaming mode.
+
+    The worker builds the dataset once and puts the json line of each instance to its own instance_queue as soon as it is generated.
+    As the instance_queue is bounded, the worker blocks when it runs too far ahead of the writer.
+    The stats of the instances generated so far are put to the control_queue every stats_interval seconds and at the end.
+    The proof trees are not sent to the parent.
+    """
+    try:
+        # without --reproducible, the instances are generated from this global random generator.
+        random.seed(seed + i_worker)
+        _setup_worker(**setup_kwargs)
+        dataset = load_dataset(*args)
+        stats_accumulator = StatsAccumulator()
+        last_reported = time.time()
+        for i_sample, (nlproof_json, proof_tree, distractors, translation_distractors, _) in enumerate(dataset.generate(len(instance_indices), stats_accumulator=stats_accumulator, instance_indices=instance_indices)):
+            log_results(logger, i_sample=i_sample, nlproof_json=nlproof_json, proof_tree=proof_tree,
+                        distractors=distractors, translation_distractors=translation_distractors,
+                        stats=None)
+            instance_queue.put(json.dumps(nlproof_json))
+
+            if time.time() - last_reported >= stats_interval:
+                # the queue pickles the object later in another thread, so we put a copy.
+                control_queue.put(('stats', i_worker, copy.deepcopy(stats_accumulator)))
+                last_reported = time.time()
+
+        _add_worker_stats(stats_accumulator)
+        control_queue.put(('done', i_worker, stats_accumulator))
+    except Exception:
+        control_queue.put(('error', i_worker, traceback.format_exc()))
+
+
+def _round_robin_order(sizes: List[int]) -> Iterator[int]:
+    for i_round in range(max(sizes, default=0)):
+        for i_worker, size in enumerate(sizes):
+            if i_round < size:
+                yield i_worker
+
+
+def _merge_stats(stats_accumulators: Iterable[StatsAccumulator]) -> StatsAccumulator:
+    merged = StatsAccumulator()
+    for stats_accumulator in stats_accumulators:
+        merged.merge(stats_accumulator)
+    return merged
+
+
+def _handle_control_message(kind: str,
+                            i_worker: int,
+                            payload: Any,
+                            worker_stats: Dict[int, StatsAccumulator],
+                            done_workers: Set[int]) -> None:
+    if kind == 'error':
+        raise RuntimeError(f'worker {i_worker} failed:\n{payload}')
+    # the stats of a worker are cumulative, so the latest ones replace the previous ones.
+    worker_stats[i_worker] = payload
+    if kind == 'done':
+        done_workers.add(i_worker)
+
+
+def _drain_control_queue(control_queue: multiprocessing.Queue,
+                         worker_stats: Dict[int, StatsAccumulator],
+                         done_workers: Set[int]) -> None:
+    while True:
+        try:
+            kind, i_worker, payload = control_queue.get_nowait()
+        except queue_lib.Empty:
+            return
+        _handle_control_message(kind, i_worker, payload, worker_stats, done_workers)
+
+
+def _check_workers_alive(workers: List[multiprocessing.Process],
+                         control_queue: multiprocessing.Queue,
+                         worker_stats: Dict[int, StatsAccumulator],
+                         done_workers: Set[int]) -> None:
+    # a worker which failed puts the traceback before exiting, so we read it first to raise with it.
+    _drain_control_queue(control_queue, worker_stats, done_workers)
+    for i_worker, worker in enumerate(workers):
+        if i_worker not in done_workers and not worker.is_alive():
+            raise RuntimeError(f'worker {i_worker} exited without finishing (exitcode={worker.exitcode})')
+
+
+def generate_instances_streaming(f_out,
+                                 size: int,
+                                 num_workers: int,
+                                 seed: int,
+                                 args: Tuple,
+                                 setup_kwargs: Dict[str, Any],
+                                 queue_size=1000,
+                                 stats_path: Optional[Path] = None,
+                                 stats_interval: float = 60.0) -> StatsAccumulator:
+    """ Generate instances by long-lived workers and write them to f_out as soon as they are ready.
+
+    The instances are written in the round-robin order over the workers,
+    so that the output is independent of the relative speed of the workers.
+    The i-th worker generates the instances of the indices i, i + num_workers, ..., which are written in the index order.
+    The workers are seeded by seed + i, unless the instances are generated from their own random generators (--reproducible).
+    Each worker has its own instance queue of at most queue_size json lines, and only the queue of the worker whose turn it is is read.
+    Thus, a worker ahead of its turn blocks when its queue is full, and the memory is bounded by num_workers * queue_size lines.
+    The stats of the workers are merged and written to stats_path every stats_interval seconds.
+    """
+    sizes = _split_size(size, num_workers)
+
+    instance_queues = [multiprocessing.Queue(maxsize=queue_size) for _ in range(num_workers)]
+    control_queue = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_generate_instances_to_queue,
+                                args=(i_worker, range(i_worker, size, num_workers), seed, instance_queues[i_worker], control_queue,
+                                      args, setup_kwargs, stats_interval),
+                                daemon=True)
+        for i_worker in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    worker_stats: Dict[int, StatsAccumulator] = {}
+    done_workers: Set[int] = set()
+    last_written = time.time()
+    progress = tqdm(total=size)
+    try:
+        for i_worker in _round_robin_order(sizes):
+            while True:
+                try:
+                    line = instance_queues[i_worker].get(timeout=10)
+                    break
+                except queue_lib.Empty:
+                    _check_workers_alive(workers, control_queue, worker_stats, done_workers)
+            f_out.write(line + '\n')
+            progress.update(1)
+
+            _drain_control_queue(control_queue, worker_stats, done_workers)
+            if stats_path is not None and time.time() - last_written >= stats_interval:
+                _write_stats(stats_path, _merge_stats(worker_stats.values()))
+                last_written = time.time()
+
+        while len(done_workers) < num_workers:
+            try:
+                kind, i_worker, payload = control_queue.get(timeout=10)
+            except queue_lib.Empty:
+                _check_workers_alive(workers, control_queue, worker_stats, done_workers)
+                continue
+            _handle_control_message(kind, i_worker, payload, worker_stats, done_workers)
+    finally:
+        progress.close()
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+    return _merge_stats(worker_stats[i_worker] for i_worker in range(num_workers))
 
 
 @click.command()
@@ -201,6 +703,10 @@ def generate_instances(size: int, *args):
 @click.option('--translation-volume-to-weight', type=str, default='log10')
 @click.option('--translation-default-weight-factor-type', type=str, default='W_VOL__1.0')
 @click.option('--translation-adj-verb-noun-ratio', type=str, default='1-1-1')
+@click.option('--translation-artifact', type=str, default=None,
+              help='the translator artifact built by build_translator_artifact.py, which is loaded instead of building the translator')
+@click.option('--word-bank-lexicon', type=str, default=None,
+              help='the lexicon built by build_lexicon.py, which is used instead of wordnet')
 #
 @click.option('--distractor', default='mixture.negative_tree.negative_tree')
 @click.option('--distractors-range', type=str, default=json.dumps([5, 5]))
@@ -223,7 +729,32 @@ def generate_instances(size: int, *args):
               # multithread  : data load = 4min, generation = 140 instances / 14min = 10 instances / min
               )
 @click.option('--batch-size-per-worker', type=int, default=10000)
+@click.option('--streaming', is_flag=True, default=False,
+              help='generate instances by long-lived workers and write them as soon as they are ready')
+@click.option('--cache-max-sizes', type=str, default=None,
+              help='the maximum numbers of entries of the caches in json, e.g., {"check_sat": 1000000}')
+@click.option('--sat-cache-path', type=str, default=None,
+              help='SQLite file of the satisfiability cache shared across runs and workers')
+@click.option('--sat-cache-max-size', type=int, default=10000000,
+              help='the maximum number of entries of the satisfiability cache file')
+@click.option('--shard-size', type=int, default=None,
+              help='write the corpus as the shards of this number of instances with an index, which can be resumed')
+@click.option('--compression', type=click.Choice(COMPRESSIONS), default='gzip',
+              help='the compression of the shards')
+@click.option('--resume', is_flag=True, default=False,
+              help='generate only the shards not in the index of the previous run')
+@click.option('--stats-interval', type=float, default=60.0,
+              help='the interval in seconds at which the running stats are written to OUTPUT_PATH.stats.json')
+@click.option('--adaptive-budgets', is_flag=True, default=False,
+              help='learn the timeouts and the max retries of the trials from the latencies observed during the run, '
+              'which are reported as budget.* in OUTPUT_PATH.stats.json')
+@click.option('--budgets-warm-start', type=str, default=None,
+              help='OUTPUT_PATH.stats.json of a previous run, whose budget.* are the initial budgets. Implies --adaptive-budgets')
 @click.option('--seed', type=int, default=0)
+@click.option('--reproducible', is_flag=True, default=False,
+              help='generate each instance from its own random generator made from --seed and the instance index, '
+              'so that the corpus does not depend on --num-workers and any instance can be replayed by replay_instance.py. '
+              'This disables the reuse of the proof trees generated for the other instances, which reduced the throughput by about 25% in our measurement')
 def main(output_path,
          argument_config,
          translation_config,
@@ -233,6 +764,8 @@ def main(output_path,
          translation_volume_to_weight,
          translation_default_weight_factor_type,
          translation_adj_verb_noun_ratio,
+         translation_artifact,
+         word_bank_lexicon,
          size,
          depth_range,
          depth_distrib,
@@ -261,21 +794,27 @@ def main(output_path,
          num_workers,
          min_size_per_worker,
          batch_size_per_worker,
-         seed):
+         streaming,
+         cache_max_sizes,
+         sat_cache_path,
+         sat_cache_max_size,
+         shard_size,
+         compression,
+         resume,
+         stats_interval,
+         adaptive_budgets,
+         budgets_warm_start,
+         seed,
+         reproducible):
     setup_logger(do_stderr=True, level=logging.INFO)
     random.seed(seed)
-    depth_range = tuple(json.loads(depth_range))
-    branch_extensions_range = json.loads(branch_extensions_range)
-    distractors_range = json.loads(distractors_range)
-    translation_distractors_range = json.loads(translation_distractors_range)
-    proof_stances = json.loads(proof_stances)
-    swap_ng_words = json.load(open(swap_ng_words_config)) if swap_ng_words_config is not None else None
-
-    if len(argument_config) == 0:
-        raise ValueError()
+    params = click.get_current_context().params
+    dataset_args, setup_kwargs = build_dataset_args(params)
 
     output_path = Path(output_path)
     output_path.parent.mkdir(exist_ok=True, parents=True)
+    # the config with which an instance can be replayed by replay_instance.py
+    _write_config(Path(str(output_path) + '.config.json'), params)
 
     size_per_worker = math.ceil(size / num_workers)
     if size_per_worker < min_size_per_worker:
@@ -290,83 +829,69 @@ def main(output_path,
     logger.info('batch_size_per_worker: %d', _batch_size_per_worker)
     logger.info('num_batches: %d', num_batches)
 
-    gathered_stats = defaultdict(int)
-    with open(output_path, 'w') as f_out:
-
-        for i_batch in range(num_batches):
-            jobs = []
-            for _ in range(num_workers):
-                jobs.append(
-                    delayed(generate_instances)(
-                        _batch_size_per_worker,
-                        argument_config,
-                        translation_config,
-                        use_fixed_translation,
-                        reused_object_nouns_max_factor,
-                        limit_vocab_size_per_type,
-                        translation_volume_to_weight,
-                        translation_default_weight_factor_type,
-                        translation_adj_verb_noun_ratio,
-                        complex_formula_arguments_weight,
-                        quantifier_axiom_arguments_weight,
-                        quantifier_axiom,
-                        quantification_degree,
-                        keep_dneg,
-                        distractor,
-                        distractors_range,
-                        sample_distractor_prototype_formulas_from_all_possible_formulas,
-                        disallow_simplified_tree_formulas_as_distractor_prototype,
-                        disallow_hard_negative_distractors,
-                        # negative_tree_negated_hypothesis_ratio,
-                        disallow_subj_obj_swapped_distractor,
-                        translation_distractor,
-                        fallback_from_formula_to_translation_distractor,
-                        translation_distractors_range,
-                        proof_stances,
-                        world_assump,
-                        unknown_ratio,
-                        use_collapsed_translation_nodes_for_unknown_tree,
-                        swap_ng_words,
-                        depth_range,
-                        depth_distrib,
-                        force_fix_illegal_intermediate_constants,
-                        branch_extensions_range,
-                    )
-                )
 
-            logger.info('creating corpus with %d jobs', num_workers)
-            instances_list = Parallel(n_jobs=num_workers, backend='multiprocessing')(jobs)
+    stats_path = Path(str(output_path) + '.stats.json')
+    if shard_size is not None:
+        if streaming:
+            raise ValueError('--streaming can not be used with --shard-size')
+        if resume and get_index_path(output_path).exists():
+            shard_index = ShardIndex.load(output_path)
+            shard_index.check_consistency(size, shard_size, seed, compression, params=_get_generation_params(params))
+        else:
+            shard_index = ShardIndex(output_path, size, shard_size, seed, compression, params=_get_generation_params(params))
+        stats_accumulator = generate_shards(shard_index, num_workers, dataset_args, setup_kwargs, stats_path=stats_path)
+
+    elif resume:
+        raise ValueError('--resume requires --shard-size')
+
+    elif streaming:
+        logger.info('creating corpus with %d streaming workers', num_workers)
+        with open(output_path, 'w') as f_out:
+            stats_accumulator = generate_instances_streaming(f_out, size, num_workers, seed, dataset_args, setup_kwargs,
+                                                             stats_path=stats_path, stats_interval=stats_interval)
+        logger.info('=========================== gathered stats ============================')
+        logger.info('\n' + pformat(stats_accumulator.to_dict()))
 
-            cnt = 0
-            is_done = False
-            num_jobs: Dict[str, int] = defaultdict(int)
-            for instances, stats in instances_list:
-                if is_done:
-                    break
-
-                for nlproof_json, proof_tree, _, _ in instances:
-                    if cnt >= size:
-                        is_done = True
-                        break
-                    f_out.write(json.dumps(nlproof_json) + '\n')
-                    cnt += 1
+    else:
+        stats_accumulator = StatsAccumulator()
+        cnt = 0
+        with open(output_path, 'w') as f_out:
+
+            for i_batch in range(num_batches):
+                # the last batch generates only the rest of the instances so that the stats are of the written instances.
+                batch_sizes = [worker_size
+                               for worker_size in _split_size(min(size - cnt, _batch_size_per_worker * num_workers), num_workers)
+                               if worker_size > 0]
+                jobs = []
+                first_instance = cnt
+                for worker_size in batch_sizes:
+                    jobs.append(
+                        delayed(generate_instances)(
+                            worker_size,
+                            *dataset_args,
+                            instance_indices=range(first_instance, first_instance + worker_size),
+                            **setup_kwargs,
+                        )
+                    )
+                    first_instance += worker_size
 
-                for name, count in stats.items():
-                    if count is not None:
-                        gathered_stats[name] += count
-                        num_jobs[name] += 1
+                logger.info('creating corpus with %d jobs', len(jobs))
+                instances_list = Parallel(n_jobs=num_workers, backend='multiprocessing')(jobs)
 
-            for name, count in gathered_stats.items():
-                if not name.startswith('cum.'):
-                    gathered_stats[name] = gathered_stats[name] / num_jobs[name]
+                for instances, job_stats_accumulator in instances_list:
+                    for nlproof_json, proof_tree, _, _ in instances:
+                        f_out.write(json.dumps(nlproof_json) + '\n')
+                        cnt += 1
+                    stats_accumulator.merge(job_stats_accumulator)
+                f_out.flush()
 
-            logger.info('=========================== gathered stats (batch=%d) ============================',
-                        i_batch)
-            logger.info('\n' + pformat(gathered_stats))
+                logger.info('=========================== gathered stats (batch=%d) ============================',
+                            i_batch)
+                logger.info('\n' + pformat(stats_accumulator.to_dict()))
+                _write_stats(stats_path, stats_accumulator)
+                setup_kwargs = _warm_start_budgets(setup_kwargs, stats_accumulator)
 
-    with open(str(output_path) + '.stats.json', 'w') as f_out:
-        json.dump(dict(gathered_stats), f_out,
-                  ensure_ascii=False, indent=4, sort_keys=True, separators=(',', ': '))
+    _write_stats(stats_path, stats_accumulator)
 
     logger.info('!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! create_FLD_corpus.py DONE !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!')
 
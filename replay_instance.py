@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+""" Replay a single instance of a corpus created by create_corpus.py and show the time spent in each generation stage.
+
+The corpus must have been created with --reproducible.
+Then, since each instance is generated from its own random generator made from the seed and the instance index,
+an instance which is slow or raises an exception can be investigated without generating the others.
+
+    $ PYTHONHASHSEED=0 python ./replay_instance.py ./outputs/train.jsonl.config.json 12345 --log-level INFO
+
+The config is written by create_corpus.py as OUTPUT_PATH.config.json.
+Run with the same PYTHONHASHSEED as the corpus, since the generation also depends on the hash seed.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import traceback
+
+import click
+
+from create_corpus import build_dataset_args, load_dataset, _setup_worker
+from FLD_generator.timings import enable_timings, reset_timings, get_timings
+from logger_setup import setup as setup_logger
+
+logger = logging.getLogger(__name__)
+
+# (stage, label). The indented stages are parts of the stage above them.
+_STAGES = [
+    ('proof_tree', 'proof tree'),
+    ('stem', '    stem'),
+    ('branch_extension', '    branch extension'),
+    ('formula_distractors', 'formula distractors'),
+    ('translation', 'translation'),
+    ('translation_distractors', 'translation distractors'),
+]
+_TOP_LEVEL_STAGES = ['proof_tree', 'formula_distractors', 'translation', 'translation_distractors']
+
+
+def _format_timings(timings, total_sec: float) -> str:
+    lines = [f'{"stage":<30}{"sec":>10}{"count":>8}']
+    for stage, label in _STAGES + [('z3_check', 'z3 checks (in the above)')]:
+        timing = timings.get(stage, {'sec': 0.0, 'count': 0})
+        lines.append(f'{label:<30}{timing["sec"]:>10.3f}{timing["count"]:>8d}')
+    other_sec = total_sec - sum(timings[stage]['sec'] for stage in _TOP_LEVEL_STAGES if stage in timings)
+    lines.append(f'{"other":<30}{other_sec:>10.3f}')
+    lines.append(f'{"total":<30}{total_sec:>10.3f}')
+    return '\n'.join(lines)
+
+
+@click.command()
+@click.argument('config_path')
+@click.argument('instance_index', type=int)
+@click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']), default='WARNING',
+              help='INFO shows the whole generation logs of the instance')
+@click.option('--no-persistent-sat-cache', is_flag=True, default=False,
+              help='do not use the satisfiability cache file of the config so that all the z3 checks are run')
+@click.option('--output-path', default=None,
+              help='write the replayed instance to this file as a json line')
+def main(config_path, instance_index, log_level, no_persistent_sat_cache, output_path):
+    setup_logger(do_stderr=True, level=log_level)
+
+    with open(config_path) as f_in:
+        config = json.load(f_in)
+    params = config['params']
+    if not params.get('reproducible', False):
+        raise ValueError('The corpus was created without --reproducible, thus, its instances can not be replayed one by one.')
+    if not 0 <= instance_index < params['size']:
+        raise ValueError(f'instance_index {instance_index} is out of the corpus of size {params["size"]}')
+
+    hash_seed = os.environ.get('PYTHONHASHSEED', None)
+    if config['python_hash_seed'] is None:
+        logger.warning('The corpus was created without PYTHONHASHSEED, thus, the replayed instance may differ from that in the corpus.')
+    elif config['python_hash_seed'] != hash_seed:
+        logger.warning('Set PYTHONHASHSEED=%s as the corpus, otherwise, the replayed instance may differ from that in the corpus.',
+                       config['python_hash_seed'])
+
+    dataset_args, setup_kwargs = build_dataset_args(params)
+    if no_persistent_sat_cache:
+        setup_kwargs['sat_cache_path'] = None
+    if setup_kwargs['adaptive_budgets']:
+        logger.warning('The corpus was created with the adaptive budgets, which changed during the run, thus, the replayed instance may differ from that in the corpus.')
+    _setup_worker(**setup_kwargs)
+
+    start = time.time()
+    dataset = load_dataset(*dataset_args)
+    click.echo(f'loaded the dataset in {time.time() - start:.3f} [sec]', err=True)
+
+    reset_timings()
+    enable_timings()
+    nlproof_json = None
+    start = time.perf_counter()
+    try:
+        nlproof_json, *_ = next(iter(dataset.generate(1, instance_indices=[instance_index])))
+    except Exception:
+        click.echo(f'the instance {instance_index} failed:\n{traceback.format_exc()}', err=True)
+    finally:
+        total_sec = time.perf_counter() - start
+        enable_timings(False)
+
+    if nlproof_json is not None:
+        click.echo(json.dumps(nlproof_json, ensure_ascii=False, indent=4))
+        if output_path is not None:
+            with open(output_path, 'w') as f_out:
+                f_out.write(json.dumps(nlproof_json) + '\n')
+
+    click.echo(f'\n========== timings of the instance {instance_index} ==========')
+    click.echo(_format_timings(get_timings(), total_sec))
+
+    if nlproof_json is None:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,24 @@
 from typing import List
 from pprint import pprint
+import tempfile
+from pathlib import Path
 
 from FLD_generator.formula import Formula
+from FLD_generator.caches import get_cache
 from FLD_generator.formula_checkers.z3_logic_checkers.checkers import (
     parse,
     check_sat,
     is_stronger,
     is_equiv,
     is_weaker,
+    is_provable,
+    is_disprovable,
+    is_unknown,
+    CheckerSession,
+    get_check_sat_cache_stats,
+    configure_persistent_check_sat_cache,
+    flush_persistent_check_sat_cache,
+    get_persistent_check_sat_cache_stats,
 )
 
 
@@ -479,8 +490,138 @@ def test_equiv():
     )
 
 
+def test_check_sat_cache():
+    assert check_sat([Formula('{EA}{ea}'), Formula('{EA}{ea} -> ¬{EB}{eb}'), Formula('{EB}{eb}')]) is False
+    stats = get_check_sat_cache_stats()
+
+    # the renamed and shuffled set hits the cache
+    assert check_sat([Formula('{EC}{ec}'), Formula('{ED}{ed}'), Formula('{ED}{ed} -> ¬{EC}{ec}')]) is False
+    assert get_check_sat_cache_stats()['hit'] == stats['hit'] + 1
+    assert get_check_sat_cache_stats()['miss'] == stats['miss']
+
+    assert check_sat([Formula('{EC}{ec}'), Formula('{ED}{ed}'), Formula('{EC}{ec} -> ¬{EC}{ed}')]) is True
+    assert get_check_sat_cache_stats()['miss'] == stats['miss'] + 1
+
+
+def test_persistent_check_sat_cache():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        configure_persistent_check_sat_cache(str(Path(tmp_dir) / 'sat_cache.sqlite'))
+        get_cache('check_sat').clear()
+        try:
+            assert check_sat([Formula('{FA}{fa}'), Formula('{FA}{fa} -> ¬{FB}{fb}'), Formula('{FB}{fb}')]) is False
+            flush_persistent_check_sat_cache()
+            assert get_persistent_check_sat_cache_stats() == {'hit': 0, 'miss': 1, 'write': 1}
+
+            # simulate another run, which starts with the empty in-memory cache.
+            get_cache('check_sat').clear()
+            configure_persistent_check_sat_cache(str(Path(tmp_dir) / 'sat_cache.sqlite'))
+            assert check_sat([Formula('{FC}{fc}'), Formula('{FD}{fd}'), Formula('{FD}{fd} -> ¬{FC}{fc}')]) is False
+            assert get_persistent_check_sat_cache_stats() == {'hit': 1, 'miss': 0, 'write': 0}
+        finally:
+            configure_persistent_check_sat_cache(None)
+
+
+def test_checker_session():
+    facts = [
+        Formula('{A}{a}'),
+        Formula('{A}{a} -> {B}{a}'),
+        Formula('(x): {B}x -> ¬{C}x'),
+        Formula('{D}{b}'),
+    ]
+    session = CheckerSession(facts)
+
+    def _test_session(hypothesis: Formula,
+                      dropped_fact_indexes: List[int],
+                      is_provable_gold: bool,
+                      is_disprovable_gold: bool):
+        remaining_facts = [fact for i_fact, fact in enumerate(facts) if i_fact not in dropped_fact_indexes]
+        assert session.is_provable(hypothesis, dropped_fact_indexes=dropped_fact_indexes) is is_provable_gold
+        assert session.is_disprovable(hypothesis, dropped_fact_indexes=dropped_fact_indexes) is is_disprovable_gold
+        assert session.is_unknown(hypothesis, dropped_fact_indexes=dropped_fact_indexes) is (not is_provable_gold and not is_disprovable_gold)
+
+        # must agree with the non-incremental checkers
+        assert is_provable(remaining_facts, hypothesis) is is_provable_gold
+        assert is_disprovable(remaining_facts, hypothesis) is is_disprovable_gold
+        assert is_unknown(remaining_facts, hypothesis) is (not is_provable_gold and not is_disprovable_gold)
+
+    _test_session(Formula('{B}{a}'), [], True, False)
+    _test_session(Formula('¬{C}{a}'), [], True, False)
+    _test_session(Formula('{C}{a}'), [], False, True)
+    _test_session(Formula('{C}{a}'), [0], False, False)
+    _test_session(Formula('{C}{a}'), [2], False, False)
+    _test_session(Formula('{C}{a}'), [3], False, True)
+    _test_session(Formula('{D}{b}'), [1, 2], True, False)
+    _test_session(Formula('{D}{b}'), [3], False, False)
+
+    # the solver state must not be polluted by the previous queries.
+    _test_session(Formula('{B}{a}'), [], True, False)
+
+    assert session.find_droppable_fact(Formula('¬{C}{a}')) == 3
+    assert session.find_droppable_fact(Formula('¬{C}{a}'), droppable_fact_indexes=[0, 1, 2]) is None
+    assert session.find_droppable_fact(Formula('{C}{a}'), disprove=True) == 3
+
+
+def test_find_droppable_fact_by_unsat_core():
+
+    def _test_find_droppable_fact(fact_reps: List[str],
+                                  hypothesis_rep: str,
+                                  num_droppables: int,
+                                  gold: bool,
+                                  disprove=False):
+        session = CheckerSession([Formula(rep) for rep in fact_reps])
+        hypothesis = Formula(hypothesis_rep)
+        droppable_fact_indexes = range(num_droppables)
+        i_dropped = session.find_droppable_fact_by_unsat_core(hypothesis,
+                                                              droppable_fact_indexes=droppable_fact_indexes,
+                                                              disprove=disprove)
+        assert (i_dropped is not None) is gold
+        assert (session.find_droppable_fact(hypothesis,
+                                            droppable_fact_indexes=droppable_fact_indexes,
+                                            disprove=disprove) is not None) is gold
+        if i_dropped is not None:
+            if disprove:
+                assert session.is_disprovable(hypothesis, dropped_fact_indexes=[i_dropped])
+            else:
+                assert session.is_provable(hypothesis, dropped_fact_indexes=[i_dropped])
+
+    # all the facts are needed
+    _test_find_droppable_fact(['{A}{a}', '{A}{a} -> {B}{a}', '(x): {B}x -> {C}x'], '{C}{a}', 3, False)
+    _test_find_droppable_fact(['{A}{a}', '{A}{a} -> {B}{a}', '(x): {B}x -> {C}x'], '¬{C}{a}', 3, False, disprove=True)
+
+    # "{D}{b}" is not needed
+    _test_find_droppable_fact(['{A}{a}', '{A}{a} -> {B}{a}', '{D}{b}'], '{B}{a}', 3, True)
+
+    # can not be proved at all
+    _test_find_droppable_fact(['{A}{a}', '{A}{a} -> {B}{a}'], '{C}{a}', 2, False)
+
+    # the distractor, which is not droppable, can substitute for "{A}{a} -> {B}{a}"
+    _test_find_droppable_fact(['{A}{a}', '{A}{a} -> {B}{a}', '(x): {A}x -> {B}x'], '{B}{a}', 2, True)
+
+    # the distractor is irrelevant to the hypothesis
+    _test_find_droppable_fact(['{A}{a}', '{A}{a} -> {B}{a}', '{C}{a} -> {D}{a}'], '{B}{a}', 2, False)
+
+    # the distractors are inconsistent by themselves, thus, prove anything.
+    _test_find_droppable_fact(['{A}{a}', '{A}{a} -> {B}{a}', '{C}{c}', '¬{C}{c}'], '{B}{a}', 2, True)
+
+    # the facts are inconsistent, thus, the minimized core can consist only of the facts.
+    _test_find_droppable_fact(['{A}', '¬{A}'], '{A}', 2, True)
+    _test_find_droppable_fact(['{B}', '{A}', '(¬{A} v ¬{B})'], '{A}', 3, True)
+
+    # the session is reused, thus, z3 may return another core.
+    session = CheckerSession([Formula(rep) for rep in ['{B}', '{A}', '(¬{A} v ¬{B})']])
+    for hypothesis_rep in ['{B}', '{A}', '{A}', '{B}']:
+        hypothesis = Formula(hypothesis_rep)
+        i_dropped = session.find_droppable_fact_by_unsat_core(hypothesis)
+        assert i_dropped is not None
+        assert session.is_provable(hypothesis, dropped_fact_indexes=[i_dropped])
+
+
 if __name__ == '__main__':
     test_parse()
     test_check_sat()
     test_strength()
     test_equiv()
+    test_check_sat_cache()
+    test_persistent_check_sat_cache()
+    test_checker_session()
+    test_find_droppable_fact_by_unsat_core()
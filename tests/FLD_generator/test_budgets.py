@@ -0,0 +1,117 @@
+import time
+
+from FLD_generator.budgets import (
+    AdaptiveBudgets,
+    enable_adaptive_budgets,
+    get_adaptive_budgets,
+    load_budgets,
+)
+from FLD_generator.deadlines import check_deadline
+from FLD_generator.stats import StatsAccumulator
+from FLD_generator.utils import run_with_timeout_retry
+
+
+def test_adaptive_budgets():
+    budgets = AdaptiveBudgets(quantile=0.9, margin=1.5, min_yield=0.01, min_samples=10, min_timeout=0.1, max_timeout_factor=4.0)
+
+    # the defaults are used until min_samples trials are observed.
+    for _ in range(9):
+        budgets.observe('stem.depth=3', 0.1, True)
+    assert budgets.get_timeout('stem.depth=3', default=5.0) == 5.0
+    assert budgets.get_max_retry('stem.depth=3', default=50) == 50
+
+    for _ in range(11):
+        budgets.observe('stem.depth=3', 0.1, True)
+    assert abs(budgets.get_timeout('stem.depth=3', default=5.0) - 0.15) < 1e-9
+    # the trials without a timeout are left unlimited
+    assert budgets.get_timeout('stem.depth=3', default=None) is None
+    # almost always succeeds, thus, the second trial yields little.
+    assert budgets.get_max_retry('stem.depth=3', default=50) <= 2
+
+    # the timeout is not shorter than min_timeout
+    for _ in range(200):
+        budgets.observe('stem.depth=1', 0.001, True)
+    assert budgets.get_timeout('stem.depth=1', default=5.0) == 0.1
+
+    # the timeout grows when the successful trials are close to it, up to max_timeout_factor times the default.
+    for _ in range(200):
+        budgets.observe('stem.depth=5', 10.0, True)
+    assert budgets.get_timeout('stem.depth=5', default=2.0) == 8.0
+
+    # the rarely successful trials are retried more, but not more than the default.
+    for i_trial in range(100):
+        budgets.observe('branch_extension.steps=5', 1.0, i_trial % 10 == 0)
+    assert 10 < budgets.get_max_retry('branch_extension.steps=5', default=50) < 50
+    assert budgets.get_max_retry('branch_extension.steps=5', default=5) == 5
+
+    # the hopeless trials are not retried.
+    for _ in range(200):
+        budgets.observe('proof_tree.depth=8', 1.0, False)
+    assert budgets.get_max_retry('proof_tree.depth=8', default=50) == 1
+
+    # warm start
+    warm_budgets = AdaptiveBudgets(warm_start={'stem.depth=3': {'timeout': 0.3, 'max_retry': 3}})
+    assert warm_budgets.get_timeout('stem.depth=3', default=5.0) == 0.3
+    assert warm_budgets.get_max_retry('stem.depth=3', default=50) == 3
+    assert warm_budgets.get_max_retry('stem.depth=3', default=2) == 2
+    assert warm_budgets.get_timeout('stem.depth=4', default=5.0) == 5.0
+
+
+def test_budgets_stats():
+    worker_budgets = []
+    for i_worker in range(2):
+        budgets = AdaptiveBudgets(min_samples=10, min_timeout=0.0)
+        for _ in range(10):
+            budgets.observe('stem.depth=3', 0.1 * (i_worker + 1), True)
+        worker_budgets.append(budgets)
+
+    accumulators = []
+    for budgets in worker_budgets:
+        accumulator = StatsAccumulator()
+        accumulator.add_budgets(budgets)
+        accumulators.append(accumulator)
+    merged = StatsAccumulator()
+    for accumulator in accumulators:
+        merged.merge(StatsAccumulator.from_state_dict(accumulator.state_dict()))
+
+    stats = merged.to_dict()
+    assert abs(stats['budget.stem.depth=3.timeout'] - 0.2 * 1.5) < 1e-9
+    assert stats['budget.stem.depth=3.max_retry'] >= 1
+
+    # the exported budgets warm-start the next run
+    warm_start = load_budgets(stats)
+    assert warm_start == {'stem.depth=3': {'timeout': stats['budget.stem.depth=3.timeout'],
+                                           'max_retry': stats['budget.stem.depth=3.max_retry']}}
+
+    # no budgets are reported unless enabled
+    assert all(not name.startswith('budget.') for name in StatsAccumulator().to_dict())
+
+
+def test_run_with_adaptive_budgets():
+
+    def sleep(sec: float) -> None:
+        start = time.monotonic()
+        while time.monotonic() - start < sec:
+            check_deadline()
+
+    assert get_adaptive_budgets() is None
+    budgets = AdaptiveBudgets(min_samples=5, min_timeout=0.0)
+    enable_adaptive_budgets(budgets)
+    try:
+        for _ in range(5):
+            run_with_timeout_retry(sleep, func_args=[0.01], max_retry=3, timeout_per_trial=10, budget_key='sleep')
+        assert budgets.get_timeout('sleep', default=10) < 1.0
+
+        # the learned timeout cuts the slow trials
+        start = time.monotonic()
+        assert run_with_timeout_retry(sleep, func_args=[2.0], max_retry=3, timeout_per_trial=10,
+                                      best_effort=True, budget_key='sleep') == []
+        assert time.monotonic() - start < 2.0
+    finally:
+        enable_adaptive_budgets(None)
+
+
+if __name__ == '__main__':
+    test_adaptive_budgets()
+    test_budgets_stats()
+    test_run_with_adaptive_budgets()
@@ -0,0 +1,132 @@
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+from FLD_generator.caches import (
+    LRUCache,
+    SQLiteCache,
+    get_cache,
+    configure_caches,
+    get_cache_stats,
+)
+
+
+def test_lru_cache():
+    cache = LRUCache('test_lru_cache', max_size=2)
+
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1   # "a" is now more recent than "b"
+
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+
+    # updating the existing key does not evict
+    cache.set('a', 10)
+    assert cache.get('a') == 10
+    assert len(cache) == 2
+
+    assert cache.stats() == {'size': 2, 'max_size': 2, 'hit': 4, 'miss': 1, 'eviction': 1}
+
+    cache.resize(1)
+    assert len(cache) == 1
+    assert cache.get('a') == 10
+    assert cache.stats()['eviction'] == 2
+
+    assert cache.get('z', default='default') == 'default'
+
+    cache.resize(0)
+    assert not cache.enabled
+    cache.set('a', 1)
+    assert len(cache) == 0
+
+
+def test_cache_registry():
+    cache = get_cache('test_cache_registry', max_size=10)
+    assert get_cache('test_cache_registry') is cache
+    assert cache.max_size == 10
+
+    for i in range(5):
+        cache.set(i, i)
+    configure_caches({'test_cache_registry': 3})
+    assert cache.max_size == 3
+    assert len(cache) == 3
+    assert get_cache_stats()['test_cache_registry']['eviction'] == 2
+
+    # the configured budget applies to the caches created later
+    configure_caches({'test_cache_registry.later': 7})
+    assert get_cache('test_cache_registry.later', max_size=100).max_size == 7
+
+    # the module caches are registered
+    import FLD_generator.proof_tree_generators
+    for name in ['check_sat', 'formula_is_identical_to', 'interpret_formula_postprocess',
+                 'is_inconsistent_set', 'is_nonsense', 'extend_branches_find_linkable_arguments', 'formula_cores']:
+        assert name in get_cache_stats()
+
+
+def _fill_sqlite_cache(path: str, start: int) -> None:
+    cache = SQLiteCache(path, flush_interval=7)
+    for i in range(start, start + 50):
+        cache.set(f'key-{i}', i)
+    cache.close()
+
+
+def test_sqlite_cache():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = str(Path(tmp_dir) / 'cache.sqlite')
+
+        cache = SQLiteCache(path, max_size=3, flush_interval=2)
+        cache.set('a', True)
+        cache.set('b', [1, 2])
+        assert cache.get('a') is True   # flushed by flush_interval
+        assert cache.get('b') == [1, 2]
+        cache.set('c', 3)
+        assert cache.get('c') is None   # not flushed yet
+
+        # the oldest entries are deleted to keep max_size
+        cache.set('d', 4)
+        assert len(cache) == 3
+        assert cache.get('a') is None
+        assert cache.get('d') == 4
+        cache.close()
+
+        # persistent across the instances
+        assert SQLiteCache(path).get('d') == 4
+
+        # the oldest entries are deleted down to (1 - eviction_ratio) * max_size at once
+        eviction_path = str(Path(tmp_dir) / 'eviction.sqlite')
+        cache = SQLiteCache(eviction_path, max_size=10, flush_interval=1, eviction_ratio=0.5)
+        for i in range(11):
+            cache.set(f'key-{i}', i)
+        assert len(cache) == 5
+        assert cache.get('key-5') is None
+        assert cache.get('key-6') == 6
+        for i in range(11, 16):
+            cache.set(f'key-{i}', i)
+        assert len(cache) == 10
+        cache.set('key-16', 16)
+        assert len(cache) == 5
+        assert cache.get('key-12') == 12
+        cache.close()
+
+        # concurrent writes from multiple processes
+        processes = [multiprocessing.Process(target=_fill_sqlite_cache, args=(path, start))
+                     for start in [100, 120, 140, 160]]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0
+        cache = SQLiteCache(path)
+        assert len(cache) == 3 + 110
+        assert cache.get('key-100') == 100
+        assert cache.get('key-209') == 209
+
+
+if __name__ == '__main__':
+    test_lru_cache()
+    test_cache_registry()
+    test_sqlite_cache()
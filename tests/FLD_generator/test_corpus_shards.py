@@ -0,0 +1,92 @@
+import tempfile
+from pathlib import Path
+
+from FLD_generator.corpus_shards import (
+    ShardIndex,
+    ShardWriter,
+    read_shard,
+    get_shard_path,
+    get_shard_seed,
+)
+
+
+def test_shard_writer():
+
+    def _test_shard_writer(compression: str):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = get_shard_path(Path(tmp_dir) / 'train.jsonl', 3, compression)
+            instances = [{'id': i, 'hypothesis': f'this is the hypothesis {i}'} for i in range(5)]
+
+            writer = ShardWriter(path, compression)
+            for instance in instances:
+                writer.write(instance)
+            assert not path.exists()   # not finalized yet
+            writer.finalize()
+
+            assert path.exists()
+            assert writer.count == 5
+            assert list(read_shard(path, compression)) == instances
+
+            # an aborted shard leaves nothing
+            aborted_path = get_shard_path(Path(tmp_dir) / 'train.jsonl', 4, compression)
+            writer = ShardWriter(aborted_path, compression)
+            writer.write(instances[0])
+            writer.abort()
+            assert list(Path(tmp_dir).glob('train.00004*')) == []
+
+    _test_shard_writer('none')
+    _test_shard_writer('gzip')
+
+    assert get_shard_path('./outputs/train.jsonl', 3, 'gzip') == Path('./outputs/train.00003.jsonl.gz')
+
+
+def test_shard_index():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = Path(tmp_dir) / 'train.jsonl'
+
+        params = {'argument_config': ('./configs/arguments/axioms',), 'depth_range': '[1, 3]'}
+        index = ShardIndex(output_path, 10, 4, 0, 'gzip', params=params)
+        assert index.num_shards == 3
+        assert [index.get_shard_size(i_shard) for i_shard in range(3)] == [4, 4, 2]
+        assert [list(index.get_shard_instance_indices(i_shard)) for i_shard in range(3)] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+        assert index.get_shard_seed(1) == get_shard_seed(0, 1)
+        assert index.get_shard_seed(1) != index.get_shard_seed(2)
+        assert index.get_shard_seed(1) != ShardIndex(output_path, 10, 4, 1, 'gzip').get_shard_seed(1)
+
+        for i_shard in [0, 1]:
+            writer = ShardWriter(index.get_shard_path(i_shard), 'gzip')
+            writer.write({'id': i_shard})
+            writer.finalize()
+            index.add_shard(i_shard, 4, stats={'num_samples': 4})
+        index.save()
+        assert index.pending_shards == [2]
+
+        # the shards whose files are lost are to be generated again
+        index.get_shard_path(0).unlink()
+        loaded = ShardIndex.load(output_path)
+        assert loaded.pending_shards == [0, 2]
+        assert loaded.shards[1] == {'path': 'train.00001.jsonl.gz', 'count': 4, 'first_instance': 4, 'seed': index.get_shard_seed(1), 'stats': {'num_samples': 4}}
+
+        loaded.check_consistency(10, 4, 0, 'gzip', params=params)
+        for size, shard_size, seed, compression, _params in [
+            (11, 4, 0, 'gzip', params),
+            (10, 5, 0, 'gzip', params),
+            (10, 4, 1, 'gzip', params),
+            (10, 4, 0, 'none', params),
+            # the generation options also must be the same
+            (10, 4, 0, 'gzip', dict(params, depth_range='[1, 5]')),
+            (10, 4, 0, 'gzip', dict(params, argument_config=('./configs/arguments/axioms', './configs/arguments/others'))),
+            (10, 4, 0, 'gzip', dict(params, distractor='various_form')),
+            (10, 4, 0, 'gzip', {'depth_range': '[1, 3]'}),
+        ]:
+            try:
+                loaded.check_consistency(size, shard_size, seed, compression, params=_params)
+            except ValueError:
+                pass
+            else:
+                raise Exception('check_consistency() did not raise')
+
+
+if __name__ == '__main__':
+    test_shard_writer()
+    test_shard_index()
@@ -0,0 +1,146 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from z3 import Solver, Bool, Or, Not, And
+
+from FLD_generator.deadlines import (
+    DeadlineExceeded,
+    using_deadline,
+    get_deadline,
+    check_deadline,
+    get_remaining_msec,
+)
+from FLD_generator.formula_checkers.z3_logic_checkers.checkers import _check_within_deadline
+from FLD_generator.utils import run_with_timeout_retry, RetryAndTimeoutFailure
+
+
+def _busy_loop(sec: float) -> None:
+    start = time.monotonic()
+    while time.monotonic() - start < sec:
+        check_deadline()
+
+
+def test_deadline():
+    assert get_deadline() is None
+    assert get_remaining_msec() is None
+    check_deadline()
+
+    with using_deadline(0.05) as deadline:
+        assert get_deadline() is deadline
+        assert 0 < get_remaining_msec() <= 50
+        try:
+            _busy_loop(1.0)
+            assert False
+        except DeadlineExceeded as e:
+            assert e.deadline is deadline
+        assert deadline.is_expired()
+    assert get_deadline() is None
+
+    # no limit by itself
+    with using_deadline(None) as deadline:
+        assert deadline.remaining() is None
+        _busy_loop(0.01)
+
+
+def test_nested_deadlines():
+    # the inner deadline is bounded by the outer one
+    with using_deadline(0.05) as outer:
+        with using_deadline(10) as inner:
+            assert inner.remaining() <= 0.05
+            try:
+                _busy_loop(1.0)
+                assert False
+            except DeadlineExceeded as e:
+                assert e.deadline is outer
+
+    with using_deadline(10) as outer:
+        with using_deadline(0.05) as inner:
+            try:
+                _busy_loop(1.0)
+                assert False
+            except DeadlineExceeded as e:
+                assert e.deadline is inner
+        assert not outer.is_expired()
+
+
+def test_deadlines_in_threads():
+
+    def run(sec: float) -> bool:
+        with using_deadline(sec):
+            try:
+                _busy_loop(0.2)
+                return False
+            except DeadlineExceeded:
+                return True
+
+    # each thread has its own deadline
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert list(executor.map(run, [0.02, 10])) == [True, False]
+
+
+def test_z3_deadline():
+
+    def pigeonhole_solver(num_holes: int) -> Solver:
+        solver = Solver()
+        holes = [[Bool(f'p_{i}_{j}') for j in range(num_holes)] for i in range(num_holes + 1)]
+        for i in range(num_holes + 1):
+            solver.add(Or(holes[i]))
+        for j in range(num_holes):
+            for i in range(num_holes + 1):
+                for k in range(i + 1, num_holes + 1):
+                    solver.add(Not(And(holes[i][j], holes[k][j])))
+        return solver
+
+    assert not _check_within_deadline(pigeonhole_solver(3))
+
+    # z3 gives up at the deadline instead of being interrupted
+    solver = pigeonhole_solver(12)
+    with using_deadline(0.1) as deadline:
+        start = time.monotonic()
+        try:
+            _check_within_deadline(solver)
+            assert False
+        except DeadlineExceeded as e:
+            assert e.deadline is deadline
+        assert time.monotonic() - start < 1.0
+
+    # the solver is usable after the timeout
+    assert not _check_within_deadline(pigeonhole_solver(3))
+
+
+def test_run_with_timeout_retry():
+    num_calls = [0]
+
+    def succeed_at_third(sec: float) -> int:
+        num_calls[0] += 1
+        if num_calls[0] < 3:
+            _busy_loop(sec)
+        return num_calls[0]
+
+    assert run_with_timeout_retry(succeed_at_third, func_args=[1.0], max_retry=5, timeout_per_trial=0.02) == [3]
+
+    try:
+        run_with_timeout_retry(_busy_loop, func_args=[1.0], max_retry=2, timeout_per_trial=0.02)
+        assert False
+    except RetryAndTimeoutFailure:
+        pass
+
+    # the expiry of the outer deadline is passed up through the inner retry loop.
+    def inner() -> None:
+        run_with_timeout_retry(_busy_loop, func_args=[1.0], max_retry=100, timeout_per_trial=0.02)
+
+    start = time.monotonic()
+    try:
+        run_with_timeout_retry(inner, max_retry=1, timeout_per_trial=0.05)
+        assert False
+    except RetryAndTimeoutFailure:
+        pass
+    assert time.monotonic() - start < 0.5
+
+
+if __name__ == '__main__':
+    test_deadline()
+    test_nested_deadlines()
+    test_deadlines_in_threads()
+    test_z3_deadline()
+    test_run_with_timeout_retry()
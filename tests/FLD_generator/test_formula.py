@@ -1,5 +1,30 @@
-from typing import List, Set
-from FLD_generator.formula import Formula, negate, require_outer_brace
+from typing import List, Set, Dict
+import pickle
+
+from FLD_generator.formula import (
+    Formula,
+    negate,
+    canonicalize_reps,
+    canonicalize_rep_set,
+    require_outer_brace,
+    tokenize,
+    strip_quantifier,
+    fill_slot_template,
+    TOKEN_PREDICATE,
+    TOKEN_CONSTANT,
+    TOKEN_VARIABLE,
+    TOKEN_UNIVERSAL_QUANTIFIER,
+    TOKEN_EXISTENTIAL_QUANTIFIER,
+    TOKEN_NEGATION,
+    TOKEN_CONJUNCTION,
+    TOKEN_DISJUNCTION,
+    TOKEN_IMPLICATION,
+    TOKEN_CONTRADICTION,
+    TOKEN_LEFT_BRACE,
+    TOKEN_RIGHT_BRACE,
+    TOKEN_COLON,
+    TOKEN_OTHER,
+)
 
 
 def test_formula():
@@ -18,6 +43,139 @@ def test_formula():
     assert check_reps(Formula('(x): {A}x -> {B}x').universal_variables, {'x'})
     assert check_reps(Formula('(Ex): {A}x -> {B}x').existential_variables, {'x'})
 
+    assert check_reps(Formula('{A}{a} -> {B}').unary_PASs, {'{A}{a}'})
+    assert Formula('{A}{a} -> {B}').premise.rep == '{A}{a}'
+    assert Formula('{A}{a} -> {B}').conclusion.rep == '{B}'
+    assert Formula('{A}{a} & {B}').premise is None
+
+
+def test_tokenize():
+
+    def _test_tokenize(rep: str, gold):
+        assert [(type_, text) for type_, text, _ in tokenize(rep)] == gold
+
+    _test_tokenize(
+        '(x): ¬({AB}x v {C}{ab}) -> #F#',
+        [
+            (TOKEN_UNIVERSAL_QUANTIFIER, '(x)'),
+            (TOKEN_COLON, ':'),
+            (TOKEN_NEGATION, '¬'),
+            (TOKEN_LEFT_BRACE, '('),
+            (TOKEN_PREDICATE, '{AB}'),
+            (TOKEN_VARIABLE, 'x'),
+            (TOKEN_DISJUNCTION, 'v'),
+            (TOKEN_PREDICATE, '{C}'),
+            (TOKEN_CONSTANT, '{ab}'),
+            (TOKEN_RIGHT_BRACE, ')'),
+            (TOKEN_IMPLICATION, '->'),
+            (TOKEN_CONTRADICTION, '#F#'),
+        ]
+    )
+
+    _test_tokenize(
+        '(Ey): {A}y & {UU}',
+        [
+            (TOKEN_EXISTENTIAL_QUANTIFIER, '(Ey)'),
+            (TOKEN_COLON, ':'),
+            (TOKEN_PREDICATE, '{A}'),
+            (TOKEN_VARIABLE, 'y'),
+            (TOKEN_CONJUNCTION, '&'),
+            (TOKEN_OTHER, '{UU}'),  # not in PREDICATES
+        ]
+    )
+
+    assert [start for _, _, start in tokenize('{A}{a} v ¬{B}')] == [0, 3, 7, 9, 10]
+
+    assert strip_quantifier('(x): {A}x -> (Ey): {B}y') == '{A}x -> {B}y'
+    assert strip_quantifier('{A}{a}') == '{A}{a}'
+
+
+def test_formula_cache():
+    formula = Formula('({A}{a} & {B}{b}) -> {C}{a}', translation='foo')
+    same_rep_formula = Formula('({A}{a} & {B}{b}) -> {C}{a}', translation='bar')
+
+    # the structure is shared, while the translations are not.
+    assert formula._core is same_rep_formula._core
+    assert formula.translation == 'foo'
+    assert same_rep_formula.translation == 'bar'
+
+    # the derived views are memoized
+    assert formula.PASs[0] is same_rep_formula.PASs[0]
+    assert formula.predicates[0] is same_rep_formula.predicates[0]
+
+    # returned lists can be modified by the callers without breaking the cache.
+    predicates = formula.predicates
+    predicates.append(Formula('{D}'))
+    assert len(formula.predicates) == 3
+
+    loaded = pickle.loads(pickle.dumps(formula))
+    assert loaded.rep == formula.rep
+    assert loaded.translation == 'foo'
+    assert loaded._core is formula._core
+
+
+def test_canonical_rep():
+
+    def _test_canonical_rep(rep: str, gold_canonical_rep: str, gold_skeleton: str):
+        formula = Formula(rep)
+        assert formula.canonical_rep == gold_canonical_rep
+        assert formula.skeleton == gold_skeleton
+
+    _test_canonical_rep('{A}', '{A}', '[P]')
+    _test_canonical_rep('{C}{c} -> {B}{a}', '{A}{a} -> {B}{b}', '[P][c] -> [P][c]')
+    _test_canonical_rep('({Q}{b} & ¬{P}{b}) v {Q}x', '({A}{a} & ¬{B}{a}) v {A}x', '([P][c] & ¬[P][c]) v [P]x')
+    _test_canonical_rep('(x): {AB}x -> {AA}x', '(x): {A}x -> {B}x', '(x): [P]x -> [P]x')
+
+    assert Formula('{A}{a} -> {B}{b}').canonical_rep == Formula('{C}{c} -> {D}{a}').canonical_rep
+    assert Formula('{A}{a} -> {B}{b}').canonical_rep != Formula('{A}{a} -> {A}{b}').canonical_rep
+    assert Formula('{A}{a} -> {B}{b}').skeleton == Formula('{A}{a} -> {A}{b}').skeleton
+
+    # the renaming is shared among the formulas
+    canonical_reps, mapping = canonicalize_reps(['{C}{c} -> {B}{a}', '{B}{c}'])
+    assert canonical_reps == ['{A}{a} -> {B}{b}', '{B}{a}']
+    assert mapping == {'{C}': '{A}', '{B}': '{B}', '{c}': '{a}', '{a}': '{b}'}
+
+
+def test_canonicalize_rep_set():
+
+    def _test_canonicalize_rep_set(this_reps: List[str], that_reps: List[str], gold: bool):
+        assert (canonicalize_rep_set(this_reps) == canonicalize_rep_set(that_reps)) is gold
+
+    _test_canonicalize_rep_set(['{A}{a}', '{A}{a} -> {B}{b}'], ['{C}{c} -> {D}{d}', '{C}{c}'], True)
+    _test_canonicalize_rep_set(['{A}{a}', '{A}{a} -> {B}{b}'], ['{C}{c} -> {D}{d}', '{D}{d}'], False)
+
+    # the formulas with the same skeleton
+    _test_canonicalize_rep_set(['{A}{a}', '{B}{b}', '{A}{a} -> {C}{b}'], ['{D}{c} -> {B}{b}', '{E}{b}', '{D}{c}'], True)
+    _test_canonicalize_rep_set(['{A}{a}', '{B}{a}', '{A}{a} -> {B}{b}'], ['{A}{a}', '{B}{b}', '{A}{a} -> {B}{b}'], False)
+    _test_canonicalize_rep_set(['{A}{a} -> {B}{b}', '{B}{b} -> {C}{c}', '{C}{c} -> {A}{a}'],
+                               ['{C}{c} -> {B}{b}', '{A}{a} -> {C}{c}', '{B}{b} -> {A}{a}'], True)
+    _test_canonicalize_rep_set(['(x): {A}x -> {B}x', '(x): {B}x -> {C}x'], ['(x): {B}x -> {C}x', '(x): {A}x -> {B}x'], True)
+    _test_canonicalize_rep_set(['(x): {A}x -> {B}x', '(x): {B}x -> {C}x'], ['(x): {A}x -> {B}x', '(x): {C}x -> {B}x'], False)
+
+    # the result is a renaming of the set
+    assert canonicalize_rep_set(['{C}{c} -> {D}{d}', '{C}{c}']) == ('{A}{a}', '{A}{a} -> {B}{b}')
+
+
+def test_slot_template():
+
+    def _test_slot_template(rep: str, mapping: Dict[str, str], gold: str):
+        slot_template = Formula(rep).slot_template
+        assert ''.join(slot_template[0]) == rep
+        assert fill_slot_template(slot_template, mapping) == gold
+
+    _test_slot_template('{A}{a} -> ¬{B}{a}', {'{A}': '{C}', '{a}': '{b}'}, '{C}{b} -> ¬{B}{b}')
+    _test_slot_template('(x): ({A}x & {B}x)', {'{A}': '¬{B}', '{B}': '{A}'}, '(x): (¬{B}x & {A}x)')
+    _test_slot_template('{A}{a}', {'{a}': 'x'}, '{A}x')
+    _test_slot_template('#F#', {'{A}': '{B}'}, '#F#')
+    _test_slot_template('{A}{a}', {}, '{A}{a}')
+
+    # natural language templates
+    _test_slot_template('the {a} is {A}[adj] and {ZZ}', {'{A}': 'red', '{a}': 'apple', '{ZZ}': 'so on'},
+                        'the apple is red[adj] and so on')
+
+    assert Formula('{A}{a} -> ¬{B}').slot_template\
+        == (('{A}', '{a}', ' -> ¬', '{B}'), ((0, '{A}'), (1, '{a}'), (3, '{B}')))
+
 
 def test_wo_quantifier():
 
@@ -109,6 +267,11 @@ def test_negate():
 
 if __name__ == '__main__':
     test_formula()
+    test_tokenize()
+    test_formula_cache()
+    test_canonical_rep()
+    test_canonicalize_rep_set()
+    test_slot_template()
     test_wo_quantifier()
     test_require_outer_brace()
     test_negate()
@@ -1,14 +1,21 @@
 from typing import List, Optional
+from itertools import permutations, product
 from FLD_generator.interpretation import (
     _expand_op,
     generate_quantifier_axiom_arguments,
     formula_is_identical_to,
     argument_is_identical_to,
+    get_argument_canonical_key,
+    ArgumentIdentityIndex,
     interpret_formula,
+    interpret_formula_batch,
+    interpret_formulas,
     formula_can_not_be_identical_to,
     generate_quantifier_formulas,
     generate_partially_quantifier_arguments,
     generate_simplified_formulas,
+    generate_unifying_mappings,
+    _generate_assignments,
 )
 from FLD_generator.proof_tree_generators import generate_mappings_from_formula
 from FLD_generator.formula import Formula
@@ -53,6 +60,33 @@ def test_expand_op():
     assert _expand_op('¬((x): ({P} v ¬{Q})x)') == '¬((x): ({P}x v ¬{Q}x))'
 
 
+def test_interpret_formula():
+    assert interpret_formula(Formula('{A}{a} -> ¬{B}{b}'), {'{A}': '{B}', '{B}': '{A}', '{a}': '{b}'}).rep == '{B}{b} -> ¬{A}{b}'
+    assert interpret_formula(Formula('{A}{a} -> {B}{a}'), {'{A}': '¬{A}'}, elim_dneg=True).rep == '¬{A}{a} -> {B}{a}'
+    assert interpret_formula(Formula('¬{A}{a}'), {'{A}': '¬{B}'}, elim_dneg=True).rep == '{B}{a}'
+    assert interpret_formula(Formula('{A}{a}'), {'{A}': '({B} v {C})'}).rep == '({B}{a} v {C}{a})'
+    assert interpret_formula(Formula('{A}{a}'), {'{a}': 'x'}, quantifier_types={'x': 'universal'}).rep == '(x): {A}x'
+
+    # a key which is not a symbol
+    assert interpret_formula(Formula('{A}x -> {B}x'), {'x': '{a}'}).rep == '{A}{a} -> {B}{a}'
+
+    formulas = [Formula('{A}{a}'), Formula('(x): {A}x -> ¬{B}x'), Formula('#F#')]
+    mapping = {'{A}': '{C}', '{B}': '{A}', '{a}': '{c}'}
+    assert [formula.rep for formula in interpret_formulas(formulas, mapping)]\
+        == [interpret_formula(formula, mapping).rep for formula in formulas]
+
+    formula = Formula('¬{A}{a} -> ({B} & {C}){b}')
+    mappings = [
+        {'{A}': '{B}', '{B}': '{C}', '{C}': '{A}'},
+        {'{A}': '¬{A}', '{a}': '{b}'},
+        {},
+        {'{a}': 'x'},
+    ]
+    for elim_dneg in [False, True]:
+        assert [formula.rep for formula in interpret_formula_batch(formula, mappings, elim_dneg=elim_dneg)]\
+            == [interpret_formula(formula, mapping, elim_dneg=elim_dneg).rep for mapping in mappings]
+
+
 def test_formula_can_not_be_identical_to():
     assert not formula_can_not_be_identical_to(
         Formula('{A}'),
@@ -204,6 +238,55 @@ def test_argument_is_identical_to():
     )
 
 
+def test_argument_identity_index():
+    mp = Argument(
+        [Formula('{A}'), Formula('{A} -> {B}')],
+        Formula('{B}'),
+        {},
+    )
+    disjunctive_syllogism = Argument(
+        [Formula('{A} v {B}'), Formula('¬{B}')],
+        Formula('{A}'),
+        {},
+    )
+    index = ArgumentIdentityIndex([mp, disjunctive_syllogism])
+    assert len(index) == 2
+
+    # one-to-one identity is decided by the canonical keys, regardless of the premise order.
+    renamed_mp = Argument(
+        [Formula('{P} -> {Q}'), Formula('{P}')],
+        Formula('{Q}'),
+        {},
+    )
+    assert get_argument_canonical_key(renamed_mp) == get_argument_canonical_key(mp)
+    assert index.find_identical(renamed_mp) is mp
+    assert renamed_mp in index
+
+    # many-to-one
+    many_to_one_ds = Argument(
+        [Formula('{A} v {B}'), Formula('¬{B}')],
+        Formula('{C}'),
+        {},
+    )
+    assert get_argument_canonical_key(many_to_one_ds) != get_argument_canonical_key(disjunctive_syllogism)
+    assert index.find_identical(many_to_one_ds) is disjunctive_syllogism
+    assert index.find_identical(many_to_one_ds, allow_many_to_one=False) is None
+
+    assert Argument(
+        [Formula('{A}'), Formula('{A} -> ¬{B}')],
+        Formula('¬{B}'),
+        {},
+    ) not in index
+
+    # the copy is independent of the original
+    copied_index = index.copy()
+    copied_index.add(many_to_one_ds)
+    assert len(copied_index) == 3
+    assert len(index) == 2
+    assert index.find_identical(many_to_one_ds, allow_many_to_one=False) is None
+    assert copied_index.find_identical(many_to_one_ds, allow_many_to_one=False) is many_to_one_ds
+
+
 def test_generate_quantifier_axiom_arguments():
 
     def check_generation(argument_type: str,
@@ -1052,17 +1135,127 @@ def test_generate_mappings_from_formula():
     )
 
 
+def test_generate_assignments():
+    objs = ['{A}', '{B}', '{C}', '{D}', '{E}']
+
+    for shuffle in [False, True]:
+        assignments = [tuple(assignment) for assignment in _generate_assignments(objs, 3, shuffle=shuffle, allow_many_to_one=False)]
+        if not shuffle:
+            assert assignments == list(permutations(objs, 3))
+        assert sorted(assignments) == sorted(permutations(objs, 3))
+
+        assignments = [tuple(assignment) for assignment in _generate_assignments(objs, 3, shuffle=shuffle, allow_many_to_one=True)]
+        if not shuffle:
+            assert assignments == list(product(objs, repeat=3))
+        assert sorted(assignments) == sorted(product(objs, repeat=3))
+
+        # the free positions do not take the constrained elements if not allow_many_to_one.
+        assignments = [tuple(assignment) for assignment in _generate_assignments(objs, 3, constraints={1: '{C}'},
+                                                                                 shuffle=shuffle, allow_many_to_one=False)]
+        assert sorted(assignments) == sorted((head, '{C}', tail) for head, tail in permutations(['{A}', '{B}', '{D}', '{E}'], 2))
+
+        assignments = [tuple(assignment) for assignment in _generate_assignments(objs, 3, shuffle=shuffle, allow_many_to_one=True,
+                                                                                 many_to_one_ng_idxs=[0])]
+        assert sorted(assignments) == sorted(assignment for assignment in product(objs, repeat=3)
+                                             if assignment[0] not in assignment[1:])
+
+    assert list(_generate_assignments(objs, 6, allow_many_to_one=False)) == []
+
+    # the assignments are drawn lazily from the huge space
+    tgt_objs = [f'{{T{i}}}' for i in range(500)]
+    for allow_many_to_one in [False, True]:
+        assignments = []
+        for assignment in _generate_assignments(tgt_objs, 6, shuffle=True, allow_many_to_one=allow_many_to_one):
+            assignments.append(tuple(assignment))
+            if len(assignments) >= 1000:
+                break
+        assert len(set(assignments)) == 1000
+        # the assignments are not sharing prefixes as the depth-first search
+        assert len({assignment[0] for assignment in assignments}) > 300
+
+
+def test_generate_unifying_mappings():
+
+    def test(src_formula_reps: List[str],
+             tgt_formula_candidate_reps: List[List[str]],
+             intermediate_constant_reps: List[str],
+             allow_many_to_one=True,
+             elim_dneg=False):
+        src_formulas = [Formula(rep) for rep in src_formula_reps]
+        tgt_formula_candidates = [[Formula(rep) for rep in reps] for reps in tgt_formula_candidate_reps]
+        intermediate_constants = [Formula(rep) for rep in intermediate_constant_reps]
+
+        mappings = list(generate_unifying_mappings(src_formulas,
+                                                   tgt_formula_candidates,
+                                                   intermediate_constants=intermediate_constants,
+                                                   allow_many_to_one=allow_many_to_one,
+                                                   elim_dneg=elim_dneg,
+                                                   shuffle=True))
+
+        # the same as generating all the mappings and then testing them
+        gold_mappings = []
+        for mapping in generate_mappings_from_formula(src_formulas,
+                                                      [formula for formulas in tgt_formula_candidates for formula in formulas],
+                                                      intermediate_constants=intermediate_constants,
+                                                      allow_many_to_one=allow_many_to_one):
+            if all(interpret_formula(src_formula, mapping, elim_dneg=elim_dneg).rep in [formula.rep for formula in tgt_formulas]
+                   for src_formula, tgt_formulas in zip(src_formulas, tgt_formula_candidates)):
+                gold_mappings.append(mapping)
+
+        assert len(mappings) == len(set(tuple(sorted(mapping.items())) for mapping in mappings))
+        assert sorted(sorted(mapping.items()) for mapping in mappings) == sorted(sorted(mapping.items()) for mapping in gold_mappings)
+        return mappings
+
+    assert test(['{A}{a} -> {B}{b}'], [['{C}{c} -> {D}{c}']], []) == [{'{A}': '{C}', '{B}': '{D}', '{a}': '{c}', '{b}': '{c}'}]
+    assert test(['{A}{a} -> {B}{b}'], [['{C}{c} -> {D}{c}']], ['{a}']) == []
+    assert test(['{A}{a} -> {B}{b}'], [['{C}{c} -> {C}{d}']], [], allow_many_to_one=False) == []
+    assert test(['{A}{a} -> {B}{b}'], [['({C}{c} & {D}{c}) -> {E}{d}']], []) == []
+    assert test(['(x): {A}x -> {B}x'], [['(x): {C}x -> ¬{D}x']], []) == []
+
+    # the premise and the assumption of an argument
+    test(
+        ['{A}{a} -> {B}{a}', '{A}{a}'],
+        [['{C}{c} -> {D}{c}'], ['{C}{c}', '{D}{c}', '{C}{d}', '{E}{e}']],
+        [],
+    )
+    test(
+        ['{A} v {B}', '{A}', '{B}'],
+        [['{C} v {D}'], ['{C}', '{D}', '{E}'], ['{C}', '{D}', '{E}']],
+        [],
+    )
+
+    # the double negation elimination and the operator expansion
+    test(['¬¬{A}{a} -> {B}{a}'], [['{C}{c} -> {D}{c}']], [], elim_dneg=True)
+    test(['({A} & {B}){a}'], [['({C}{c} & {D}{c})']], [])
+
+    # the intermediate constant can not be shared with the other constants.
+    test(['{A}{a} & {B}{b}', '(x): {A}x & {B}{b}'], [['{A}{k} & {B}{l}'], ['(x): {A}x & {B}{l}']], ['{a}'])
+    test(['{A}{a} & {B}{b}', '(x): {A}x & {B}{b}'], [['{A}{k} & {B}{k}'], ['(x): {A}x & {B}{k}']], ['{a}'])
+
+    # constraints
+    mappings = list(generate_unifying_mappings([Formula('{A}{a} -> {B}{b}')],
+                                               [[Formula('{C}{c} -> {D}{d}')]],
+                                               constraints={'{A}': '{D}'}))
+    assert mappings == []
+    mappings = list(generate_unifying_mappings([Formula('{A}{a} -> {B}{b}')],
+                                               [[Formula('{C}{c} -> {D}{d}')]],
+                                               constraints={'{A}': '{C}', '{Z}': '{Z}'}))
+    assert mappings == [{'{A}': '{C}', '{B}': '{D}', '{a}': '{c}', '{b}': '{d}'}]
 
 
 if __name__ == '__main__':
     # test_expand_op()
+    test_interpret_formula()
     # test_formula_is_identical_to()
     # test_formula_can_not_be_identical_to()
     # test_argument_is_identical_to()
+    # test_argument_identity_index()
 
     # test_generate_quantifier_axiom_arguments()
 
     test_generate_mappings_from_formula()
+    test_generate_assignments()
+    test_generate_unifying_mappings()
 
     # test_generate_quantifier_formulas()
     # test_generate_quantifier_arguments()
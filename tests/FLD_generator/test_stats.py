@@ -0,0 +1,112 @@
+import json
+import random
+from statistics import mean, stdev
+
+from FLD_generator.stats import RunningStats, StatsAccumulator
+
+
+def test_running_stats():
+    rand = random.Random(0)
+    values = [rand.randint(0, 100) for _ in range(1000)] + [rand.random() * 1e6 for _ in range(1000)]
+
+    running_stats = RunningStats()
+    assert running_stats.stdev is None
+    for value in values:
+        running_stats.add(value)
+    assert running_stats.count == len(values)
+    assert abs(running_stats.sum - sum(values)) < 1e-6
+    assert abs(running_stats.mean - mean(values)) < 1e-6
+    assert abs(running_stats.stdev - stdev(values)) / stdev(values) < 1e-9
+
+    # merging the stats of the chunks is the same as accumulating the whole values.
+    for num_chunks in [2, 3, 7]:
+        merged = RunningStats()
+        for i_chunk in range(num_chunks):
+            chunk_stats = RunningStats()
+            for value in values[i_chunk::num_chunks]:
+                chunk_stats.add(value)
+            merged.merge(chunk_stats)
+        assert merged.count == running_stats.count
+        assert abs(merged.mean - running_stats.mean) < 1e-6
+        assert abs(merged.stdev - running_stats.stdev) / running_stats.stdev < 1e-9
+
+    merged = RunningStats().merge(RunningStats())
+    assert merged.count == 0 and merged.stdev is None
+
+
+def test_running_stats_quantile():
+    running_stats = RunningStats(reservoir_size=500, seed=0)
+    for value in range(10000):
+        running_stats.add(value)
+    assert len(running_stats.reservoir) == 500
+    assert abs(running_stats.quantile(0.5) - 5000) < 1000
+    assert abs(running_stats.quantile(0.9) - 9000) < 1000
+
+    # the merged reservoir is a sample of both streams in proportion to their sizes.
+    this = RunningStats(reservoir_size=500, seed=0)
+    that = RunningStats(reservoir_size=500, seed=1)
+    for _ in range(9000):
+        this.add(0)
+    for _ in range(1000):
+        that.add(1)
+    this.merge(that)
+    assert len(this.reservoir) == 500
+    assert 20 < sum(this.reservoir) < 80
+
+    assert RunningStats().quantile(0.5) is None
+
+
+def test_stats_accumulator():
+    rand = random.Random(0)
+    all_sample_stats = [
+        {
+            'tree': 1,
+            'word_count_all': rand.randint(10, 100),
+            'word_count_proof': rand.choice([None, rand.randint(0, 50)]),
+            'argument.modus_ponens': rand.randint(0, 3),
+        }
+        for _ in range(100)
+    ]
+
+    accumulator = StatsAccumulator()
+    for sample_stats in all_sample_stats:
+        accumulator.add(sample_stats)
+    stats = accumulator.to_dict()
+
+    word_counts_proof = [sample_stats['word_count_proof'] for sample_stats in all_sample_stats
+                         if sample_stats['word_count_proof'] is not None]
+    assert stats['cum.tree'] == 100
+    assert stats['cum.word_count_proof'] == sum(word_counts_proof)
+    assert stats['avg.word_count_proof'] == sum(word_counts_proof) / 100
+    assert abs(stats['std.word_count_proof'] - stdev(word_counts_proof)) < 1e-9
+    assert 'avg.tree' not in stats
+    assert 'avg.argument.modus_ponens' in stats
+    assert 'std.argument.modus_ponens' not in stats
+
+    # the accumulators of the workers are merged exactly
+    merged = StatsAccumulator()
+    for i_worker in range(3):
+        worker_accumulator = StatsAccumulator()
+        for sample_stats in all_sample_stats[i_worker::3]:
+            worker_accumulator.add(sample_stats)
+        worker_accumulator.add_counters({'cache.check_sat.hit': 10})
+        merged.merge(worker_accumulator)
+    merged_stats = merged.to_dict()
+
+    # the counters are not of the instances
+    assert merged_stats.pop('cum.cache.check_sat.hit') == 30
+    assert 'avg.cache.check_sat.hit' not in merged_stats
+
+    assert merged_stats.keys() == stats.keys()
+    for name, value in stats.items():
+        assert abs(merged_stats[name] - value) < 1e-9
+
+    # the accumulator can be restored from its state
+    restored = StatsAccumulator.from_state_dict(json.loads(json.dumps(merged.state_dict())))
+    assert restored.to_dict() == merged.to_dict()
+
+
+if __name__ == '__main__':
+    test_running_stats()
+    test_running_stats_quantile()
+    test_stats_accumulator()
@@ -0,0 +1,54 @@
+import time
+
+from FLD_generator.timings import (
+    timed,
+    timed_function,
+    enable_timings,
+    reset_timings,
+    get_timings,
+)
+
+
+def test_timings():
+
+    @timed_function('recursive')
+    def recursive(depth: int) -> int:
+        time.sleep(0.01)
+        return recursive(depth - 1) + 1 if depth > 0 else 0
+
+    reset_timings()
+
+    # nothing is timed unless enabled
+    with timed('stage'):
+        pass
+    assert get_timings() == {}
+
+    enable_timings()
+    try:
+        for _ in range(2):
+            with timed('stage'):
+                time.sleep(0.01)
+        assert recursive(2) == 2
+
+        # the time is recorded even if the stage raises
+        try:
+            with timed('failing'):
+                raise ValueError()
+        except ValueError:
+            pass
+    finally:
+        enable_timings(False)
+
+    timings = get_timings()
+    assert timings['stage']['count'] == 2
+    assert timings['stage']['sec'] >= 0.02
+    assert timings['recursive']['count'] == 1   # only the outermost call
+    assert timings['recursive']['sec'] >= 0.03
+    assert timings['failing']['count'] == 1
+
+    reset_timings()
+    assert get_timings() == {}
+
+
+if __name__ == '__main__':
+    test_timings()
@@ -1,8 +1,12 @@
 from typing import List, Optional
 import logging
+import random
+import tempfile
+from pathlib import Path
 
 from FLD_generator.formula import Formula
-from FLD_generator.translators import build as build_translator
+from FLD_generator.interpretation import generate_mappings_from_formula, interpret_formula
+from FLD_generator.translators import build as build_translator, load as load_translator
 from FLD_generator.word_banks import build_wordnet_wordbank
 from logger_setup import setup as setup_logger
 
@@ -96,5 +100,99 @@ def test_templated_translator():
     )
 
 
+def test_compiled_template_grammar():
+    translator = build_translator(
+        ['./configs/translations/thing.v1'],
+        build_wordnet_wordbank('eng'),
+        use_fixed_translation=True,
+    )
+
+    def _test_volume(node) -> None:
+        if len(node.children) == 0:
+            return
+        if hasattr(node, 'templates'):  # nl node
+            volume = 1
+            for child in node.children:
+                volume *= child.volume
+        else:
+            volume = sum(child.volume for child in node.children)
+        assert node.volume == volume
+        assert set(node.required_conditions).issubset(node.all_conditions)
+
+    for node in list(translator._nl_nodes.values()) + list(translator._template_nodes.values()):
+        _test_volume(node)
+
+    for sentence_key, node in translator._sentence_nodes.items():
+        assert len(node.children) == len(translator._translations[sentence_key])
+
+    # the translations are fully resolved
+    formulas = [Formula('{A}{a} -> {B}{b}'), Formula('(x): ¬{A}x -> {C}x')]
+    translations, _ = translator.translate(formulas, [])
+    for _, translation, _ in translations:
+        assert translation.find('<<') < 0
+
+
+def test_translator_artifact():
+    translator = build_translator(
+        ['./configs/translations/thing.v1'],
+        build_wordnet_wordbank('eng'),
+        use_fixed_translation=False,
+        words_per_type=100,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = str(Path(tmp_dir) / 'translator.artifact')
+        translator.save(path)
+        loaded = load_translator(path, use_fixed_translation=False)
+
+        assert loaded.acceptable_formulas == translator.acceptable_formulas
+        assert loaded.translation_names == translator.translation_names
+
+        # the loaded translator yields the same translations as the original one
+        formulas = [Formula('{A}{a} -> {B}{b}'), Formula('(x): ¬{A}x -> {C}x'), Formula('¬({A} & {B})')]
+        for seed in range(10):
+            random.seed(seed)
+            translations, _ = translator.translate(formulas, [Formula('{a}')])
+            random.seed(seed)
+            loaded_translations, _ = loaded.translate(formulas, [Formula('{a}')])
+            assert [translation[:2] for translation in translations] == [translation[:2] for translation in loaded_translations]
+
+
+def test_translation_key_index():
+    translator = build_translator(
+        ['./configs/translations/thing.v1'],
+        build_wordnet_wordbank('eng'),
+        use_fixed_translation=False,
+        words_per_type=100,
+    )
+
+    def search_translation_key(formula: Formula):
+        for transl_key in translator._translations:
+            for push_mapping in generate_mappings_from_formula([Formula(transl_key)], [formula]):
+                if interpret_formula(Formula(transl_key), push_mapping).rep == formula.rep:
+                    yield transl_key, push_mapping
+
+    def _test_translation_key_index(rep: str):
+        formula = Formula(rep)
+        found = list(translator._find_translation_key(formula))
+        assert found == list(search_translation_key(formula))
+        for transl_key, push_mapping in found:
+            assert interpret_formula(Formula(transl_key), push_mapping).rep == formula.rep
+
+    _test_translation_key_index('{A}{a}')
+    _test_translation_key_index('¬{C}{b}')
+    _test_translation_key_index('{A}{a} -> {B}{b}')
+    _test_translation_key_index('{B}{b} -> {A}{a}')
+    _test_translation_key_index('{A}{a} -> {A}{b}')   # merged predicates
+    _test_translation_key_index('({A}{a} & {B}{a}) -> {C}{a}')   # merged constants
+    _test_translation_key_index('(x): ¬{AA}x -> {GH}x')
+    _test_translation_key_index('(Ex): ({A}x v {B}x) -> ¬{C}x')
+    _test_translation_key_index('¬({A} & {B})')
+    _test_translation_key_index('{A}{a} & {B}{b} & {C}{c} & {D}{d}')
+
+
 if __name__ == '__main__':
     test_templated_translator()
+    test_compiled_template_grammar()
+    test_translator_artifact()
+    test_translation_key_index()
@@ -1,4 +1,6 @@
 from typing import List
+import random
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pprint
 from collections import defaultdict
 from FLD_generator.utils import (
@@ -7,6 +9,10 @@ from FLD_generator.utils import (
     nested_merge,
     make_combination,
     chained_sampling_from_weighted_iterators,
+    shuffle,
+    get_rng,
+    using_rng,
+    make_instance_rng,
 )
 
 
@@ -142,9 +148,45 @@ def test_chained_sampling_from_weighted_iterators():
     show_sampling([0.1, 1.0])
 
 
+def test_instance_rng():
+    elems = list(range(100))
+
+    def sample_instance(seed: int, idx: int) -> List[int]:
+        with using_rng(make_instance_rng(seed, idx)):
+            return shuffle(elems) + [weighted_sampling([1.0, 2.0, 3.0]) for _ in range(10)]
+
+    # an instance is the same whatever has been generated before it.
+    random.seed(0)
+    instance = sample_instance(0, 5)
+    for idx in [3, 4]:
+        sample_instance(0, idx)
+    random.random()
+    assert sample_instance(0, 5) == instance
+
+    assert sample_instance(0, 6) != instance
+    assert sample_instance(1, 5) != instance
+
+    # the global random state is not consumed by the instances
+    random.seed(0)
+    state = random.getstate()
+    sample_instance(0, 5)
+    assert random.getstate() == state
+
+    assert get_rng() is random
+    with using_rng(None):
+        assert get_rng() is random
+
+    # each thread has its own instance rng
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with using_rng(make_instance_rng(0, 6)):
+            assert list(executor.map(lambda idx: sample_instance(0, idx), [5, 5])) == [instance, instance]
+            assert executor.submit(get_rng).result() is random
+
+
 if __name__ == '__main__':
     test_weighted_sampling()
     test_weighted_shuffle()
     test_nested_merge()
     test_make_combination()
     test_chained_sampling_from_weighted_iterators()
+    test_instance_rng()
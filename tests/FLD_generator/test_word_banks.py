@@ -1,6 +1,9 @@
 from typing import List, Optional, Iterable, Dict
+import tempfile
+from pathlib import Path
+from itertools import islice
 
-from FLD_generator.word_banks import build_wordnet_wordbank, POS, ATTR, get_form_types
+from FLD_generator.word_banks import build_wordnet_wordbank, POS, ATTR, get_form_types, LexiconWordBank, build_lexicon
 import logging
 from logger_setup import setup as setup_logger
 
@@ -52,8 +55,49 @@ def _test_word_bank(wb):
                             print(f'    {str(form_type):<40}{str(inflated_word):<40}')
 
 
+def test_lexicon_word_bank():
+    wb = build_wordnet_wordbank('eng')
+    words = list(islice(wb.get_words(), 0, None, 200))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = str(Path(tmp_dir) / 'lexicon.sqlite')
+        build_lexicon(wb, path, words=words)
+        lexicon_wb = LexiconWordBank(path)
+
+    def _call(func, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except (NotImplementedError, ValueError) as e:
+            return type(e)
+
+    for word in words:
+        assert set(lexicon_wb.get_pos(word)) == set(wb.get_pos(word))
+        assert lexicon_wb.get_attrs(word) == wb.get_attrs(word)
+        assert _call(lexicon_wb.get_antonyms, word) == _call(wb.get_antonyms, word)
+        assert _call(lexicon_wb.get_negnyms, word) == _call(wb.get_negnyms, word)
+
+        for pos in wb.get_pos(word):
+            try:
+                form_types = get_form_types(pos)
+            except NotImplementedError:
+                continue
+            for form in form_types:
+                for force in [False, True]:
+                    inflated_words = _call(wb.change_word_form, word, form, force=force)
+                    assert _call(lexicon_wb.change_word_form, word, form, force=force) == inflated_words
+
+                    # the inflated words are also in the lexicon
+                    if isinstance(inflated_words, list):
+                        for inflated_word in inflated_words:
+                            if inflated_word.find(' ') < 0:
+                                assert set(lexicon_wb.get_pos(inflated_word)) == set(wb.get_pos(inflated_word))
+
+    _test_word_bank(lexicon_wb)
+
+
 if __name__ == '__main__':
     test_word_bank('eng')
+    test_lexicon_word_bank()
 
     # # restricted vocab
     # test_word_bank(